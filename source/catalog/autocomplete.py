@@ -0,0 +1,146 @@
+# catalog/autocomplete.py
+"""
+Подсказки при вводе: префиксный индекс по названиям услуг и категорий.
+
+На каждый язык — отсортированный массив ключей: локализованное название,
+начиная с каждого его слова («свадебный фотограф» -> «свадебный фотограф»,
+«фотограф»). Префикс ищем bisect'ом, так что запрос — это O(log n) + размер
+выдачи, без похода в БД. Пересобирается при изменении каталога
+(см. catalog/derived.py).
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from .derived import CatalogDerived
+
+LANGUAGES = ("ru", "kk", "en")
+
+SERVICE = "service"
+CATEGORY = "category"
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# сколько совпавших ключей просматриваем, прежде чем отрезать top-N
+SCAN_LIMIT = 500
+
+WORD_START_RE = re.compile(r"\b\w", re.UNICODE)
+
+
+@dataclass(frozen=True)
+class Entry:
+    kind: str
+    id: int
+    name: str
+    category_id: int
+    category_name: str
+    sort_order: int
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class PrefixIndex:
+    keys: tuple[str, ...]
+    # параллельно keys: (запись, совпадение с начала названия)
+    targets: tuple[tuple[Entry, bool], ...]
+
+    def lookup(self, prefix: str, *, limit: int, include_inactive: bool = False) -> list[Entry]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        # лучшие: совпадение с начала названия, затем категории, затем sort_order
+        found: dict[tuple[str, int], tuple[tuple, Entry]] = {}
+        i = bisect_left(self.keys, prefix)
+        end = min(len(self.keys), i + SCAN_LIMIT)
+        while i < end and self.keys[i].startswith(prefix):
+            entry, from_start = self.targets[i]
+            i += 1
+            if not entry.is_active and not include_inactive:
+                continue
+            rank = (not from_start, entry.kind != CATEGORY, entry.sort_order, entry.name.lower(), entry.id)
+            key = (entry.kind, entry.id)
+            if key not in found or rank < found[key][0]:
+                found[key] = (rank, entry)
+
+        return [entry for _rank, entry in sorted(found.values(), key=lambda x: x[0])[:limit]]
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().replace("ё", "е").split())
+
+
+def _localized(obj: dict, field: str, lang: str) -> str:
+    # как Category.name / Service.name: пустой перевод -> русский
+    return obj.get(f"{field}_{lang}") or obj.get(f"{field}_ru") or ""
+
+
+def _build_language(categories: list[dict], services: list[dict], lang: str) -> PrefixIndex:
+    by_id = {c["id"]: c for c in categories}
+    entries: list[Entry] = []
+
+    for c in categories:
+        entries.append(
+            Entry(
+                kind=CATEGORY,
+                id=c["id"],
+                name=_localized(c, "name", lang),
+                category_id=c["id"],
+                category_name=_localized(c, "name", lang),
+                sort_order=c["sort_order"],
+                is_active=c["is_active"],
+            )
+        )
+    for s in services:
+        category = by_id.get(s["category_id"])
+        if category is None:
+            continue
+        entries.append(
+            Entry(
+                kind=SERVICE,
+                id=s["id"],
+                name=_localized(s, "name", lang),
+                category_id=category["id"],
+                category_name=_localized(category, "name", lang),
+                sort_order=s["sort_order"],
+                is_active=s["is_active"] and category["is_active"],
+            )
+        )
+
+    pairs: list[tuple[str, tuple[Entry, bool]]] = []
+    for entry in entries:
+        name = normalize(entry.name)
+        for m in WORD_START_RE.finditer(name):
+            pairs.append((name[m.start():], (entry, m.start() == 0)))
+    pairs.sort(key=lambda p: p[0])
+
+    return PrefixIndex(keys=tuple(k for k, _ in pairs), targets=tuple(t for _, t in pairs))
+
+
+def build_indexes() -> dict[str, PrefixIndex]:
+    from .models import Category, Service
+
+    names = [f"name_{lang}" for lang in LANGUAGES]
+    categories = list(Category.objects.values("id", "sort_order", "is_active", *names))
+    services = list(Service.objects.values("id", "category_id", "sort_order", "is_active", *names))
+    return {lang: _build_language(categories, services, lang) for lang in LANGUAGES}
+
+
+prefix_indexes: CatalogDerived[dict[str, PrefixIndex]] = CatalogDerived("prefix index", build_indexes)
+
+
+def language_key(lang: str | None) -> str:
+    lang = (lang or "ru").lower()
+    for code in LANGUAGES:
+        if lang.startswith(code):
+            return code
+    return "ru"
+
+
+def suggest(prefix: str, *, lang: str | None, limit: int = DEFAULT_LIMIT, include_inactive: bool = False) -> list[Entry]:
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    index = prefix_indexes.get()[language_key(lang)]
+    return index.lookup(prefix, limit=limit, include_inactive=include_inactive)
@@ -0,0 +1,86 @@
+# catalog/conditional.py
+"""
+Условные GET (ETag / Last-Modified -> 304) для страниц и API каталога.
+
+Валидатор — версия каталога + сборка (main/build.py) + язык + аудитория,
+проверяется ДО view, так что на 304 не тратится ни запросов, ни рендера. В ETag входит и хэш CSRF-cookie:
+в HTML зашит токен, и после его смены старое тело отдавать нельзя.
+
+Аноним: Cache-Control: public, max-age. Залогиненный: private, no-cache
+(браузер каждый раз переспрашивает, но получает 304). Личных данных в таких
+view быть не должно — их подгружают отдельно (смета: kp:sidebar).
+"""
+from __future__ import annotations
+
+import hashlib
+from functools import wraps
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+from main.build import build_stamp
+
+from .snapshot import catalog_snapshot, language_key
+
+
+def _audience(request) -> str:
+    user = request.user
+    if not user.is_authenticated:
+        return "anon"
+    return f"u{user.pk}{'s' if user.is_staff or user.is_superuser else ''}"
+
+
+def _catalog_validators(request) -> tuple[str, Optional[int]]:
+    catalog_snapshot.get()
+    version, updated_at = catalog_snapshot.stamp or (0, None)
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+    csrf_tag = hashlib.sha1(csrf.encode()).hexdigest()[:8] if csrf else "-"
+    build, built_at = build_stamp()
+    etag = f'W/"catalog-{version}-{build}-{language_key(get_language())}-{_audience(request)}-{csrf_tag}"'
+    # Last-Modified не знает об аудитории — только для анонимов; после деплоя
+    # не раньше времени сборки
+    last_modified = None
+    if updated_at and not request.user.is_authenticated:
+        last_modified = max(int(updated_at.timestamp()), built_at)
+    return etag, last_modified
+
+
+def _cache_policy(request, response) -> None:
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    elif response.cookies:
+        # ставим cookie (csrftoken, язык) — общим кэшам такое хранить нельзя
+        patch_cache_control(response, private=True, max_age=settings.CATALOG_HTTP_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.CATALOG_HTTP_MAX_AGE)
+    patch_vary_headers(response, ("Cookie", "Accept-Language"))
+
+
+def conditional_catalog(view: Optional[Callable] = None):
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = _catalog_validators(request)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response.headers["ETag"] = etag
+            if last_modified:
+                response.headers["Last-Modified"] = http_date(last_modified)
+            _cache_policy(request, response)
+            return response
+
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
@@ -0,0 +1,103 @@
+# catalog/derived.py
+"""
+Структуры в памяти процесса, построенные из каталога (снимок, триграммы, префиксы),
+и кэш номеров версий данных (CatalogVersion).
+
+Строятся лениво при первом обращении. Сигналы каталога поднимают
+CatalogVersion и сбрасывают их в этом процессе; записи из других процессов
+замечаем по версии в БД, которую проверяем не чаще RECHECK_SECONDS.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+RECHECK_SECONDS = 1.0
+
+T = TypeVar("T")
+
+_registry: list["CatalogDerived"] = []
+
+
+def _current_stamp() -> tuple:
+    """
+    (версия, время последней записи) каталога.
+    """
+    from .models import CatalogVersion
+
+    row = (
+        CatalogVersion.objects
+        .filter(key=CatalogVersion.CATALOG)
+        .values_list("version", "updated_at")
+        .first()
+    )
+    return tuple(row) if row else (0, None)
+
+
+class CatalogDerived(Generic[T]):
+    def __init__(self, name: str, build: Callable[[], T]):
+        self.name = name
+        self._build = build
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._stamp: Optional[tuple] = None
+        self._checked_at = 0.0
+        _registry.append(self)
+
+    def invalidate(self) -> None:
+        self._value = None
+
+    @property
+    def stamp(self) -> Optional[tuple]:
+        """
+        (версия, updated_at), из которой построено текущее значение.
+        """
+        return self._stamp
+
+    def get(self) -> T:
+        value = self._value
+        if value is not None and time.monotonic() - self._checked_at < RECHECK_SECONDS:
+            return value
+
+        with self._lock:
+            stamp = _current_stamp()
+            self._checked_at = time.monotonic()
+            if self._value is not None and stamp == self._stamp:
+                return self._value
+
+            started_at = time.perf_counter()
+            value = self._build()
+            self._value, self._stamp = value, stamp
+            logger.info(
+                "Catalog %s built for version %s in %.1fms",
+                self.name,
+                stamp[0],
+                (time.perf_counter() - started_at) * 1000,
+            )
+            return value
+
+
+# версии по ключам (catalog, portfolio) для тех, кому нужен только номер
+_versions: dict[str, tuple[int, float]] = {}
+
+
+def current_version(key: str) -> int:
+    from .models import CatalogVersion
+
+    cached = _versions.get(key)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < RECHECK_SECONDS:
+        return cached[0]
+    version = CatalogVersion.current(key)
+    _versions[key] = (version, now)
+    return version
+
+
+def invalidate_all() -> None:
+    for derived in _registry:
+        derived.invalidate()
+    _versions.clear()
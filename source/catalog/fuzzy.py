@@ -0,0 +1,144 @@
+# catalog/fuzzy.py
+"""
+Нечёткий поиск по названиям категорий и услуг (триграммы).
+
+Срабатывает, когда точный поиск (catalog/search.py) ничего не нашёл:
+«фотогрф», «видиограф», «фотогрaф» с латинской «a». Индекс держим в памяти
+процесса: словарь слов из названий на всех языках -> триграммы -> posting-списки.
+Пересобирается, когда меняется каталог (см. catalog/derived.py).
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .derived import CatalogDerived
+
+NAME_FIELDS = ("name_ru", "name_kk", "name_en")
+
+SIMILARITY_THRESHOLD = 0.3
+MIN_WORD_LENGTH = 3
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+CYRILLIC_RE = re.compile(r"[а-яәғқңөұүһі]")
+LATIN_RE = re.compile(r"[a-z]")
+
+# одинаково выглядящие буквы (после lower(): заглавные М/Т/Н/В тоже учтены)
+_LAT = "aceopxykmthbi"
+_CYR = "асеорхукмтнві"
+LATIN_TO_CYRILLIC = str.maketrans(_LAT, _CYR)
+CYRILLIC_TO_LATIN = str.maketrans(_CYR, _LAT)
+
+
+def normalize_word(word: str) -> str:
+    """
+    Слово со смешанной раскладкой приводим к той письменности, которой в нём больше.
+    """
+    word = word.lower().replace("ё", "е")
+    cyrillic = len(CYRILLIC_RE.findall(word))
+    latin = len(LATIN_RE.findall(word))
+    if cyrillic and latin:
+        table = LATIN_TO_CYRILLIC if cyrillic >= latin else CYRILLIC_TO_LATIN
+        word = word.translate(table)
+    return word
+
+
+def normalize_words(text: str) -> list[str]:
+    return [normalize_word(w) for w in WORD_RE.findall(text or "")]
+
+
+def trigrams(word: str) -> set[str]:
+    # как в pg_trgm: два пробела в начале, один в конце
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class TrigramIndex:
+    words: list[str] = field(default_factory=list)
+    sizes: list[int] = field(default_factory=list)
+    postings: dict[str, list[int]] = field(default_factory=lambda: defaultdict(list))
+    word_services: list[set[int]] = field(default_factory=list)
+    # категории: по своему названию и по названиям своих услуг
+    word_categories: list[set[int]] = field(default_factory=list)
+    _positions: dict[str, int] = field(default_factory=dict)
+
+    def _word_id(self, word: str) -> int:
+        pos = self._positions.get(word)
+        if pos is None:
+            pos = len(self.words)
+            self._positions[word] = pos
+            self.words.append(word)
+            grams = trigrams(word)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(pos)
+            self.word_services.append(set())
+            self.word_categories.append(set())
+        return pos
+
+    def add(self, text: str, *, category_id: int, service_id: Optional[int] = None) -> None:
+        for word in normalize_words(text):
+            if len(word) < MIN_WORD_LENGTH:
+                continue
+            pos = self._word_id(word)
+            self.word_categories[pos].add(category_id)
+            if service_id is not None:
+                self.word_services[pos].add(service_id)
+
+    def similar_words(self, word: str, threshold: float) -> list[tuple[int, float]]:
+        grams = trigrams(word)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        result = []
+        for pos, common in shared.items():
+            similarity = common / (len(grams) + self.sizes[pos] - common)
+            if similarity >= threshold:
+                result.append((pos, similarity))
+        return result
+
+    def search(self, text: str, *, services: bool, threshold: float = SIMILARITY_THRESHOLD) -> list[int]:
+        """
+        id услуг (services=True) или категорий по убыванию суммы лучших
+        сходств по словам запроса.
+        """
+        targets = self.word_services if services else self.word_categories
+        scores: dict[int, float] = defaultdict(float)
+        for word in dict.fromkeys(normalize_words(text)):
+            if len(word) < MIN_WORD_LENGTH:
+                continue
+            best: dict[int, float] = {}
+            for pos, similarity in self.similar_words(word, threshold):
+                for obj_id in targets[pos]:
+                    if similarity > best.get(obj_id, 0.0):
+                        best[obj_id] = similarity
+            for obj_id, similarity in best.items():
+                scores[obj_id] += similarity
+        return [obj_id for obj_id, _ in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))]
+
+
+def build_index() -> TrigramIndex:
+    from .models import Category, Service
+
+    index = TrigramIndex()
+    for category_id, *names in Category.objects.values_list("id", *NAME_FIELDS):
+        for name in names:
+            index.add(name, category_id=category_id)
+    for service_id, category_id, *names in Service.objects.values_list("id", "category_id", *NAME_FIELDS):
+        for name in names:
+            index.add(name, category_id=category_id, service_id=service_id)
+    return index
+
+
+trigram_index: CatalogDerived[TrigramIndex] = CatalogDerived("trigram index", build_index)
+
+
+def search_service_ids(text: str) -> list[int]:
+    return trigram_index.get().search(text, services=True)
+
+
+def search_category_ids(text: str) -> list[int]:
+    return trigram_index.get().search(text, services=False)
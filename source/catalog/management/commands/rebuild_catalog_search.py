@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of categories and services."
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stdout.write(self.style.WARNING("FTS5 index is not available; search uses icontains."))
+            return
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt: {count} row(s)"))
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+FTS_TABLE = "catalog_search_fts"
+LANG_FIELDS = "name_ru, name_kk, name_en, description_ru, description_kk, description_en"
+
+
+def create_fts(apps, schema_editor):
+    # FTS5 есть только у SQLite; на других БД поиск работает через icontains
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"category_id UNINDEXED, {LANG_FIELDS}, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite собран без FTS5
+            return
+
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, category_id, {LANG_FIELDS}) "
+            f"SELECT id * 2, id, {LANG_FIELDS} FROM catalog_category"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, category_id, {LANG_FIELDS}) "
+            f"SELECT id * 2 + 1, category_id, {LANG_FIELDS} FROM catalog_service"
+        )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_service_instagram_urls"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
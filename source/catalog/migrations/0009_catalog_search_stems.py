@@ -0,0 +1,48 @@
+from django.db import migrations
+
+FTS_TABLE = "catalog_search_fts"
+LANG_FIELDS = "name_ru, name_kk, name_en, description_ru, description_kk, description_en"
+
+
+def _table_exists(cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def clear_index(apps, schema_editor):
+    # индекс со стеммами заполнит post_migrate (catalog/signals.py) текущим
+    # стеммером: живой код приложения в миграцию не тянем
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if _table_exists(cursor):
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+
+def unstem_index(apps, schema_editor):
+    # обратно — сырые тексты, как в 0008
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not _table_exists(cursor):
+            return
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, category_id, {LANG_FIELDS}) "
+            f"SELECT id * 2, id, {LANG_FIELDS} FROM catalog_category"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, category_id, {LANG_FIELDS}) "
+            f"SELECT id * 2 + 1, category_id, {LANG_FIELDS} FROM catalog_service"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_catalog_search_fts"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_index, unstem_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.10 on 2026-10-17 06:46
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='categories/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image_2',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image_3',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image_4',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image_5',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='image_6',
+            field=models.ImageField(blank=True, null=True, upload_to='services/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+    ]
@@ -2,8 +2,11 @@
 from __future__ import annotations
 
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import get_language
 
+from main.storage import validate_image_upload
+
 
 class Category(models.Model):
     name_ru = models.CharField("Название (RU)", max_length=255)
@@ -14,7 +17,7 @@ class Category(models.Model):
     description_kk = models.TextField("Описание (KZ)", blank=True, default="")
     description_en = models.TextField("Описание (EN)", blank=True, default="")
 
-    image = models.ImageField(upload_to="categories/", blank=True, null=True)
+    image = models.ImageField(upload_to="categories/", blank=True, null=True, validators=[validate_image_upload])
 
     sort_order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
@@ -59,14 +62,14 @@ class Service(models.Model):
     description_kk = models.TextField("Описание (KZ)", blank=True, default="")
     description_en = models.TextField("Описание (EN)", blank=True, default="")
 
-    image = models.ImageField(upload_to="services/", blank=True, null=True)
+    image = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
 
     # ✅ дополнительные фото (для галереи в модалке)
-    image_2 = models.ImageField(upload_to="services/", blank=True, null=True)
-    image_3 = models.ImageField(upload_to="services/", blank=True, null=True)
-    image_4 = models.ImageField(upload_to="services/", blank=True, null=True)
-    image_5 = models.ImageField(upload_to="services/", blank=True, null=True)
-    image_6 = models.ImageField(upload_to="services/", blank=True, null=True)
+    image_2 = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
+    image_3 = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
+    image_4 = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
+    image_5 = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
+    image_6 = models.ImageField(upload_to="services/", blank=True, null=True, validators=[validate_image_upload])
 
     # ✅ YouTube ссылка (будем выводить iframe если заполнено)
     youtube_url = models.URLField(blank=True, default="")
@@ -113,3 +116,28 @@ class Service(models.Model):
         if lang == "en" and self.description_en:
             return self.description_en
         return self.description_ru
+
+
+class CatalogVersion(models.Model):
+    """
+    Штамп версии данных: растёт на каждую запись в каталог.
+    По нему процессы понимают, что пора перечитать снимок каталога.
+    """
+    CATALOG = "catalog"
+
+    key = models.CharField(max_length=32, unique=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}@{self.version}"
+
+    @classmethod
+    def bump(cls, key: str = CATALOG) -> None:
+        updated = cls.objects.filter(key=key).update(version=models.F("version") + 1, updated_at=timezone.now())
+        if not updated:
+            cls.objects.get_or_create(key=key)
+
+    @classmethod
+    def current(cls, key: str = CATALOG) -> int:
+        return cls.objects.filter(key=key).values_list("version", flat=True).first() or 0
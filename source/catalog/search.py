@@ -0,0 +1,242 @@
+# catalog/search.py
+"""
+Полнотекстовый поиск по каталогу (SQLite FTS5).
+
+Одна виртуальная таблица на категории и услуги, все три языка. rowid кодирует
+тип и id: категория -> id*2, услуга -> id*2+1, так что переиндексация одной
+строки — это точечный REPLACE/DELETE по rowid. Синхронизация — сигналами
+(catalog/signals.py). Если FTS5 недоступен (не SQLite или SQLite без FTS5),
+работает поиск через icontains. Если точный поиск пуст — нечёткий по
+триграммам названий (catalog/fuzzy.py): опечатки и смешанная раскладка.
+
+В индекс пишутся не исходные тексты, а основы слов (catalog/stemming.py):
+стемминг считается один раз при сохранении, запрос приводится к основам
+так же и ищется префиксом только в колонках своего языка.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, QuerySet, Value, When
+
+from . import fuzzy
+from .stemming import query_stems, stem_text
+
+FTS_TABLE = "catalog_search_fts"
+
+LANG_FIELDS = (
+    "name_ru",
+    "name_kk",
+    "name_en",
+    "description_ru",
+    "description_kk",
+    "description_en",
+)
+
+# bm25: по колонке на вес, включая UNINDEXED category_id
+BM25_WEIGHTS = "0, 10.0, 10.0, 10.0, 1.0, 1.0, 1.0"
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "category_id UNINDEXED, "
+    + ", ".join(LANG_FIELDS)
+    + ", tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+_available: Optional[bool] = None
+
+
+def fts_available() -> bool:
+    global _available
+    if _available:
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        # запоминаем только "есть": до migrate таблицы может ещё не быть
+        _available = cursor.fetchone() is not None
+    return _available
+
+
+def _category_rowid(pk: int) -> int:
+    return int(pk) * 2
+
+
+def _service_rowid(pk: int) -> int:
+    return int(pk) * 2 + 1
+
+
+# =========================
+# индексация
+# =========================
+def _field_lang(field: str) -> str:
+    return field.rsplit("_", 1)[1]
+
+
+def index_values(obj) -> list[str]:
+    return [stem_text(getattr(obj, f, "") or "", _field_lang(f)) for f in LANG_FIELDS]
+
+
+def _replace(rowid: int, category_id: int, obj) -> None:
+    values = index_values(obj)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, category_id, {', '.join(LANG_FIELDS)}) "
+            f"VALUES (%s, %s, {', '.join(['%s'] * len(LANG_FIELDS))})",
+            [rowid, category_id, *values],
+        )
+
+
+def _delete(rowid: int) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+
+
+def index_category(category) -> None:
+    if fts_available():
+        _replace(_category_rowid(category.pk), category.pk, category)
+
+
+def index_service(service) -> None:
+    if fts_available():
+        _replace(_service_rowid(service.pk), service.category_id, service)
+
+
+def unindex_category(pk: int) -> None:
+    if fts_available():
+        _delete(_category_rowid(pk))
+
+
+def unindex_service(pk: int) -> None:
+    if fts_available():
+        _delete(_service_rowid(pk))
+
+
+def rebuild() -> int:
+    """
+    Полная переиндексация (после сырого импорта в БД, bulk_update и т.п.).
+    """
+    from .models import Category, Service
+
+    if not fts_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    count = 0
+    for category in Category.objects.only("id", *LANG_FIELDS).iterator():
+        index_category(category)
+        count += 1
+    for service in Service.objects.only("id", "category_id", *LANG_FIELDS).iterator():
+        index_service(service)
+        count += 1
+    return count
+
+
+# =========================
+# поиск
+# =========================
+def _phrase(stem: str) -> str:
+    return '"{}"*'.format(stem.replace('"', '""'))
+
+
+def match_expression(text: str) -> str:
+    """
+    {name_ru description_ru} : ("основа1"* OR ...) OR {name_kk ...} : (...) ...
+    Каждая основа — префикс; совпадение по любой, релевантность решает bm25.
+    """
+    parts = []
+    for lang, stems in query_stems(text).items():
+        if not stems:
+            continue
+        columns = " ".join(f for f in LANG_FIELDS if _field_lang(f) == lang)
+        parts.append("{%s} : (%s)" % (columns, " OR ".join(_phrase(s) for s in stems)))
+    return " OR ".join(parts)
+
+
+def _ranked_rows(text: str) -> list[tuple[int, int, float]]:
+    expression = match_expression(text)
+    if not expression:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, category_id, bm25({FTS_TABLE}, {BM25_WEIGHTS}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank",
+            [expression],
+        )
+        return [(int(r[0]), int(r[1]), float(r[2])) for r in cursor.fetchall()]
+
+
+def _order_by_ids(qs: QuerySet, ids: list[int]) -> QuerySet:
+    if not ids:
+        return qs.none()
+    return (
+        qs.filter(id__in=ids)
+        .annotate(
+            search_rank=Case(
+                *[When(id=pk, then=Value(pos)) for pos, pk in enumerate(ids)],
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("search_rank")
+    )
+
+
+def ranked_category_ids(text: str) -> list[int]:
+    """
+    id категорий, у которых совпало название/описание или любая их услуга,
+    по убыванию релевантности.
+    """
+    from .models import Category
+
+    if fts_available():
+        ids = list(dict.fromkeys(category_id for _rowid, category_id, _rank in _ranked_rows(text)))
+    else:
+        ids = list(Category.objects.filter(category_search_q(text)).values_list("id", flat=True).distinct())
+    return ids or fuzzy.search_category_ids(text)
+
+
+def ranked_service_ids(text: str) -> list[int]:
+    from .models import Service
+
+    if fts_available():
+        ids = [rowid // 2 for rowid, _category_id, _rank in _ranked_rows(text) if rowid % 2 == 1]
+    else:
+        ids = list(Service.objects.filter(service_search_q(text)).values_list("id", flat=True))
+    return ids or fuzzy.search_service_ids(text)
+
+
+def search_categories(qs: QuerySet, text: str) -> QuerySet:
+    return _order_by_ids(qs, ranked_category_ids(text))
+
+
+def search_services(qs: QuerySet, text: str) -> QuerySet:
+    return _order_by_ids(qs, ranked_service_ids(text))
+
+
+# =========================
+# фолбэк без FTS5 (icontains)
+# =========================
+def _fallback_terms(text: str) -> dict[str, list[str]]:
+    return {lang: stems for lang, stems in query_stems(text).items() if stems}
+
+
+def _fields_q(prefix: str, terms: dict[str, list[str]]) -> Q:
+    # основа ищется только в полях своего языка
+    q = Q()
+    for f in LANG_FIELDS:
+        for stem in terms.get(_field_lang(f), ()):
+            q |= Q(**{f"{prefix}{f}__icontains": stem})
+    return q
+
+
+def category_search_q(search: str) -> Q:
+    terms = _fallback_terms(search)
+    return _fields_q("", terms) | _fields_q("services__", terms)
+
+
+def service_search_q(search: str) -> Q:
+    return _fields_q("", _fallback_terms(search))
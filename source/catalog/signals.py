@@ -0,0 +1,52 @@
+# catalog/signals.py
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import search
+from .derived import invalidate_all
+from .models import CatalogVersion, Category, Service
+
+
+def _catalog_changed() -> None:
+    CatalogVersion.bump(CatalogVersion.CATALOG)
+    invalidate_all()
+    # и ещё раз после коммита: кто успел перечитать каталог внутри транзакции
+    transaction.on_commit(invalidate_all)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    search.index_category(instance)
+    _catalog_changed()
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    search.unindex_category(instance.pk)
+    _catalog_changed()
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, **kwargs):
+    search.index_service(instance)
+    _catalog_changed()
+
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    search.unindex_service(instance.pk)
+    _catalog_changed()
+
+
+# миграция, после которой поисковый индекс надо собрать заново
+SEARCH_REINDEX_MIGRATIONS = {("catalog", "0009_catalog_search_stems")}
+
+
+@receiver(post_migrate)
+def catalog_migrated(sender, app_config, using=DEFAULT_DB_ALIAS, plan=None, **kwargs):
+    if app_config.name != "catalog" or using != DEFAULT_DB_ALIAS:
+        return
+    applied = {(m.app_label, m.name) for m, backwards in plan or () if not backwards}
+    if applied & SEARCH_REINDEX_MIGRATIONS:
+        search.rebuild()
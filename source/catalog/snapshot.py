@@ -0,0 +1,216 @@
+# catalog/snapshot.py
+"""
+Снимок каталога в памяти процесса.
+
+Категорий и услуг — сотни строк, меняются редко, а читаются на каждой
+странице. Поэтому раз на версию каталога (CatalogVersion) собираем
+неизменяемый снимок: категории с упорядоченными услугами, все языковые поля,
+флаги активности, поиск по id и готовые сортировки под каждый язык и
+аудиторию (админ видит неактивные). Страницы и API читают только его.
+"""
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.utils.translation import get_language
+
+from .derived import CatalogDerived
+
+LANGUAGES = ("ru", "kk", "en")
+
+
+def language_key(lang: Optional[str] = None) -> str:
+    lang = (lang or get_language() or "ru").lower()
+    for code in LANGUAGES:
+        if lang.startswith(code):
+            return code
+    return "ru"
+
+
+@dataclass(frozen=True)
+class ImageRef:
+    """
+    Замена FieldFile для шаблонов: {% if s.image %}, {{ s.image.url }}.
+    """
+    name: str = ""
+
+    def __bool__(self) -> bool:
+        return bool(self.name)
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def url(self) -> str:
+        return f"{settings.MEDIA_URL}{self.name}" if self.name else ""
+
+
+class _Localized:
+    # как Category.name / Service.name: пустой перевод -> русский
+    def _localized(self, field_name: str) -> str:
+        lang = get_language()
+        if lang == "kk" and getattr(self, f"{field_name}_kk"):
+            return getattr(self, f"{field_name}_kk")
+        if lang == "en" and getattr(self, f"{field_name}_en"):
+            return getattr(self, f"{field_name}_en")
+        return getattr(self, f"{field_name}_ru")
+
+    @property
+    def name(self) -> str:
+        return self._localized("name")
+
+    @property
+    def description(self) -> str:
+        return self._localized("description")
+
+
+@dataclass(frozen=True)
+class ServiceEntry(_Localized):
+    id: int
+    category_id: int
+    name_ru: str
+    name_kk: str
+    name_en: str
+    description_ru: str
+    description_kk: str
+    description_en: str
+    image: ImageRef
+    image_2: ImageRef
+    image_3: ImageRef
+    image_4: ImageRef
+    image_5: ImageRef
+    image_6: ImageRef
+    youtube_url: str
+    base_price: Optional[int]
+    unit: str
+    instagram_url: str
+    instagram_urls: str
+    allow_multiple: bool
+    sort_order: int
+    is_active: bool
+    # активна сама услуга и её категория
+    is_visible: bool = True
+
+    @property
+    def images(self) -> tuple[ImageRef, ...]:
+        return tuple(
+            img for img in (self.image, self.image_2, self.image_3, self.image_4, self.image_5, self.image_6) if img
+        )
+
+
+@dataclass(frozen=True)
+class CategoryEntry(_Localized):
+    id: int
+    name_ru: str
+    name_kk: str
+    name_en: str
+    description_ru: str
+    description_kk: str
+    description_en: str
+    image: ImageRef
+    sort_order: int
+    is_active: bool
+    # все услуги по (sort_order, id)
+    services: tuple[ServiceEntry, ...] = ()
+    # для сайдбара: у админа — все услуги, у остальных — активные
+    services_count: int = 0
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    categories_by_id: dict[int, CategoryEntry]
+    services_by_id: dict[int, ServiceEntry]
+    # (язык, админ?) -> категории в порядке (sort_order, name_<язык>)
+    _category_order: dict[tuple[str, bool], tuple[CategoryEntry, ...]] = field(default_factory=dict)
+    # (язык, админ?) -> {category_id: услуги в порядке (sort_order, name_<язык>)}
+    _service_order: dict[tuple[str, bool], dict[int, tuple[ServiceEntry, ...]]] = field(default_factory=dict)
+
+    def categories(self, *, is_admin: bool, lang: Optional[str] = None) -> tuple[CategoryEntry, ...]:
+        return self._category_order[(language_key(lang), is_admin)]
+
+    def services(self, category_id: int, *, is_admin: bool, lang: Optional[str] = None) -> tuple[ServiceEntry, ...]:
+        return self._service_order[(language_key(lang), is_admin)].get(category_id, ())
+
+    def category(self, category_id: int, *, is_admin: bool) -> Optional[CategoryEntry]:
+        category = self.categories_by_id.get(category_id)
+        if category is None or not (is_admin or category.is_active):
+            return None
+        return category
+
+    def service(self, service_id: int, *, is_admin: bool) -> Optional[ServiceEntry]:
+        service = self.services_by_id.get(service_id)
+        if service is None or not (is_admin or service.is_visible):
+            return None
+        return service
+
+    def all_categories(self) -> tuple[CategoryEntry, ...]:
+        # порядок API: sort_order, name_ru
+        return self._category_order[("ru", True)]
+
+
+def _image(value) -> ImageRef:
+    return ImageRef(str(value or ""))
+
+
+def _sort_key(obj, lang: str) -> tuple:
+    return (obj.sort_order, getattr(obj, f"name_{lang}"), obj.id)
+
+
+def build_snapshot() -> CatalogSnapshot:
+    from .models import Category, Service
+
+    category_fields = [f.name for f in dataclasses.fields(CategoryEntry) if f.name not in ("services", "services_count")]
+    service_fields = [f.name for f in dataclasses.fields(ServiceEntry) if f.name != "is_visible"]
+
+    category_rows = {row["id"]: row for row in Category.objects.order_by("sort_order", "id").values(*category_fields)}
+    services_by_category: dict[int, list[ServiceEntry]] = {pk: [] for pk in category_rows}
+    services_by_id: dict[int, ServiceEntry] = {}
+
+    for row in Service.objects.order_by("sort_order", "id").values(*service_fields):
+        category = category_rows.get(row["category_id"])
+        if category is None:
+            continue
+        for key in ("image", "image_2", "image_3", "image_4", "image_5", "image_6"):
+            row[key] = _image(row[key])
+        service = ServiceEntry(**row, is_visible=row["is_active"] and category["is_active"])
+        services_by_id[service.id] = service
+        services_by_category[service.category_id].append(service)
+
+    categories_by_id: dict[int, CategoryEntry] = {}
+    for pk, row in category_rows.items():
+        row["image"] = _image(row["image"])
+        categories_by_id[pk] = CategoryEntry(**row, services=tuple(services_by_category[pk]))
+
+    category_order = {}
+    service_order = {}
+    for lang in LANGUAGES:
+        for is_admin in (True, False):
+            categories = sorted(
+                (c for c in categories_by_id.values() if is_admin or c.is_active),
+                key=lambda c: _sort_key(c, lang),
+            )
+            services = {}
+            counted = []
+            for c in categories:
+                visible = [s for s in c.services if is_admin or s.is_active]
+                services[c.id] = tuple(sorted(visible, key=lambda s: _sort_key(s, lang)))
+                counted.append(dataclasses.replace(c, services_count=len(visible)))
+            category_order[(lang, is_admin)] = tuple(counted)
+            service_order[(lang, is_admin)] = services
+
+    return CatalogSnapshot(
+        categories_by_id=categories_by_id,
+        services_by_id=services_by_id,
+        _category_order=category_order,
+        _service_order=service_order,
+    )
+
+
+catalog_snapshot: CatalogDerived[CatalogSnapshot] = CatalogDerived("snapshot", build_snapshot)
+
+
+def get_snapshot() -> CatalogSnapshot:
+    return catalog_snapshot.get()
@@ -0,0 +1,257 @@
+# catalog/stemming.py
+"""
+Стемминг для поискового индекса каталога.
+
+ru — Snowball (Портер) для русского, kk — отсечение аффиксов казахского
+(мн. число, притяжательные, падежные), en — лёгкое отсечение окончаний.
+Применяется дважды одинаково: при записи в индекс и к словам запроса.
+"""
+from __future__ import annotations
+
+import re
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+CYRILLIC_RE = re.compile(r"[а-яёәғқңөұүһі]")
+KAZAKH_ONLY_RE = re.compile(r"[әғқңөұүһі]")
+
+# служебные слова запроса: префиксом «на*» совпадает полкаталога
+STOPWORDS = frozenset((
+    "в", "во", "на", "с", "со", "и", "для", "по", "к", "от", "из", "у", "о", "об", "за", "до", "при", "без",
+    "мен", "және", "үшін",
+    "a", "an", "the", "and", "for", "of", "to", "in", "on", "with",
+))
+
+
+def words(text: str) -> list[str]:
+    return WORD_RE.findall((text or "").lower().replace("ё", "е"))
+
+
+# =========================
+# ru: Snowball
+# =========================
+RU_VOWELS = set("аеиоуыэюя")
+
+RU_PERFECTIVE_1 = ("вшись", "вши", "в")
+RU_PERFECTIVE_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+RU_REFLEXIVE = ("ся", "сь")
+RU_ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+RU_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+RU_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+RU_VERB_1 = (
+    "ете", "йте", "ешь", "нно",
+    "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть",
+    "й", "л", "н",
+)
+RU_VERB_2 = (
+    "ейте", "уйте",
+    "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют",
+    "ены", "ить", "ыть", "ишь",
+    "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую",
+    "ю",
+)
+RU_NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом",
+    "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)
+RU_DERIVATIONAL = ("ость", "ост")
+RU_SUPERLATIVE = ("ейше", "ейш")
+
+
+def _ru_regions(word: str) -> tuple[int, int]:
+    """
+    (начало RV, начало R2).
+    """
+    n = len(word)
+    rv = n
+    for i, ch in enumerate(word):
+        if ch in RU_VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, n):
+            if word[i] not in RU_VOWELS and word[i - 1] in RU_VOWELS:
+                return i + 1
+        return n
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _sorted(endings: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+def _strip(rv: str, endings: tuple[str, ...]) -> str | None:
+    for e in _sorted(endings):
+        if rv.endswith(e):
+            return rv[: -len(e)]
+    return None
+
+
+def _strip_after_a(rv: str, group1: tuple[str, ...], group2: tuple[str, ...]) -> str | None:
+    # окончания группы 1 — только после «а»/«я» (сама буква остаётся)
+    candidates = [(e, True) for e in group1] + [(e, False) for e in group2]
+    candidates.sort(key=lambda c: len(c[0]), reverse=True)
+    for e, needs_a in candidates:
+        if not rv.endswith(e):
+            continue
+        head = rv[: -len(e)]
+        if needs_a and not head.endswith(("а", "я")):
+            continue
+        return head
+    return None
+
+
+def _ru_adjectival(rv: str) -> str | None:
+    head = _strip(rv, RU_ADJECTIVE)
+    if head is None:
+        return None
+    participle = _strip_after_a(head, RU_PARTICIPLE_1, RU_PARTICIPLE_2)
+    return participle if participle is not None else head
+
+
+def stem_ru(word: str) -> str:
+    word = word.lower().replace("ё", "е")
+    rv_start, r2_start = _ru_regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # шаг 1
+    head = _strip_after_a(rv, RU_PERFECTIVE_1, RU_PERFECTIVE_2)
+    if head is None:
+        reflexive = _strip(rv, RU_REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        for step in (
+            _ru_adjectival,
+            lambda s: _strip_after_a(s, RU_VERB_1, RU_VERB_2),
+            lambda s: _strip(s, RU_NOUN),
+        ):
+            head = step(rv)
+            if head is not None:
+                break
+    rv = head if head is not None else rv
+
+    # шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # шаг 3: словообразовательные — только в R2
+    r2 = rv[r2_start - rv_start:]
+    for e in RU_DERIVATIONAL:
+        if r2.endswith(e):
+            rv = rv[: -len(e)]
+            break
+
+    # шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        head = _strip(rv, RU_SUPERLATIVE)
+        if head is not None:
+            rv = head[:-1] if head.endswith("нн") else head
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+# =========================
+# kk: аффиксы
+# =========================
+KK_VOWELS = set("аәеиоөұүыіэюя")
+
+KK_SUFFIXES = _sorted((
+    # множественное число
+    "лар", "лер", "дар", "дер", "тар", "тер",
+    # притяжательные
+    "ымыз", "іміз", "ыңыз", "іңіз", "мыз", "міз", "ңыз", "ңіз",
+    "ым", "ім", "ың", "ің", "сы", "сі",
+    # падежи
+    "ның", "нің", "дың", "дің", "тың", "тің",
+    "ға", "ге", "қа", "ке", "на", "не",
+    "ны", "ні", "ды", "ді", "ты", "ті",
+    "нда", "нде", "да", "де", "та", "те",
+    "нан", "нен", "дан", "ден", "тан", "тен",
+    "мен", "бен", "пен",
+))
+
+KK_MIN_STEM = 3
+KK_MAX_LAYERS = 3
+
+
+def _has_vowel(text: str) -> bool:
+    return any(ch in KK_VOWELS for ch in text)
+
+
+def stem_kk(word: str) -> str:
+    word = word.lower()
+    for _ in range(KK_MAX_LAYERS):
+        for suffix in KK_SUFFIXES:
+            head = word[: -len(suffix)]
+            if word.endswith(suffix) and len(head) >= KK_MIN_STEM and _has_vowel(head):
+                word = head
+                break
+        else:
+            break
+    return word
+
+
+# =========================
+# en: лёгкое отсечение
+# =========================
+EN_SUFFIXES = _sorted(("ing", "er", "ed", "ly"))
+
+
+def stem_en(word: str) -> str:
+    word = word.lower()
+    # сначала множественное число, потом словообразование: weddings -> wedding -> wedd
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in EN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+STEMMERS = {
+    "ru": stem_ru,
+    "kk": stem_kk,
+    "en": stem_en,
+}
+
+
+def stem_text(text: str, lang: str) -> str:
+    """
+    Текст поля -> строка основ через пробел (то, что кладём в индекс).
+    """
+    stem = STEMMERS[lang]
+    return " ".join(stem(w) for w in words(text))
+
+
+def query_stems(text: str) -> dict[str, list[str]]:
+    """
+    Слова запроса -> основы по языкам. Кириллица идёт в ru и kk
+    (казахские буквы — только в kk), латиница — в en.
+    """
+    result: dict[str, list[str]] = {"ru": [], "kk": [], "en": []}
+    for w in words(text):
+        if len(w) < 2 or w in STOPWORDS:
+            continue
+        if CYRILLIC_RE.search(w):
+            if not KAZAKH_ONLY_RE.search(w):
+                result["ru"].append(stem_ru(w))
+            result["kk"].append(stem_kk(w))
+        else:
+            result["en"].append(stem_en(w))
+    return {lang: list(dict.fromkeys(stems)) for lang, stems in result.items()}
@@ -1,3 +1,104 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from catalog import search
+from catalog.models import Category, Service
+
+
+# FTS5 есть только в SQLite; на PostgreSQL поиск идёт через icontains
+@skipUnless(connection.vendor == "sqlite", "SQLite FTS5 only")
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        self.photo = Category.objects.create(
+            name_ru="Фотосъёмка",
+            name_kk="Фототүсірілім",
+            name_en="Photography",
+            description_ru="Репортаж с мероприятия",
+        )
+        self.sound = Category.objects.create(
+            name_ru="Звук",
+            name_en="Sound",
+            description_ru="Фото зоны не входят",
+        )
+        self.service = Service.objects.create(
+            category=self.sound,
+            name_ru="Колонки",
+            name_en="Speakers",
+            description_ru="Акустика для банкета",
+        )
+
+    def test_ranks_name_match_above_description(self):
+        self.assertTrue(search.fts_available())
+        ids = list(search.search_categories(Category.objects.all(), "фото").values_list("id", flat=True))
+        self.assertEqual(ids, [self.photo.id, self.sound.id])
+
+    def test_index_follows_save_and_delete(self):
+        qs = Service.objects.all()
+        self.assertEqual(list(search.search_services(qs, "speak")), [self.service])
+
+        self.service.name_en = "Loudspeakers"
+        self.service.save()
+        self.assertEqual(list(search.search_services(qs, "speak")), [])
+        self.assertEqual(list(search.search_services(qs, "loud")), [self.service])
+        # категория находится и по своим услугам
+        self.assertEqual(list(search.search_categories(Category.objects.all(), "банкет")), [self.sound])
+
+        self.service.delete()
+        self.assertEqual(list(search.search_services(qs, "loud")), [])
+
+    def test_matches_other_word_forms(self):
+        Service.objects.create(category=self.photo, name_ru="Фотограф на свадьбу", name_en="Wedding photographer")
+        qs = Service.objects.all()
+        self.assertEqual([s.name_ru for s in search.search_services(qs, "фотографы")], ["Фотограф на свадьбу"])
+        self.assertEqual([s.name_ru for s in search.search_services(qs, "свадебный фотографа")], ["Фотограф на свадьбу"])
+        self.assertEqual([s.name_ru for s in search.search_services(qs, "weddings")], ["Фотограф на свадьбу"])
+        # служебные слова сами по себе ничего не находят
+        self.assertEqual(list(search.search_services(qs, "на")), [])
+
+    def test_typos_and_mixed_script_fall_back_to_trigrams(self):
+        video = Service.objects.create(category=self.photo, name_ru="Видеограф", name_en="Videographer")
+        photo = Service.objects.create(category=self.photo, name_ru="Фотограф", name_en="Photographer")
+        qs = Service.objects.all()
+        # латинская «a» внутри кириллического слова
+        self.assertEqual(list(search.search_services(qs, "фотогрaф"))[:1], [photo])
+        self.assertEqual(list(search.search_services(qs, "видиограф"))[:1], [video])
+        self.assertEqual(list(search.search_categories(Category.objects.all(), "видеогрф")), [self.photo])
+        self.assertEqual(list(search.search_services(qs, "абвгдеж")), [])
+
+
+class AutocompleteAPITests(TestCase):
+    def setUp(self):
+        self.photo = Category.objects.create(name_ru="Фотосъёмка", name_en="Photography", sort_order=1)
+        self.wedding = Service.objects.create(category=self.photo, name_ru="Свадебный фотограф", name_en="Wedding photographer")
+        self.hidden = Service.objects.create(category=self.photo, name_ru="Фотобудка", is_active=False)
+
+    def _names(self, q, lang="ru", **params):
+        response = self.client.get("/api/autocomplete/", {"q": q, **params}, HTTP_ACCEPT_LANGUAGE=lang)
+        self.assertEqual(response.status_code, 200)
+        return [r["name"] for r in response.json()["results"]]
+
+    def test_prefix_of_any_word_in_current_language(self):
+        self.assertEqual(self._names("фото"), ["Фотосъёмка", "Свадебный фотограф"])
+        self.assertEqual(self._names("фото", limit=1), ["Фотосъёмка"])
+        self.assertEqual(self._names("wed", lang="en"), ["Wedding photographer"])
+        self.assertEqual(self._names("wed"), [])
+        self.assertEqual(self._names(""), [])
+
+    def test_follows_catalog_changes(self):
+        self.wedding.name_ru = "Репортаж со свадьбы"
+        self.wedding.save()
+        self.assertEqual(self._names("свад"), ["Репортаж со свадьбы"])
+        self.assertEqual(self._names("фотобуд"), [])
+
+
+class CatalogAPITests(TestCase):
+    def test_image_urls_keep_their_shape(self):
+        category = Category.objects.create(name_ru="Фото", image="categories/photo.jpg")
+        Service.objects.create(category=category, name_ru="Фотограф", image="services/photographer.jpg")
+
+        categories = self.client.get("/api/categories/").json()
+        self.assertEqual(categories[0]["image"], "http://testserver/media/categories/photo.jpg")
+        services = self.client.get(f"/api/categories/{category.id}/services/").json()
+        self.assertEqual(services[0]["image"], "/media/services/photographer.jpg")
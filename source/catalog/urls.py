@@ -4,7 +4,7 @@ from __future__ import annotations
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CategoryListViewSet, CategoryServicesAPIView
+from .views import AutocompleteAPIView, CategoryListViewSet, CategoryServicesAPIView
 
 router = DefaultRouter()
 router.register(r"categories", CategoryListViewSet, basename="category")
@@ -12,4 +12,5 @@ router.register(r"categories", CategoryListViewSet, basename="category")
 urlpatterns = [
     path("", include(router.urls)),
     path("categories/<int:category_id>/services/", CategoryServicesAPIView.as_view(), name="category-services"),
+    path("autocomplete/", AutocompleteAPIView.as_view(), name="autocomplete"),
 ]
@@ -1,51 +1,118 @@
 # catalog/views.py
 from __future__ import annotations
 
-from rest_framework import serializers, status, views
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.utils.translation import get_language
+from rest_framework import serializers, status, views, viewsets
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .models import Category, Service
+from . import autocomplete
+from .conditional import conditional_catalog
+from .snapshot import get_snapshot
 
 
-class CategorySerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Category
-        fields = ("id", "name", "description", "image", "sort_order", "is_active")
+class _ImageURLField(serializers.Field):
+    # как ImageField у ModelSerializer: абсолютный URL, если в context есть
+    # request, иначе относительный; None — картинки нет
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        return request.build_absolute_uri(value.url) if request else value.url
 
 
-class ServiceSerializer(serializers.ModelSerializer):
-    category_id = serializers.IntegerField(source="category.id", read_only=True)
-    category_name = serializers.CharField(source="category.name", read_only=True)
+class CategorySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    description = serializers.CharField()
+    image = _ImageURLField()
+    sort_order = serializers.IntegerField()
+    is_active = serializers.BooleanField()
 
-    class Meta:
-        model = Service
-        fields = (
-            "id",
-            "category_id",
-            "category_name",
-            "name",
-            "description",
-            "image",
-            "base_price",
-            "unit",
-            "allow_multiple",
-            "sort_order",
-            "is_active",
-        )
 
+class ServiceSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    category_id = serializers.IntegerField()
+    category_name = serializers.SerializerMethodField()
+    name = serializers.CharField()
+    description = serializers.CharField()
+    image = _ImageURLField()
+    base_price = serializers.IntegerField(allow_null=True)
+    unit = serializers.CharField()
+    allow_multiple = serializers.BooleanField()
+    sort_order = serializers.IntegerField()
+    is_active = serializers.BooleanField()
 
-class CategoryListViewSet(ReadOnlyModelViewSet):
-    queryset = Category.objects.all().order_by("sort_order", "name_ru")
-    serializer_class = CategorySerializer
+    def get_category_name(self, obj):
+        return self.context["snapshot"].categories_by_id[obj.category_id].name
 
 
+@method_decorator(conditional_catalog, name="dispatch")
+class CategoryListViewSet(viewsets.ViewSet):
+    """
+    GET /api/categories/, /api/categories/<pk>/ — из снимка каталога.
+    """
+
+    def list(self, request):
+        snapshot = get_snapshot()
+        data = CategorySerializer(snapshot.all_categories(), many=True, context={"request": request}).data
+        return Response(data, status=status.HTTP_200_OK)
+
+    def retrieve(self, request, pk=None):
+        category = get_snapshot().categories_by_id.get(int(pk)) if str(pk).isdigit() else None
+        if category is None:
+            raise NotFound()
+        return Response(CategorySerializer(category, context={"request": request}).data, status=status.HTTP_200_OK)
+
+
+@method_decorator(conditional_catalog, name="dispatch")
 class CategoryServicesAPIView(views.APIView):
     """
     GET /api/categories/<category_id>/services/
     """
 
     def get(self, request, category_id: int):
-        qs = Service.objects.filter(category_id=category_id).order_by("sort_order", "name_ru")
-        data = ServiceSerializer(qs, many=True).data
+        snapshot = get_snapshot()
+        services = snapshot.services(category_id, is_admin=True, lang="ru")
+        # без request: картинки услуг в этом API всегда были относительными /media/...
+        context = {"snapshot": snapshot}
+        data = ServiceSerializer(services, many=True, context=context).data
         return Response(data, status=status.HTTP_200_OK)
+
+
+class AutocompleteAPIView(views.APIView):
+    """
+    GET /api/autocomplete/?q=<префикс>&limit=<N>
+    Подсказки по названиям услуг и категорий на текущем языке (из памяти, без БД).
+    """
+
+    def _entry_url(self, entry: autocomplete.Entry) -> str:
+        if entry.kind == autocomplete.SERVICE:
+            return reverse("main:service_detail", args=[entry.id])
+        return reverse("main:category_services", args=[entry.id])
+
+    def get(self, request):
+        query = (request.query_params.get("q") or "").strip()
+        try:
+            limit = int(request.query_params.get("limit") or autocomplete.DEFAULT_LIMIT)
+        except ValueError:
+            limit = autocomplete.DEFAULT_LIMIT
+
+        user = request.user
+        is_admin = bool(user and user.is_authenticated and (user.is_staff or user.is_superuser))
+
+        entries = autocomplete.suggest(query, lang=get_language(), limit=limit, include_inactive=is_admin)
+        data = [
+            {
+                "type": entry.kind,
+                "id": entry.id,
+                "name": entry.name,
+                "category_id": entry.category_id,
+                "category_name": entry.category_name,
+                "url": self._entry_url(entry),
+            }
+            for entry in entries
+        ]
+        return Response({"query": query, "results": data}, status=status.HTTP_200_OK)
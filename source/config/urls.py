@@ -1,8 +1,10 @@
 # config/urls.py
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from main.media import serve_media
+from main.staticfiles import serve_static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -26,5 +28,12 @@ urlpatterns = [
     path("rosetta/", include("rosetta.urls")),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# media — всегда через Django: фото КП закрыты, отдачу берёт на себя прокси
+urlpatterns += [
+    re_path(r"^%s(?P<path>.*)$" % settings.MEDIA_URL.lstrip("/"), serve_media),
+]
+
+if not settings.DEBUG and settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r"^%s(?P<path>.*)$" % settings.STATIC_URL.lstrip("/"), serve_static),
+    ]
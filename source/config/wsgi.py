@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Поднимаем Chromium для PDF смет заранее, а не на первом скачивании.
+from django.conf import settings  # noqa: E402
+
+if settings.KP_PDF_POOL_PREWARM:
+    from kp.pdf import get_pool  # noqa: E402
+
+    get_pool().start()
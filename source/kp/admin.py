@@ -1,7 +1,7 @@
 # kp/admin.py
 from django.contrib import admin
 
-from .models import EventType, KPTemplate, Proposal, ProposalItem
+from .models import EventType, KPTemplate, PDFRenderJob, Proposal, ProposalItem
 
 
 @admin.register(EventType)
@@ -27,10 +27,12 @@ class ProposalItemInline(admin.TabularInline):
 
 @admin.register(Proposal)
 class ProposalAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "status", "owner", "customer", "updated_at")
+    list_display = ("id", "title", "status", "owner", "customer", "event_datetime", "updated_at")
     list_filter = ("status",)
     search_fields = ("id", "title", "owner__username", "customer__username")
     autocomplete_fields = ("owner", "customer", "template")
+    # итоги ведут сигналы позиций — в форме только для чтения
+    readonly_fields = ("subtotal", "extra", "total")
     inlines = [ProposalItemInline]
 
 
@@ -39,3 +41,11 @@ class ProposalItemAdmin(admin.ModelAdmin):
     list_display = ("id", "proposal", "service", "qty", "price", "discount")
     search_fields = ("proposal__id", "service__name")
     autocomplete_fields = ("proposal", "service")
+
+
+@admin.register(PDFRenderJob)
+class PDFRenderJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "proposal", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("proposal__id",)
+    raw_id_fields = ("proposal", "requested_by")
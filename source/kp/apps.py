@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KpConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
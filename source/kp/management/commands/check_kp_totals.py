@@ -0,0 +1,30 @@
+# kp/management/commands/check_kp_totals.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kp import pricing
+
+
+class Command(BaseCommand):
+    help = "Compare stored proposal totals (subtotal/extra/total) with their items and optionally repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Rewrite drifted totals from the items.")
+        parser.add_argument("--kp", type=int, action="append", default=None, help="Proposal id, repeatable (default: all).")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = pricing.find_drift(options["kp"])
+            for pk, stored, expected in drift:
+                self.stdout.write(f"KP {pk}: stored {stored} != expected {expected}")
+            if options["fix"] and drift:
+                pricing.recalculate([pk for pk, _, _ in drift])
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All proposal totals match their items."))
+        elif options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} proposal(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} proposal(s) drifted; run with --fix to repair."))
@@ -0,0 +1,219 @@
+# kp/management/commands/export_kp_pdfs.py
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time as dt_time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.utils import timezone, translation
+from django.utils.dateparse import parse_date
+
+from kp.models import Proposal, ProposalItem
+from kp.pdf import shutdown_pool
+from kp.pdf_admission import AdmissionRejected
+from kp.printing import render_proposal_pdf
+
+DATE_FIELDS = {
+    "created": "created_at",
+    "updated": "updated_at",
+    "event": "event_datetime",
+}
+
+
+def _arcname(kp: Proposal) -> str:
+    return f"KP_{kp.id}.pdf"
+
+
+def _parts_dir(output: Path) -> Path:
+    # готовые PDF до сборки архива; переживают обрыв и подхватываются при повторе
+    return output.with_name(output.name + ".parts")
+
+
+class Command(BaseCommand):
+    help = "Render PDFs of matching proposals in parallel into a zip archive (resumable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output",
+            help="Path to the .zip archive (extended if it already exists; "
+            "finished PDFs wait in <output>.parts/ until the archive is rebuilt).",
+        )
+        parser.add_argument(
+            "--status",
+            action="append",
+            default=None,
+            help="Proposal status, repeatable (default: SENT and CONFIRMED).",
+        )
+        parser.add_argument("--owner", type=str, default="", help="Owner username or id.")
+        parser.add_argument("--since", type=str, default="", help="YYYY-MM-DD, inclusive.")
+        parser.add_argument("--until", type=str, default="", help="YYYY-MM-DD, inclusive.")
+        parser.add_argument("--date-field", choices=sorted(DATE_FIELDS), default="updated")
+        parser.add_argument("--workers", type=int, default=0, help="Parallel renders (default: KP_PDF_POOL_SIZE).")
+        parser.add_argument("--language", type=str, default="", help="Language of the documents (default: LANGUAGE_CODE).")
+        parser.add_argument(
+            "--max-wait",
+            type=float,
+            default=600.0,
+            help="Seconds to wait per proposal for a free render slot before giving up on it (default: 600).",
+        )
+
+    # ----- выборка -----
+    def _parse_day(self, raw: str, *, end: bool):
+        day = parse_date(raw)
+        if not day:
+            raise CommandError(f"Bad date: {raw!r}, expected YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, dt_time.max if end else dt_time.min))
+
+    def _queryset(self, options):
+        statuses = options["status"] or [Proposal.Status.SENT, Proposal.Status.CONFIRMED]
+        unknown = set(statuses) - set(Proposal.Status.values)
+        if unknown:
+            raise CommandError(f"Unknown status: {', '.join(sorted(unknown))}")
+
+        qs = (
+            Proposal.objects
+            .filter(status__in=statuses)
+            .select_related("customer", "owner")
+            .prefetch_related(
+                Prefetch("items", queryset=ProposalItem.objects.select_related("service").order_by("id"))
+            )
+            .order_by("id")
+        )
+
+        owner = (options["owner"] or "").strip()
+        if owner:
+            owner_q = Q(owner__username=owner)
+            if owner.isdigit():
+                owner_q |= Q(owner_id=int(owner))
+            qs = qs.filter(owner_q)
+
+        field = DATE_FIELDS[options["date_field"]]
+        if options["since"]:
+            qs = qs.filter(**{f"{field}__gte": self._parse_day(options["since"], end=False)})
+        if options["until"]:
+            qs = qs.filter(**{f"{field}__lte": self._parse_day(options["until"], end=True)})
+        return qs
+
+    # ----- рендер -----
+    def _render(self, kp: Proposal, language: str, parts: Path) -> float:
+        started_at = time.perf_counter()
+        deadline = time.monotonic() + self.max_wait
+        try:
+            while True:
+                if self.stop.is_set():
+                    raise RuntimeError("interrupted")
+                try:
+                    with translation.override(language):
+                        _key, path = render_proposal_pdf(kp, items=list(kp.items.all()))
+                    break
+                except AdmissionRejected as e:
+                    # сайт сейчас тоже рендерит — ждём своей очереди, но не вечно:
+                    # смета уйдёт в failed и повторится при следующем запуске
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f"no free render slot for {self.max_wait:.0f}s") from e
+                    if self.stop.wait(min(e.retry_after, remaining)):
+                        raise RuntimeError("interrupted") from e
+        finally:
+            # соединение этого потока иначе висит до конца команды
+            connection.close()
+
+        # копия под временным именем + rename: в parts/ не бывает недописанных PDF
+        target = parts / _arcname(kp)
+        tmp = target.with_name(target.name + ".tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+        return time.perf_counter() - started_at
+
+    def _build_archive(self, output: Path, parts: Path) -> None:
+        """
+        Архив целиком пересобирается во временный файл и подменяет старый:
+        обрыв посреди записи не оставит битый zip.
+        """
+        ready = sorted(parts.glob("*.pdf")) if parts.is_dir() else []
+        if not ready:
+            shutil.rmtree(parts, ignore_errors=True)
+            return
+        tmp = output.with_name(output.name + ".tmp")
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as dst:
+            names = {p.name for p in ready}
+            if output.exists():
+                with zipfile.ZipFile(output) as src:
+                    for info in src.infolist():
+                        if info.filename not in names:
+                            dst.writestr(info, src.read(info))
+            for part in ready:
+                dst.write(part, arcname=part.name)
+        os.replace(tmp, output)
+        shutil.rmtree(parts, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        output = Path(options["output"]).resolve()
+        language = options["language"] or settings.LANGUAGE_CODE
+        workers = max(1, int(options["workers"]) or int(settings.KP_PDF_POOL_SIZE))
+        self.max_wait = max(0.0, options["max_wait"])
+        self.stop = threading.Event()
+
+        parts = _parts_dir(output)
+        done: set[str] = set()
+        if output.exists():
+            try:
+                with zipfile.ZipFile(output) as zf:
+                    done = set(zf.namelist())
+            except zipfile.BadZipFile:
+                raise CommandError(f"{output} is not a readable zip archive; move it away or pick another path.")
+        parts.mkdir(parents=True, exist_ok=True)
+        done |= {p.name for p in parts.glob("*.pdf")}
+
+        proposals = list(self._queryset(options))
+        todo = [kp for kp in proposals if _arcname(kp) not in done]
+        total = len(proposals)
+        skipped = total - len(todo)
+
+        self.stdout.write(
+            self.style.WARNING(
+                f"export_kp_pdfs: {total} proposal(s), {skipped} already in archive, "
+                f"{len(todo)} to render with {workers} worker(s)"
+            )
+        )
+
+        failed = 0
+        finished = skipped
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kp-export")
+        try:
+            futures = {executor.submit(self._render, kp, language, parts): kp for kp in todo}
+            for future in as_completed(futures):
+                kp = futures[future]
+                finished += 1
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"[{finished}/{total}] {_arcname(kp)} failed: {e}")
+                    continue
+                self.stdout.write(f"[{finished}/{total}] {_arcname(kp)} ({elapsed:.1f}s)")
+        except KeyboardInterrupt:
+            # ещё не начатые рендеры отменяем, ждущие слота потоки будим и выпускаем
+            self.stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stderr.write("Interrupted; rerun the same command to continue.")
+            raise
+        else:
+            executor.shutdown(wait=True)
+        finally:
+            shutdown_pool()
+
+        self._build_archive(output, parts)
+
+        if failed:
+            raise CommandError(f"{failed} proposal(s) failed; rerun to retry them.")
+        self.stdout.write(self.style.SUCCESS(f"Export done: {output}"))
@@ -0,0 +1,31 @@
+# kp/management/commands/kp_pdf_stats.py
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from kp.pdf_admission import admission_stats
+
+
+class Command(BaseCommand):
+    help = "Show machine-wide PDF render admission counters: queue depth, wait time and rejections."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the counters as one JSON object.")
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after reading them.")
+
+    def handle(self, *args, **options):
+        stats = admission_stats(reset=options["reset"])
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, sort_keys=True))
+            return
+
+        for name in sorted(stats):
+            self.stdout.write(f"{name}: {stats[name]}")
+        rejected = stats["rejected_queue_full"] + stats["rejected_timeout"]
+        summary = (
+            f"{stats['admitted']} admitted ({stats['queued']} after waiting, "
+            f"avg {stats['wait_seconds_avg']:.2f}s), {rejected} rejected"
+        )
+        self.stdout.write(self.style.SUCCESS(summary + (" — counters reset" if options["reset"] else "")))
@@ -0,0 +1,152 @@
+# kp/management/commands/kp_pdf_worker.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone, translation
+
+from kp.models import PDFRenderJob
+from kp.pdf import shutdown_pool
+from kp.pdf_admission import AdmissionRejected
+from kp.printing import render_proposal_pdf
+
+
+class Command(BaseCommand):
+    help = "Render queued proposal PDFs (PDFRenderJob) into the PDF cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=0, help="Worker threads (default: KP_PDF_POOL_SIZE).")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds between polls when the queue is empty.")
+        parser.add_argument("--max-attempts", type=int, default=3)
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=None,
+            help="Seconds after which a RUNNING job is considered abandoned and re-queued "
+            "(default: KP_PDF_JOB_STALE_AFTER). Checked periodically, not only at startup.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+
+    def handle(self, *args, **options):
+        concurrency = int(options["concurrency"]) or int(settings.KP_PDF_POOL_SIZE)
+        self.max_attempts = max(1, int(options["max_attempts"]))
+        self.sleep = max(0.1, float(options["sleep"]))
+        self.once = bool(options["once"])
+        self.stop = threading.Event()
+        self.stale_after = (
+            settings.KP_PDF_JOB_STALE_AFTER if options["stale_after"] is None else int(options["stale_after"])
+        )
+        # проверяем не чаще, чем раз в минуту (и не реже, чем раз в stale_after)
+        self.stale_check_every = max(1.0, min(60.0, self.stale_after / 2))
+        self.stale_checked_at = float("-inf")
+        self.stale_lock = threading.Lock()
+
+        self._requeue_stale()
+        self.stdout.write(self.style.WARNING(f"kp_pdf_worker: started, concurrency={concurrency}"))
+
+        threads = [
+            threading.Thread(target=self._loop, name=f"kp-pdf-worker-{i}", daemon=True)
+            for i in range(max(1, concurrency))
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for t in threads:
+                t.join(timeout=30)
+        finally:
+            shutdown_pool()
+
+        self.stdout.write(self.style.SUCCESS("kp_pdf_worker: stopped"))
+
+    # ----- очередь -----
+    def _requeue_stale(self) -> None:
+        # задание, брошенное упавшим рендером или убитым воркером, иначе
+        # так и висело бы RUNNING до перезапуска
+        with self.stale_lock:
+            if time.monotonic() - self.stale_checked_at < self.stale_check_every:
+                return
+            self.stale_checked_at = time.monotonic()
+        n = PDFRenderJob.requeue_stale(self.stale_after)
+        if n:
+            self.stdout.write(self.style.WARNING(f"kp_pdf_worker: re-queued {n} stale job(s)"))
+
+    def _claim(self) -> Optional[PDFRenderJob]:
+        """
+        Оптимистичный захват: несколько воркеров (и процессов) не возьмут одно задание,
+        потому что UPDATE ... WHERE status=PENDING пройдёт только у одного.
+        """
+        while True:
+            job_id = (
+                PDFRenderJob.objects
+                .filter(status=PDFRenderJob.Status.PENDING)
+                .order_by("id")
+                .values_list("id", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+
+            claimed = PDFRenderJob.objects.filter(id=job_id, status=PDFRenderJob.Status.PENDING).update(
+                status=PDFRenderJob.Status.RUNNING,
+                started_at=timezone.now(),
+                attempts=F("attempts") + 1,
+            )
+            if claimed:
+                return PDFRenderJob.objects.select_related("proposal__customer", "proposal__owner").get(id=job_id)
+
+    def _process(self, job: PDFRenderJob) -> None:
+        kp = job.proposal
+        started_at = time.perf_counter()
+        try:
+            with translation.override(job.language or settings.LANGUAGE_CODE):
+                cache_key, _path = render_proposal_pdf(kp)
+        except AdmissionRejected:
+            # все слоты рендера заняты сайтом — это не ошибка задания, вернём в очередь
+            PDFRenderJob.objects.filter(id=job.id).update(
+                status=PDFRenderJob.Status.PENDING,
+                attempts=F("attempts") - 1,
+            )
+            self.stop.wait(self.sleep)
+            return
+        except Exception as e:
+            failed = job.attempts >= self.max_attempts
+            job.status = PDFRenderJob.Status.FAILED if failed else PDFRenderJob.Status.PENDING
+            job.error = str(e)[:2000]
+            job.finished_at = timezone.now() if failed else None
+            job.save(update_fields=["status", "error", "finished_at"])
+            self.stderr.write(f"job={job.id} kp={kp.id} attempt={job.attempts} failed: {e}")
+            return
+
+        job.status = PDFRenderJob.Status.DONE
+        job.cache_key = cache_key
+        job.error = ""
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "cache_key", "error", "finished_at"])
+        self.stdout.write(f"job={job.id} kp={kp.id} done in {time.perf_counter() - started_at:.2f}s")
+
+    def _loop(self) -> None:
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                self._requeue_stale()
+                job = self._claim()
+                if job is None:
+                    if self.once:
+                        return
+                    self.stop.wait(self.sleep)
+                    continue
+                self._process(job)
+        finally:
+            connection.close()
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-17 06:46
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kp', '0003_pdfrenderjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='proposal',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, upload_to='kp/photos/', validators=[main.storage.ImageUploadValidator()]),
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.2.10 on 2026-10-17 06:56
+
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# ключ в JSON из notes -> (колонка, max_length)
+NOTES_COLUMNS = {
+    "event_title": ("event_title", 200),
+    "event_address": ("event_location", 240),
+    "event_address_url": ("event_location_url", 500),
+    "drive_url": ("drive_link", 500),
+    "event_description": ("event_description", None),
+    "customer_full_name": ("customer_full_name", 200),
+    "customer_phone": ("customer_phone", 50),
+    "customer_email": ("customer_email", 254),
+}
+
+
+def _parse_dt(raw):
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    try:
+        dt = parse_datetime(raw) or datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt
+
+
+def notes_to_columns(apps, schema_editor):
+    Proposal = apps.get_model("kp", "Proposal")
+    for kp in Proposal.objects.filter(notes__startswith="{").iterator():
+        try:
+            data = json.loads(kp.notes)
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+
+        for key, (column, max_length) in NOTES_COLUMNS.items():
+            value = str(data.pop(key, "") or "").strip()
+            if value:
+                setattr(kp, column, value[:max_length] if max_length else value)
+
+        event_dt = _parse_dt(data.pop("event_datetime", ""))
+        if kp.event_datetime is None:
+            kp.event_datetime = event_dt
+        kp.requested_at = _parse_dt(data.pop("customer_requested_at", ""))
+
+        kp.notes = str(data.pop("admin_notes", "") or "")
+        kp.meta = data
+        kp.save(update_fields=[
+            *(column for column, _ in NOTES_COLUMNS.values()),
+            "event_datetime", "requested_at", "meta", "notes",
+        ])
+
+
+def columns_to_notes(apps, schema_editor):
+    Proposal = apps.get_model("kp", "Proposal")
+    for kp in Proposal.objects.iterator():
+        data = dict(kp.meta or {})
+        for key, (column, _) in NOTES_COLUMNS.items():
+            data[key] = getattr(kp, column)
+        if kp.event_datetime:
+            data["event_datetime"] = timezone.localtime(kp.event_datetime).strftime("%Y-%m-%dT%H:%M")
+        if kp.requested_at:
+            data["customer_requested_at"] = kp.requested_at.isoformat()
+        if kp.notes:
+            data["admin_notes"] = kp.notes
+        kp.notes = json.dumps(data, ensure_ascii=False)
+        kp.save(update_fields=["notes"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kp', '0004_alter_proposal_photo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='customer_email',
+            field=models.CharField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='customer_full_name',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='customer_phone',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='event_location_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='meta',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='proposal',
+            name='drive_link',
+            field=models.URLField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['status', 'event_datetime'], name='kp_proposal_status_13f9ab_idx'),
+        ),
+        migrations.RunPython(notes_to_columns, columns_to_notes),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.10 on 2026-10-17 06:59
+
+from django.db import migrations, models
+
+
+# копия формулы kp/pricing.py на момент миграции — живой код сюда не импортируем
+def line_total(qty, price, discount):
+    unit = max((price or 0) - (discount or 0), 0)
+    return int(int(qty or 0) * unit)
+
+
+def totals(subtotal):
+    extra = (int(subtotal) * 20 + 50) // 100
+    return subtotal, extra, subtotal + extra
+
+
+def fill_totals(apps, schema_editor):
+    Proposal = apps.get_model("kp", "Proposal")
+    ProposalItem = apps.get_model("kp", "ProposalItem")
+    subtotals = {}
+    for proposal_id, qty, price, discount in ProposalItem.objects.values_list("proposal_id", "qty", "price", "discount"):
+        subtotals[proposal_id] = subtotals.get(proposal_id, 0) + line_total(qty, price, discount)
+    for proposal_id, subtotal in subtotals.items():
+        subtotal, extra, total = totals(subtotal)
+        Proposal.objects.filter(pk=proposal_id).update(subtotal=subtotal, extra=extra, total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kp', '0005_proposal_structured_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposal',
+            name='extra',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='subtotal',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='proposal',
+            name='total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,13 @@
 # kp/models.py
 import secrets
+from datetime import timedelta
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from catalog.models import Service
+from main.storage import validate_image_upload
 
 
 class EventType(models.Model):
@@ -125,17 +128,30 @@ class Proposal(models.Model):
 
     title = models.CharField(max_length=200)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.DRAFT)
+    # заметки админа (свободный текст)
     notes = models.TextField(blank=True, default="")
 
     # Контекст мероприятия
     event_title = models.CharField(max_length=200, blank=True, default="")
     event_datetime = models.DateTimeField(null=True, blank=True)
+    # адрес и ссылка на него (2ГИС/Google)
     event_location = models.CharField(max_length=240, blank=True, default="")
+    event_location_url = models.CharField(max_length=500, blank=True, default="")
     event_description = models.TextField(blank=True, default="")
-    drive_link = models.URLField(blank=True, default="")
+    drive_link = models.URLField(max_length=500, blank=True, default="")
+
+    # Заказчик для печати: если пусто — берётся из профиля
+    customer_full_name = models.CharField(max_length=200, blank=True, default="")
+    customer_phone = models.CharField(max_length=50, blank=True, default="")
+    customer_email = models.CharField(max_length=254, blank=True, default="")
+    # когда клиент отправил смету менеджеру
+    requested_at = models.DateTimeField(null=True, blank=True)
+
+    # прочее без своей колонки
+    meta = models.JSONField(default=dict, blank=True)
 
     # фото/обложка КП
-    photo = models.ImageField(upload_to="kp/photos/", blank=True, null=True)
+    photo = models.ImageField(upload_to="kp/photos/", blank=True, null=True, validators=[validate_image_upload])
 
     # Снимок шаблона
     template_snapshot = models.JSONField(null=True, blank=True)
@@ -150,11 +166,21 @@ class Proposal(models.Model):
     fixed_extra = models.IntegerField(null=True, blank=True)
     fixed_total = models.IntegerField(null=True, blank=True)
 
+    # текущие итоги по позициям: считает kp/pricing.py, держат в актуальном
+    # состоянии сигналы ProposalItem (kp/signals.py)
+    subtotal = models.IntegerField(default=0, editable=False)
+    extra = models.IntegerField(default=0, editable=False)
+    total = models.IntegerField(default=0, editable=False)
+
+    TOTAL_FIELDS = ("subtotal", "extra", "total")
+
     class Meta:
         ordering = ["-updated_at"]
         indexes = [
             models.Index(fields=["customer", "status", "-updated_at"]),
             models.Index(fields=["public_token"]),
+            # автозакрытие и выборки по дате мероприятия
+            models.Index(fields=["status", "event_datetime"]),
         ]
 
     def __str__(self) -> str:
@@ -171,11 +197,19 @@ class Proposal(models.Model):
     def save(self, *args, **kwargs):
         self.ensure_public_token()
         self.ensure_template_snapshot()
+        if not args and kwargs.get("update_fields") is None and not kwargs.get("force_insert") and not self._state.adding:
+            # полное сохранение не пишет итоги: в объекте они могли устареть,
+            # а в базе их уже сдвинули сигналы позиций
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.TOTAL_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     @property
     def total_amount(self):
-        return sum(item.total_price for item in self.items.all())
+        # сумма строк без надбавки
+        return self.subtotal
 
 
 class ProposalItem(models.Model):
@@ -211,3 +245,60 @@ class ProposalItem(models.Model):
         if unit_price < 0:
             unit_price = 0
         return self.qty * unit_price
+
+
+class PDFRenderJob(models.Model):
+    """
+    Задание на фоновый рендер PDF сметы (воркер: manage.py kp_pdf_worker).
+    Сам файл лежит в кэше PDF под cache_key.
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "В очереди"
+        RUNNING = "RUNNING", "Рендерится"
+        DONE = "DONE", "Готово"
+        FAILED = "FAILED", "Ошибка"
+
+    proposal = models.ForeignKey(Proposal, on_delete=models.CASCADE, related_name="pdf_jobs")
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+
+    # в каком языке рендерить
+    language = models.CharField(max_length=10, blank=True, default="")
+
+    cache_key = models.CharField(max_length=64, blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"PDF #{self.proposal_id} ({self.status})"
+
+    @classmethod
+    def requeue_stale(cls, stale_after: int | None = None, **filters) -> int:
+        """
+        RUNNING дольше stale_after секунд — рендер упал или воркер убит:
+        возвращаем в очередь. Сколько заданий вернули.
+        """
+        if stale_after is None:
+            stale_after = settings.KP_PDF_JOB_STALE_AFTER
+        if stale_after <= 0:
+            return 0
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        return cls.objects.filter(status=cls.Status.RUNNING, started_at__lt=cutoff, **filters).update(
+            status=cls.Status.PENDING
+        )
@@ -0,0 +1,396 @@
+# kp/pdf.py
+"""
+Рендер PDF смет через Playwright/Chromium.
+
+Chromium запускается один раз на процесс (воркер gunicorn) и переиспользуется:
+пул из KP_PDF_POOL_SIZE слотов, у каждого слота свой поток, свой браузер
+и свой контекст. Sync API Playwright привязан к потоку, поэтому всё, что
+касается браузера, живёт строго внутри потока слота.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Псевдо-origin для ассетов печати: всё, что под ним, отдаём с диска через
+# перехват запросов (MEDIA_ROOT/STATIC_ROOT), в сеть Chromium не ходит.
+ASSET_ORIGIN = "http://kp-print.internal"
+
+# Ждём, пока все картинки декодированы, а шрифты загружены.
+READY_JS = """
+async () => {
+  await Promise.all(Array.from(document.images, (img) => img.decode().catch(() => null)));
+  if (document.fonts) {
+    await document.fonts.ready;
+  }
+}
+"""
+
+PDF_OPTIONS = {
+    "format": "A4",
+    "print_background": True,
+    "margin": {"top": "12mm", "bottom": "12mm", "left": "10mm", "right": "10mm"},
+}
+
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-first-run",
+]
+
+
+class PDFPoolClosed(RuntimeError):
+    pass
+
+
+def _strip_prefix(path: str, prefix: str) -> Optional[str]:
+    prefix = "/" + prefix.strip("/") + "/"
+    if not path.startswith(prefix):
+        return None
+    return unquote(path[len(prefix):])
+
+
+def resolve_asset(url: str) -> Optional[Path]:
+    """
+    http://kp-print.internal/media/... и /static/... -> файл на диске или None.
+    """
+    parsed = urlsplit(url)
+    if f"{parsed.scheme}://{parsed.netloc}" != ASSET_ORIGIN:
+        return None
+
+    candidates: list[Path] = []
+
+    rel = _strip_prefix(parsed.path, settings.MEDIA_URL)
+    if rel is not None:
+        try:
+            candidates.append(Path(safe_join(settings.MEDIA_ROOT, rel)))
+        except SuspiciousFileOperation:
+            return None
+
+    rel = _strip_prefix(parsed.path, settings.STATIC_URL)
+    if rel is not None:
+        if settings.STATIC_ROOT:
+            try:
+                candidates.append(Path(safe_join(settings.STATIC_ROOT, rel)))
+            except SuspiciousFileOperation:
+                return None
+        # dev: collectstatic мог не запускаться — ищем по STATICFILES_DIRS/app static
+        found = finders.find(rel)
+        if found:
+            candidates.append(Path(found))
+
+    for path in candidates:
+        if path.is_file():
+            return path
+    return None
+
+
+def _serve_asset(route) -> None:
+    path = resolve_asset(route.request.url)
+    if path is None:
+        logger.warning("PDF asset not found: %s", route.request.url)
+        route.fulfill(status=404, body="")
+        return
+    route.fulfill(path=str(path))
+
+
+def _read_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii", errors="ignore") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+class _Slot(threading.Thread):
+    """
+    Один слот пула: поток + Playwright + Chromium + переиспользуемый контекст.
+    Забирает задания из общей очереди пула.
+    """
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        super().__init__(name=f"kp-pdf-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.renders = 0
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._context = None
+
+    # ----- жизненный цикл браузера -----
+    def _launch(self) -> None:
+        from playwright.sync_api import sync_playwright  # type: ignore
+
+        started_at = time.perf_counter()
+        self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(args=CHROMIUM_ARGS)
+        self._context = self._browser.new_context()
+        self._context.route(f"{ASSET_ORIGIN}/**", _serve_asset)
+        self.renders = 0
+        self.launches += 1
+        logger.info(
+            "PDF pool slot=%s launched chromium in %.2fs",
+            self.index,
+            time.perf_counter() - started_at,
+        )
+
+    def _close(self) -> None:
+        for closer in (
+            lambda: self._context and self._context.close(),
+            lambda: self._browser and self._browser.close(),
+            lambda: self._playwright and self._playwright.stop(),
+        ):
+            try:
+                closer()
+            except Exception:
+                pass
+        self._playwright = None
+        self._browser = None
+        self._context = None
+
+    def _is_healthy(self) -> bool:
+        if self._browser is None or self._context is None:
+            return False
+        try:
+            return self._browser.is_connected()
+        except Exception:
+            return False
+
+    def _ensure_browser(self) -> None:
+        if not self._is_healthy():
+            if self._browser is not None:
+                logger.warning("PDF pool slot=%s browser is not healthy, relaunching", self.index)
+            self._close()
+            self._launch()
+
+    def _browser_rss_mb(self) -> Optional[float]:
+        """
+        Суммарный RSS всех процессов Chromium этого слота (Linux /proc).
+        None, если узнать не получилось.
+        """
+        try:
+            session = self._browser.new_browser_cdp_session()
+            try:
+                info = session.send("SystemInfo.getProcessInfo")
+            finally:
+                session.detach()
+        except Exception:
+            return None
+
+        total_kb = sum(_read_rss_kb(int(p.get("id") or 0)) for p in info.get("processInfo", []))
+        if not total_kb:
+            return None
+        return total_kb / 1024
+
+    def _maybe_recycle(self) -> None:
+        reason = ""
+        if self.pool.max_renders and self.renders >= self.pool.max_renders:
+            reason = f"renders={self.renders}"
+        elif self.pool.max_memory_mb:
+            rss = self._browser_rss_mb()
+            if rss is not None and rss >= self.pool.max_memory_mb:
+                reason = f"rss={rss:.0f}MB"
+
+        if reason:
+            logger.info("PDF pool slot=%s recycling chromium (%s)", self.index, reason)
+            self._close()
+
+    # ----- рендер -----
+    def _render(self, html: str, deadline: Optional[float]) -> bytes:
+        self._ensure_browser()
+        page = self._context.new_page()
+        try:
+            if deadline is not None:
+                # операции страницы сами обрываются к сроку заказа
+                page.set_default_timeout(max(1.0, deadline - time.monotonic()) * 1000)
+            page.emulate_media(media="print")
+            page.set_content(html, wait_until="load")
+            page.evaluate(READY_JS)
+            return page.pdf(**PDF_OPTIONS)
+        finally:
+            try:
+                page.close()
+            except Exception:
+                pass
+            self.renders += 1
+
+    def run(self) -> None:
+        if self.pool.prewarm:
+            try:
+                self._ensure_browser()
+            except Exception:
+                logger.exception("PDF pool slot=%s prewarm failed", self.index)
+                self._close()
+
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+
+            html, future, deadline = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                pdf_bytes = self._render(html, deadline)
+            except BaseException as e:
+                # браузер мог упасть посреди рендера — следующий заказ поднимет новый
+                self._close()
+                future.set_exception(e)
+            else:
+                future.set_result(pdf_bytes)
+                try:
+                    self._maybe_recycle()
+                except Exception:
+                    logger.exception("PDF pool slot=%s recycle check failed", self.index)
+                    self._close()
+
+        self._close()
+
+
+class BrowserPool:
+    """
+    Пул заранее запущенных Chromium на процесс.
+
+    size          — сколько PDF рендерится параллельно в одном процессе;
+    max_renders   — после скольких рендеров браузер перезапускается (0 = никогда);
+    max_memory_mb — потолок RSS браузера, после которого он перезапускается (0 = без контроля);
+    prewarm       — запускать Chromium сразу при старте пула, а не на первом заказе.
+    """
+
+    def __init__(self, *, size: int = 1, max_renders: int = 0, max_memory_mb: int = 0, prewarm: bool = False):
+        self.size = max(1, int(size))
+        self.max_renders = max(0, int(max_renders))
+        self.max_memory_mb = max(0, int(max_memory_mb))
+        self.prewarm = prewarm
+        self.pid = os.getpid()
+
+        self._jobs: "queue.Queue[Optional[tuple[str, Future, Optional[float]]]]" = queue.Queue()
+        self._slots: list[_Slot] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self) -> "BrowserPool":
+        with self._lock:
+            if self._closed:
+                raise PDFPoolClosed("PDF pool is shut down")
+            if not self._slots:
+                self._slots = [_Slot(self, i) for i in range(self.size)]
+                for slot in self._slots:
+                    slot.start()
+        return self
+
+    def submit(self, html: str, *, timeout: Optional[float] = None) -> Future:
+        self.start()
+        future: Future = Future()
+        deadline = time.monotonic() + timeout if timeout else None
+        self._jobs.put((html, future, deadline))
+        return future
+
+    def render(self, html: str, *, timeout: Optional[float] = None) -> bytes:
+        future = self.submit(html, timeout=timeout)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            # если ещё не взяли в работу — не рендерим впустую; если уже рендерится,
+            # ждём конца (страницу оборвёт её тайм-аут): вызывающий держит слот
+            # pdf_render_slot, и отпускать его при занятом Chromium нельзя
+            if not future.cancel():
+                wait([future])
+            raise
+
+    def shutdown(self, *, wait: bool = True, timeout: float = 10.0) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            slots = list(self._slots)
+
+        # незабранные заказы отменяем, чтобы никто не ждал вечно
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[1].cancel()
+
+        for _ in slots:
+            self._jobs.put(None)
+        if wait:
+            for slot in slots:
+                slot.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "queued": self._jobs.qsize(),
+            "slots": [
+                {"index": s.index, "alive": s.is_alive(), "renders": s.renders, "launches": s.launches}
+                for s in self._slots
+            ],
+        }
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    """
+    Пул текущего процесса. После fork (gunicorn --preload) создаётся новый:
+    потоки и браузеры родителя в дочерний процесс не переезжают.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = BrowserPool(
+                size=settings.KP_PDF_POOL_SIZE,
+                max_renders=settings.KP_PDF_POOL_MAX_RENDERS,
+                max_memory_mb=settings.KP_PDF_POOL_MAX_MEMORY_MB,
+                prewarm=settings.KP_PDF_POOL_PREWARM,
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and pool.pid == os.getpid():
+        pool.shutdown()
+
+
+atexit.register(shutdown_pool)
+
+
+def render_pdf(html: str) -> bytes:
+    """
+    HTML -> PDF байты через пул браузеров.
+    Абсолютные ссылки на ассеты должны идти от ASSET_ORIGIN.
+    """
+    # Важно: чтобы относительные /media и /static попадали в перехват,
+    # добавим <base href="..."> прямо в HTML (надёжнее, чем надеяться на base_url API).
+    if "<head>" in html:
+        html = html.replace("<head>", f"<head><base href=\"{ASSET_ORIGIN}/\">", 1)
+
+    return get_pool().render(html, timeout=settings.KP_PDF_RENDER_TIMEOUT)
@@ -0,0 +1,249 @@
+# kp/pdf_admission.py
+"""
+Ограничение числа одновременных рендеров PDF на всю машину (все процессы).
+
+Семафор на файловых блокировках: KP_PDF_MAX_CONCURRENT файлов-слотов и
+KP_PDF_MAX_WAITING файлов-«мест в очереди». Кто не занял слот — встаёт в
+очередь и ждёт до KP_PDF_ADMISSION_TIMEOUT; если очередь занята целиком или
+время вышло — AdmissionRejected (view отвечает 503 + Retry-After).
+Блокировки держит ОС, так что упавший процесс ничего не «подвешивает».
+
+Счётчики (пропущено, ждали, суммарное ожидание, отказы) тоже общие на машину —
+файл stats.json в той же папке под flock; смотреть: manage.py kp_pdf_stats.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows (локальная разработка)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, *, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# без fcntl — хотя бы в пределах процесса
+_local_slots: Optional[threading.BoundedSemaphore] = None
+_local_lock = threading.Lock()
+_local_stats: dict[str, float] = {}
+
+COUNTERS = (
+    "admitted",
+    "queued",
+    "wait_seconds_total",
+    "wait_seconds_max",
+    "rejected_queue_full",
+    "rejected_timeout",
+)
+
+
+def _lock_dir() -> Path:
+    path = Path(settings.KP_PDF_ADMISSION_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _try_lock(path: Path) -> Optional[int]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _release(fd: Optional[int]) -> None:
+    if fd is None:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _update_stats(stats: dict, *, waited: Optional[float] = None, rejected: str = "") -> None:
+    if rejected:
+        stats[f"rejected_{rejected}"] = stats.get(f"rejected_{rejected}", 0) + 1
+        return
+    stats["admitted"] = stats.get("admitted", 0) + 1
+    if waited:
+        stats["queued"] = stats.get("queued", 0) + 1
+        stats["wait_seconds_total"] = round(stats.get("wait_seconds_total", 0) + waited, 3)
+        stats["wait_seconds_max"] = round(max(stats.get("wait_seconds_max", 0), waited), 3)
+
+
+def _record(**event) -> None:
+    """
+    Учитывает допуск (waited=секунды) или отказ (rejected="queue_full"|"timeout").
+    Сбой записи счётчиков рендер не ломает.
+    """
+    if fcntl is None:
+        with _local_lock:
+            _update_stats(_local_stats, **event)
+        return
+    try:
+        with open(_lock_dir() / "stats.json", "a+", encoding="utf-8") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            fh.seek(0)
+            try:
+                stats = json.loads(fh.read() or "{}")
+            except ValueError:
+                stats = {}
+            _update_stats(stats, **event)
+            fh.seek(0)
+            fh.truncate()
+            fh.write(json.dumps(stats))
+    except OSError:
+        logger.warning("PDF admission stats not recorded", exc_info=True)
+
+
+def _count_busy(directory: Path, prefix: str, count: int) -> int:
+    # свободный файл на миг блокируем и сразу отпускаем
+    busy = 0
+    for i in range(count):
+        fd = _try_lock(directory / f"{prefix}-{i}.lock")
+        if fd is None:
+            busy += 1
+        else:
+            _release(fd)
+    return busy
+
+
+def admission_stats(*, reset: bool = False) -> dict:
+    """
+    Счётчики допуска на всю машину + текущая загрузка (занятые слоты, очередь).
+    reset=True обнуляет счётчики после чтения.
+    """
+    max_concurrent = max(1, int(settings.KP_PDF_MAX_CONCURRENT))
+    max_waiting = max(0, int(settings.KP_PDF_MAX_WAITING))
+    if fcntl is None:
+        with _local_lock:
+            stats = dict(_local_stats)
+            if reset:
+                _local_stats.clear()
+        live = {}
+    else:
+        directory = _lock_dir()
+        with open(directory / "stats.json", "a+", encoding="utf-8") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            fh.seek(0)
+            try:
+                stats = json.loads(fh.read() or "{}")
+            except ValueError:
+                stats = {}
+            if reset:
+                fh.truncate(0)
+        live = {
+            "slots_busy": _count_busy(directory, "slot", max_concurrent),
+            "queue_depth": _count_busy(directory, "wait", max_waiting),
+        }
+
+    result = {name: stats.get(name, 0) for name in COUNTERS}
+    result["wait_seconds_avg"] = round(result["wait_seconds_total"] / result["queued"], 3) if result["queued"] else 0
+    result.update(live)
+    result["max_concurrent"] = max_concurrent
+    result["max_waiting"] = max_waiting
+    return result
+
+
+def _try_any(directory: Path, prefix: str, count: int) -> tuple[Optional[int], int]:
+    """
+    (fd, сколько файлов до него оказались заняты).
+    """
+    busy = 0
+    for i in range(count):
+        fd = _try_lock(directory / f"{prefix}-{i}.lock")
+        if fd is not None:
+            return fd, busy
+        busy += 1
+    return None, busy
+
+
+@contextmanager
+def _local_slot(timeout: float) -> Iterator[float]:
+    global _local_slots
+    with _local_lock:
+        if _local_slots is None:
+            _local_slots = threading.BoundedSemaphore(max(1, settings.KP_PDF_MAX_CONCURRENT))
+    started_at = time.perf_counter()
+    if not _local_slots.acquire(timeout=timeout):
+        _record(rejected="timeout")
+        raise AdmissionRejected("timeout", retry_after=max(1, int(timeout)))
+    waited = time.perf_counter() - started_at
+    _record(waited=waited)
+    try:
+        yield waited
+    finally:
+        _local_slots.release()
+
+
+@contextmanager
+def pdf_render_slot(*, timeout: Optional[float] = None) -> Iterator[float]:
+    """
+    with pdf_render_slot() as waited: ... — рендер внутри, waited = секунды ожидания.
+    """
+    max_concurrent = max(1, int(settings.KP_PDF_MAX_CONCURRENT))
+    max_waiting = max(0, int(settings.KP_PDF_MAX_WAITING))
+    if timeout is None:
+        timeout = float(settings.KP_PDF_ADMISSION_TIMEOUT)
+    retry_after = max(1, int(timeout))
+
+    if fcntl is None:
+        with _local_slot(timeout) as waited:
+            yield waited
+        return
+
+    directory = _lock_dir()
+    started_at = time.perf_counter()
+
+    slot_fd, _ = _try_any(directory, "slot", max_concurrent)
+    depth = 0
+    if slot_fd is None:
+        ticket_fd, depth = _try_any(directory, "wait", max_waiting)
+        if ticket_fd is None:
+            logger.warning("PDF admission rejected: queue full (waiting=%s)", depth)
+            _record(rejected="queue_full")
+            raise AdmissionRejected("queue full", retry_after=retry_after)
+
+        depth += 1  # с нами
+        try:
+            deadline = started_at + timeout
+            while slot_fd is None:
+                if time.perf_counter() >= deadline:
+                    logger.warning("PDF admission rejected: waited %.1fs (queue_depth=%s)", timeout, depth)
+                    _record(rejected="timeout")
+                    raise AdmissionRejected("timeout", retry_after=retry_after)
+                time.sleep(POLL_INTERVAL)
+                slot_fd, _ = _try_any(directory, "slot", max_concurrent)
+        finally:
+            _release(ticket_fd)
+
+    waited = time.perf_counter() - started_at
+    if depth:
+        logger.info("PDF admission waited=%.2fs queue_depth=%s", waited, depth)
+    _record(waited=waited if depth else None)
+
+    try:
+        yield waited
+    finally:
+        _release(slot_fd)
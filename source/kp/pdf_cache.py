@@ -0,0 +1,194 @@
+# kp/pdf_cache.py
+"""
+Дисковый кэш готовых PDF смет.
+
+Ключ — sha256 от всего, что влияет на результат: позиции (услуга/кол-во/цена),
+данные мероприятия, template_snapshot, зафиксированные итоги, фото, данные
+заказчика/исполнителя, язык и сами шаблоны печати. Поменялось что-то из
+этого — поменялся ключ, старый файл этой сметы на том же языке удаляется при
+записи нового (варианты на других языках живут рядом).
+Общий размер ограничен KP_PDF_CACHE_MAX_MB, вытесняются давно не читанные
+(LRU по mtime, который обновляется при каждом попадании).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+PRINT_TEMPLATE_FILES = [
+    "kp/templates/kp/print.html",
+    "kp/templates/kp/print/_header.html",
+    "kp/templates/kp/print/_services.html",
+    "kp/templates/kp/print/_footer.html",
+    "static/kp/print.css",
+]
+
+_lock = threading.Lock()
+_templates_fingerprint: Optional[str] = None
+
+
+def cache_dir() -> Path:
+    path = Path(settings.KP_PDF_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _templates_version() -> str:
+    """
+    Отпечаток шаблонов печати: после деплоя с новой вёрсткой старые PDF не отдаём.
+    Считается один раз на процесс.
+    """
+    global _templates_fingerprint
+    if _templates_fingerprint is None:
+        parts = []
+        for rel in PRINT_TEMPLATE_FILES:
+            try:
+                st = (Path(settings.BASE_DIR) / rel).stat()
+                parts.append(f"{rel}:{st.st_size}:{st.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{rel}:-")
+        _templates_fingerprint = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+    return _templates_fingerprint
+
+
+def _dt(value) -> str:
+    return value.isoformat() if value else ""
+
+
+def proposal_cache_key(kp, items: Iterable, *, people: dict[str, Any], issued_at=None) -> str:
+    """
+    people — уже вычисленные customer_*/performer_* из kp_print
+    (они зависят и от профиля, и от settings.KP_PERFORMER_*).
+    """
+    photo = getattr(kp, "photo", None)
+    payload = {
+        "kp": {
+            "id": kp.id,
+            "title": kp.title,
+            "event_datetime": _dt(kp.event_datetime),
+            "event_description": kp.event_description,
+            "template_snapshot": kp.template_snapshot,
+            "fixed": [kp.fixed_subtotal, kp.fixed_extra, kp.fixed_total],
+            "photo": photo.name if photo else "",
+            "issued_at": _dt(issued_at),
+        },
+        "items": [
+            {
+                "id": it.id,
+                "service_id": it.service_id,
+                "service_updated_at": _dt(getattr(it.service, "updated_at", None)),
+                "image": it.service.image.name if getattr(it.service, "image", None) else "",
+                "qty": it.qty,
+                "price": str(it.price),
+                "discount": str(it.discount),
+            }
+            for it in items
+        ],
+        "people": people,
+        "lang": translation.get_language() or "",
+        "templates": _templates_version(),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _lang_tag(language: Optional[str]) -> str:
+    # без "-": иначе kp1-en-* совпал бы и с kp1-en-us-*
+    language = language if language is not None else translation.get_language()
+    return (language or "default").replace("-", "_")
+
+
+def _path_for(kp_id: int, key: str, language: Optional[str] = None) -> Path:
+    return cache_dir() / f"kp{kp_id}-{_lang_tag(language)}-{key}.pdf"
+
+
+def get(kp_id: int, key: str, *, language: Optional[str] = None) -> Optional[Path]:
+    """
+    language — язык, на котором PDF рендерился (по умолчанию — текущий).
+    """
+    path = _path_for(kp_id, key, language)
+    try:
+        os.utime(path)  # LRU: отмечаем чтение
+    except OSError:
+        return None
+    return path
+
+
+def put(kp_id: int, key: str, pdf_bytes: bytes, *, language: Optional[str] = None) -> Path:
+    directory = cache_dir()
+    path = _path_for(kp_id, key, language)
+
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf_bytes)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+    with _lock:
+        # прошлые версии этой сметы на этом языке больше никому не нужны
+        for stale in directory.glob(f"kp{kp_id}-{_lang_tag(language)}-*.pdf"):
+            if stale != path:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        _evict(directory, keep=path)
+
+    return path
+
+
+def invalidate(kp_id: int) -> None:
+    for path in cache_dir().glob(f"kp{kp_id}-*.pdf"):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def _evict(directory: Path, *, keep: Path) -> None:
+    limit = int(settings.KP_PDF_CACHE_MAX_MB) * 1024 * 1024
+    if limit <= 0:
+        return
+
+    entries = []
+    total = 0
+    for path in directory.glob("kp*.pdf"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    if total <= limit:
+        return
+
+    entries.sort()  # самые старые по последнему чтению — первыми
+    for _mtime, size, path in entries:
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+            total -= size
+            logger.info("KP PDF cache evicted %s (%s bytes)", path.name, size)
+        except OSError:
+            pass
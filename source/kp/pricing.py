@@ -0,0 +1,108 @@
+# kp/pricing.py
+"""
+Цены сметы — единственное место, где они считаются.
+
+Строка: qty * (price - discount), не меньше нуля. Итог сметы: subtotal (сумма
+строк) + extra (надбавка MARKUP_PERCENT%, округление половины вверх) = total.
+
+Proposal хранит subtotal/extra/total. Их поддерживают сигналы ProposalItem
+(kp/signals.py): изменение строки — это UPDATE ... SET subtotal = subtotal + delta
+через F-выражения, без чтения всех позиций и без гонок между параллельными
+запросами. Если итоги разошлись с позициями (сырой импорт, update() мимо
+сигналов) — manage.py check_kp_totals --fix.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+from django.db.models import F
+
+MARKUP_PERCENT = 20
+
+
+def line_total(qty, price, discount=0) -> int:
+    unit = (price or 0) - (discount or 0)
+    if unit < 0:
+        unit = 0
+    return int(int(qty or 0) * unit)
+
+
+def item_total(item) -> int:
+    return line_total(item.qty, item.price, item.discount)
+
+
+def markup(subtotal: int) -> int:
+    # целочисленно: то же, что ROUND_HALF_UP от subtotal * 20%
+    return (int(subtotal) * MARKUP_PERCENT + 50) // 100
+
+
+def totals(subtotal: int) -> tuple[int, int, int]:
+    subtotal = int(subtotal)
+    extra = markup(subtotal)
+    return subtotal, extra, subtotal + extra
+
+
+def totals_for_items(items: Iterable) -> tuple[int, int, int]:
+    return totals(sum(item_total(it) for it in items))
+
+
+def apply_delta(proposal_id: int, delta: int) -> None:
+    """
+    Сдвигает итоги сметы на delta одним UPDATE. В SET все F("subtotal") —
+    значение до обновления, поэтому extra и total считаются от него же.
+    """
+    from .models import Proposal
+
+    if not delta:
+        return
+    subtotal = F("subtotal") + delta
+    extra = (subtotal * MARKUP_PERCENT + 50) / 100
+    Proposal.objects.filter(pk=proposal_id).update(subtotal=subtotal, extra=extra, total=subtotal + extra)
+
+
+def expected_subtotals(proposal_ids: Optional[Iterable[int]] = None) -> dict[int, int]:
+    """
+    proposal_id -> сумма строк по позициям (одним запросом).
+    """
+    from .models import ProposalItem
+
+    rows = ProposalItem.objects.all()
+    if proposal_ids is not None:
+        rows = rows.filter(proposal_id__in=list(proposal_ids))
+    result: dict[int, int] = {}
+    for proposal_id, qty, price, discount in rows.values_list("proposal_id", "qty", "price", "discount").iterator():
+        result[proposal_id] = result.get(proposal_id, 0) + line_total(qty, price, discount)
+    return result
+
+
+def find_drift(proposal_ids: Optional[Iterable[int]] = None) -> list[tuple[int, tuple, tuple]]:
+    """
+    [(proposal_id, (subtotal, extra, total) в базе, ожидаемые)] — где не сходится.
+    """
+    from .models import Proposal
+
+    if proposal_ids is not None:
+        proposal_ids = list(proposal_ids)
+    expected = expected_subtotals(proposal_ids)
+    proposals = Proposal.objects.order_by("pk")
+    if proposal_ids is not None:
+        proposals = proposals.filter(pk__in=proposal_ids)
+
+    drift = []
+    for pk, *stored in proposals.values_list("pk", "subtotal", "extra", "total").iterator():
+        values = totals(expected.get(pk, 0))
+        if tuple(stored) != values:
+            drift.append((pk, tuple(stored), values))
+    return drift
+
+
+def recalculate(proposal_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересчитывает итоги с нуля там, где они разошлись; возвращает число смет.
+    """
+    from .models import Proposal
+
+    drift = find_drift(proposal_ids)
+    for pk, _, (subtotal, extra, total) in drift:
+        Proposal.objects.filter(pk=pk).update(subtotal=subtotal, extra=extra, total=total)
+    return len(drift)
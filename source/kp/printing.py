@@ -0,0 +1,175 @@
+# kp/printing.py
+"""
+Сборка контекста печатной сметы и рендер PDF с кэшем.
+Общий код для kp_print, фоновой очереди PDF и массовой выгрузки.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import pdf_cache
+from .pdf import ASSET_ORIGIN, render_pdf
+from .pdf_admission import AdmissionRejected, pdf_render_slot
+from .pricing import totals_for_items
+
+logger = logging.getLogger(__name__)
+
+PEOPLE_KEYS = (
+    "customer_full_name",
+    "customer_phone",
+    "customer_email",
+    "performer_name",
+    "performer_phone",
+    "performer_email",
+)
+
+
+def print_items(kp) -> list:
+    return list(kp.items.select_related("service").all())
+
+
+def build_print_context(kp, items: list, *, site_url: str = "") -> dict[str, Any]:
+    event_dt = timezone.localtime(kp.event_datetime) if kp.event_datetime else None
+
+    # --- Заказчик из сметы, иначе из профиля ---
+    customer_full_name = kp.customer_full_name.strip()
+    customer_phone = kp.customer_phone.strip()
+    customer_email = kp.customer_email.strip()
+
+    if not customer_full_name:
+        if hasattr(kp.customer, "get_full_name"):
+            customer_full_name = kp.customer.get_full_name().strip()
+        if not customer_full_name:
+            fn = getattr(kp.customer, "first_name", "")
+            ln = getattr(kp.customer, "last_name", "")
+            customer_full_name = f"{fn} {ln}".strip()
+
+    if not customer_full_name:
+        customer_full_name = kp.customer.username
+
+    if not customer_phone:
+        customer_phone = (getattr(kp.customer, "phone", "") or "").strip()
+
+    if not customer_email:
+        customer_email = (getattr(kp.customer, "email", "") or "").strip()
+
+    # --- Исполнитель из settings, иначе из owner ---
+    performer_name = (getattr(settings, "KP_PERFORMER_NAME", "") or "").strip()
+    performer_phone = (getattr(settings, "KP_PERFORMER_PHONE", "") or "").strip()
+    performer_email = (getattr(settings, "KP_PERFORMER_EMAIL", "") or "").strip()
+
+    if not performer_name:
+        performer_name = (getattr(kp.owner, "get_full_name", lambda: "")() or kp.owner.username or "").strip()
+    if not performer_phone:
+        performer_phone = (getattr(kp.owner, "phone", "") or "").strip()
+    if not performer_email:
+        performer_email = (getattr(kp.owner, "email", "") or "").strip()
+
+    # --- Итоги по строкам ---
+    if kp.fixed_total is not None and kp.fixed_total > 0:
+        subtotal = kp.fixed_subtotal
+        extra20 = kp.fixed_extra
+        total = kp.fixed_total
+    else:
+        subtotal, extra20, total = totals_for_items(items)
+
+    return {
+        "kp": kp,
+        "items": items,
+        "event_dt": event_dt,
+        "subtotal": subtotal,
+        "extra20": extra20,
+        "total": total,
+        # дата документа — не момент рендера: PDF из кэша печатает ту же дату
+        "issued_at": issued_at(kp),
+
+        "customer_full_name": customer_full_name,
+        "customer_phone": customer_phone,
+        "customer_email": customer_email,
+
+        "performer_name": performer_name,
+        "performer_phone": performer_phone,
+        "performer_email": performer_email,
+
+        # База сайта для абсолютных ссылок на /media и /static
+        "site_url": site_url,
+    }
+
+
+def issued_at(kp):
+    # отправленная смета — дата отправки, черновик — последнего изменения
+    return kp.requested_at or kp.updated_at
+
+
+def print_cache_key(kp, items: list, ctx: dict[str, Any]) -> str:
+    return pdf_cache.proposal_cache_key(
+        kp, items, people={k: ctx[k] for k in PEOPLE_KEYS}, issued_at=ctx["issued_at"]
+    )
+
+
+def render_proposal_pdf(
+    kp,
+    *,
+    items: Optional[list] = None,
+    ctx: Optional[dict[str, Any]] = None,
+    request=None,
+    admission_timeout: Optional[float] = None,
+) -> tuple[str, Path]:
+    """
+    Рендерит PDF сметы (или берёт из кэша) и возвращает (cache_key, путь к файлу).
+    Вызывается в активном языке: от него зависят переводы в шаблоне.
+    Если свободного слота рендера нет — AdmissionRejected (см. pdf_admission).
+    """
+    if items is None:
+        items = print_items(kp)
+    if ctx is None:
+        ctx = build_print_context(kp, items)
+
+    cache_key = print_cache_key(kp, items, ctx)
+    cached_path = pdf_cache.get(kp.id, cache_key)
+    if cached_path:
+        return cache_key, cached_path
+
+    # /media и /static Chromium получает с диска через перехват, не по сети
+    html_string = render_to_string("kp/print.html", {**ctx, "site_url": ASSET_ORIGIN}, request=request)
+    image_count = sum(1 for item in items if getattr(item.service, "image", None))
+
+    logger.warning(
+        "Starting proposal PDF generation kp_id=%s item_count=%s image_count=%s",
+        kp.id,
+        len(items),
+        image_count,
+    )
+    try:
+        with pdf_render_slot(timeout=admission_timeout):
+            started_at = time.perf_counter()
+            pdf_bytes = render_pdf(html_string)
+    except AdmissionRejected:
+        raise
+    except Exception:
+        logger.exception(
+            "Proposal PDF generation failed kp_id=%s item_count=%s image_count=%s",
+            kp.id,
+            len(items),
+            image_count,
+        )
+        raise
+
+    elapsed = time.perf_counter() - started_at
+    if elapsed >= 10:
+        logger.warning(
+            "Slow proposal PDF generation kp_id=%s item_count=%s image_count=%s duration=%.2fs",
+            kp.id,
+            len(items),
+            image_count,
+            elapsed,
+        )
+
+    return cache_key, pdf_cache.put(kp.id, cache_key, pdf_bytes)
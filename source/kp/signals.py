@@ -0,0 +1,60 @@
+# kp/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import pdf_cache, pricing
+from .models import Proposal, ProposalItem
+
+
+PRICE_FIELDS = {"qty", "price", "discount"}
+
+
+def _counted_total(instance) -> int:
+    """
+    Сумма строки, уже учтённая в итогах сметы. Берём из базы, а не из объекта:
+    он мог устареть (позицию успел поменять другой запрос). Строка блокируется
+    до конца транзакции — параллельные правки одной позиции идут по очереди.
+    """
+    if instance._state.adding or instance.pk is None:
+        return 0
+    rows = ProposalItem.objects.filter(pk=instance.pk)
+    if transaction.get_connection().in_atomic_block:
+        # вне транзакции select_for_update в Postgres падает
+        rows = rows.select_for_update()
+    row = rows.values_list("qty", "price", "discount").first()
+    return pricing.line_total(*row) if row else 0
+
+
+@receiver(pre_save, sender=ProposalItem)
+def item_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._counted_total = _counted_total(instance)
+
+
+@receiver(post_save, sender=ProposalItem)
+def item_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if PRICE_FIELDS & instance.get_deferred_fields():
+        # поля цены не загружены — новую сумму строки не знаем
+        pricing.recalculate([instance.proposal_id])
+    else:
+        pricing.apply_delta(instance.proposal_id, pricing.item_total(instance) - instance._counted_total)
+
+
+@receiver(pre_delete, sender=ProposalItem)
+def item_deleting(sender, instance, **kwargs):
+    instance._counted_total = _counted_total(instance)
+
+
+@receiver(post_delete, sender=ProposalItem)
+def item_deleted(sender, instance, **kwargs):
+    pricing.apply_delta(instance.proposal_id, -instance._counted_total)
+
+
+@receiver(post_delete, sender=Proposal)
+def proposal_deleted(sender, instance, **kwargs):
+    # PDF удалённой сметы больше никто не запросит — не ждём вытеснения по LRU
+    proposal_id = instance.pk
+    transaction.on_commit(lambda: pdf_cache.invalidate(proposal_id))
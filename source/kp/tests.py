@@ -1,9 +1,24 @@
+import json
+import tempfile
+import zipfile
 from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from PIL import Image
+
+from catalog.models import Category, Service
+from kp.models import EventType, KPTemplate, PDFRenderJob, Proposal, ProposalItem
+from kp.pdf import ASSET_ORIGIN, resolve_asset
+from kp.pdf_admission import AdmissionRejected, admission_stats, pdf_render_slot
+from kp.printing import render_proposal_pdf
+from kp.views import enqueue_pdf_render
 
 
 User = get_user_model()
@@ -48,3 +63,459 @@ class KPHomeTests(TestCase):
         )
         self.assertContains(response, 'id="kpCustomerSearchInput"')
         self.assertContains(response, "data-live-search-item", count=3)
+
+
+    def test_dashboard_autocloses_past_events_in_one_indexed_update(self):
+        from kp.views import _autoclose_due_qs
+
+        admin = User.objects.create_user(username="admin", password="x", is_staff=True, role=User.Role.ADMIN)
+        customer = User.objects.create_user(username="client", password="x")
+        template = KPTemplate.objects.create(name="Базовый", event_type=EventType.objects.create(name="Свадьба"))
+        now = timezone.now()
+
+        def make(event_datetime):
+            return Proposal.objects.create(
+                owner=admin, customer=customer, template=template, title="Смета", event_datetime=event_datetime
+            )
+
+        past, recent, undated = make(now - timedelta(days=2)), make(now - timedelta(hours=1)), make(None)
+
+        self.client.force_login(admin)
+        self.client.get(reverse("kp:kp"))
+
+        statuses = dict(Proposal.objects.values_list("id", "status"))
+        self.assertEqual(statuses[past.id], Proposal.Status.SENT)
+        self.assertEqual(statuses[recent.id], Proposal.Status.DRAFT)
+        self.assertEqual(statuses[undated.id], Proposal.Status.DRAFT)
+        self.assertIn("kp_proposal_status_13f9ab_idx", _autoclose_due_qs().explain())
+
+
+class KPPrintPDFCacheTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin",
+            password="testpass123",
+            is_staff=True,
+            role=User.Role.ADMIN,
+        )
+        customer = User.objects.create_user(username="client", password="testpass123")
+        template = KPTemplate.objects.create(
+            name="Базовый",
+            event_type=EventType.objects.create(name="Свадьба"),
+        )
+        self.kp = Proposal.objects.create(
+            owner=self.admin,
+            customer=customer,
+            template=template,
+            title="Смета",
+        )
+        category = Category.objects.create(name_ru="Шоу")
+        self.service = Service.objects.create(category=category, name_ru="Фокусник", base_price=1000)
+        self.item = ProposalItem.objects.create(proposal=self.kp, service=self.service, qty=1, price=1000)
+
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        overrides = override_settings(
+            KP_PDF_CACHE_DIR=self.cache_dir.name,
+            KP_PDF_ADMISSION_DIR=self.cache_dir.name + "/locks",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.client.force_login(self.admin)
+        self.url = reverse("kp:print", args=[self.kp.id]) + "?download=1"
+
+    def test_repeat_download_is_served_from_cache_with_etag(self):
+        with mock.patch("kp.printing.render_pdf", return_value=b"%PDF-1") as render_pdf:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(render_pdf.call_count, 1)
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-1")
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_item_change_invalidates_cached_pdf(self):
+        with mock.patch("kp.printing.render_pdf", side_effect=[b"%PDF-1", b"%PDF-2"]) as render_pdf:
+            first = self.client.get(self.url)
+            self.item.qty = 3
+            self.item.save()
+            second = self.client.get(self.url)
+
+        self.assertEqual(render_pdf.call_count, 2)
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-2")
+        self.assertEqual(len(list(Path(self.cache_dir.name).glob("*.pdf"))), 1)
+
+    def test_cached_pdf_keeps_issue_date_and_is_dropped_with_proposal(self):
+        with mock.patch("kp.printing.render_pdf", return_value=b"%PDF-1") as render_pdf:
+            render_proposal_pdf(self.kp)
+            with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(days=3)):
+                render_proposal_pdf(self.kp)
+        # дата в шапке — дата сметы, а не рендера: кэш её не «замораживает»
+        render_pdf.assert_called_once()
+        self.assertIn(timezone.localtime(self.kp.updated_at).strftime("%d.%m.%Y"), render_pdf.call_args.args[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kp.delete()
+        self.assertEqual(list(Path(self.cache_dir.name).glob("*.pdf")), [])
+
+    def test_language_variants_do_not_evict_each_other(self):
+        from django.utils import translation
+
+        with mock.patch("kp.printing.render_pdf", side_effect=[b"%PDF-ru", b"%PDF-en"]) as render_pdf:
+            for language in ("ru", "en", "ru", "en"):
+                with translation.override(language):
+                    render_proposal_pdf(self.kp)
+
+        self.assertEqual(render_pdf.call_count, 2)
+        self.assertEqual(len(list(Path(self.cache_dir.name).glob("*.pdf"))), 2)
+
+    @override_settings(KP_PDF_MAX_CONCURRENT=1, KP_PDF_MAX_WAITING=0)
+    def test_download_is_rejected_with_retry_after_when_render_slots_are_busy(self):
+        with mock.patch("kp.printing.render_pdf", return_value=b"%PDF-1") as render_pdf:
+            with pdf_render_slot():
+                response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "20")
+        render_pdf.assert_not_called()
+
+        # отказ и занятый слот видны из другого процесса — через kp_pdf_stats
+        with pdf_render_slot():
+            out = StringIO()
+            call_command("kp_pdf_stats", "--json", "--reset", stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual((stats["admitted"], stats["rejected_queue_full"], stats["slots_busy"]), (2, 1, 1))
+        self.assertEqual(admission_stats()["admitted"], 0)
+
+    def test_export_command_zips_matching_proposals_and_resumes(self):
+        self.kp.status = Proposal.Status.SENT
+        self.kp.save()
+        archive = Path(self.cache_dir.name) / "export.zip"
+
+        with mock.patch("kp.printing.render_pdf", return_value=b"%PDF-1") as render_pdf:
+            call_command("export_kp_pdfs", str(archive), stdout=StringIO())
+            call_command("export_kp_pdfs", str(archive), stdout=StringIO())
+
+        render_pdf.assert_called_once()
+        with zipfile.ZipFile(archive) as zf:
+            self.assertEqual(zf.namelist(), [f"KP_{self.kp.id}.pdf"])
+
+    def test_export_gives_up_on_busy_render_slots_and_reports_failure(self):
+        self.kp.status = Proposal.Status.SENT
+        self.kp.save()
+        archive = Path(self.cache_dir.name) / "export.zip"
+
+        busy = AdmissionRejected("busy", retry_after=1)
+        with mock.patch("kp.management.commands.export_kp_pdfs.render_proposal_pdf", side_effect=busy) as render:
+            with self.assertRaisesMessage(CommandError, "1 proposal(s) failed"):
+                call_command("export_kp_pdfs", str(archive), "--max-wait=0", stdout=StringIO(), stderr=StringIO())
+
+        render.assert_called_once()
+        self.assertFalse(archive.exists())
+
+    def test_export_picks_up_pdfs_left_by_interrupted_run(self):
+        self.kp.status = Proposal.Status.SENT
+        self.kp.save()
+        archive = Path(self.cache_dir.name) / "export.zip"
+        parts = Path(self.cache_dir.name) / "export.zip.parts"
+        parts.mkdir()
+        (parts / f"KP_{self.kp.id}.pdf").write_bytes(b"%PDF-old")
+
+        with mock.patch("kp.printing.render_pdf") as render_pdf:
+            call_command("export_kp_pdfs", str(archive), stdout=StringIO())
+
+        render_pdf.assert_not_called()
+        with zipfile.ZipFile(archive) as zf:
+            self.assertEqual(zf.read(f"KP_{self.kp.id}.pdf"), b"%PDF-old")
+        self.assertFalse(parts.exists())
+
+    def test_async_download_enqueues_job_and_status_serves_cached_file(self):
+        response = self.client.get(self.url + "&async=1")
+        self.assertEqual(response.status_code, 202)
+        job = PDFRenderJob.objects.get(id=response.json()["job_id"])
+        self.assertEqual(job.status, PDFRenderJob.Status.PENDING)
+
+        # второй запрос не плодит задания
+        again = self.client.get(self.url + "&async=1")
+        self.assertEqual(again.json()["job_id"], job.id)
+
+        # рендер упал, задание зависло в RUNNING — новый запрос возвращает его в очередь
+        PDFRenderJob.objects.filter(id=job.id).update(
+            status=PDFRenderJob.Status.RUNNING, started_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.client.get(self.url + "&async=1").json()["job_id"], job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PDFRenderJob.Status.PENDING)
+
+        with mock.patch("kp.printing.render_pdf", return_value=b"%PDF-1"):
+            cache_key, _path = render_proposal_pdf(self.kp)
+        job.status = PDFRenderJob.Status.DONE
+        job.cache_key = cache_key
+        job.save()
+
+        status_url = reverse("kp:pdf_job", args=[job.id])
+        self.assertEqual(self.client.get(status_url).json()["download_url"], status_url + "?download=1")
+        download = self.client.get(status_url, {"download": "1"})
+        self.assertEqual(b"".join(download.streaming_content), b"%PDF-1")
+
+        # смета изменилась после рендера — старый файл не отдаём, ставим новый рендер
+        self.item.qty = 2
+        self.item.save()
+        stale = self.client.get(status_url, {"download": "1"})
+        self.assertEqual(stale.status_code, 202)
+        fresh = PDFRenderJob.objects.get(id=stale.json()["job_id"])
+        self.assertNotEqual(fresh.id, job.id)
+        self.assertEqual(fresh.language, job.language)
+
+        # незавершённое задание на другом языке не подменяет нужное
+        other = PDFRenderJob.objects.create(proposal=self.kp, language="en")
+        self.assertNotEqual(enqueue_pdf_render(self.kp, language=job.language).id, other.id)
+
+
+class KPPrintAssetResolveTests(TestCase):
+    def test_assets_are_resolved_from_disk_inside_roots_only(self):
+        css = resolve_asset(f"{ASSET_ORIGIN}/static/kp/print.css")
+        self.assertIsNotNone(css)
+        self.assertEqual(css.name, "print.css")
+
+        self.assertIsNone(resolve_asset(f"{ASSET_ORIGIN}/media/../config/settings.py"))
+        self.assertIsNone(resolve_asset("https://example.com/static/kp/print.css"))
+
+    def test_render_timeout_waits_for_running_render(self):
+        import time
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        from kp.pdf import BrowserPool
+
+        def slow_render(slot, html, deadline):
+            time.sleep(0.3)
+            return b"%PDF-late"
+
+        pool = BrowserPool(size=1)
+        self.addCleanup(pool.shutdown)
+        with mock.patch("kp.pdf._Slot._render", slow_render):
+            started_at = time.perf_counter()
+            with self.assertRaises(FutureTimeout):
+                pool.render("<html></html>", timeout=0.05)
+        # слот допуска не отпускается, пока Chromium ещё занят
+        self.assertGreaterEqual(time.perf_counter() - started_at, 0.25)
+
+
+class KPSidebarTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="client", password="testpass123")
+        template = KPTemplate.objects.create(
+            name="Базовый",
+            event_type=EventType.objects.create(name="Свадьба"),
+        )
+        self.kp = Proposal.objects.create(
+            owner=self.customer,
+            customer=self.customer,
+            template=template,
+            title="Моя свадьба",
+        )
+        self.category = Category.objects.create(name_ru="Шоу")
+        service = Service.objects.create(category=self.category, name_ru="Фокусник", base_price=1000)
+        self.extra = Service.objects.create(category=self.category, name_ru="Клоун", base_price=500)
+        self.item = ProposalItem.objects.create(proposal=self.kp, service=service, qty=2, price=1000)
+        self.client.force_login(self.customer)
+
+    def test_catalog_page_is_shared_shell_and_sidebar_is_a_fragment(self):
+        page = f"/categories/{self.category.id}/services/"
+        self.client.get(page)  # выдаёт csrftoken
+        response = self.client.get(page)
+        self.assertContains(response, "data-kp-sidebar-url")
+        self.assertNotContains(response, "Моя свадьба")
+        # каркас не зависит от сметы: после её изменения всё ещё 304
+        ProposalItem.objects.create(proposal=self.kp, service=self.extra, qty=1, price=500)
+        self.assertEqual(self.client.get(page, HTTP_IF_NONE_MATCH=response.headers["ETag"]).status_code, 304)
+
+        with self.assertNumQueries(4):  # сессия, пользователь, черновик, позиции с услугами
+            data = self.client.get(reverse("kp:sidebar"), {"next": page}).json()
+        self.assertEqual(data["kp_id"], self.kp.id)
+        self.assertEqual(data["items_count"], 2)
+        self.assertEqual(data["total"], 3000)
+        self.assertIn("Моя свадьба", data["fragments"]["mobile"])
+        self.assertIn(reverse("kp:remove_item", args=[self.item.id]), data["fragments"]["desktop"])
+
+        removed = self.client.post(
+            reverse("kp:remove_item", args=[self.item.id]),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(removed.json(), {"ok": True, "kp_id": self.kp.id})
+        self.assertEqual(self.client.get(reverse("kp:sidebar")).json()["items_count"], 1)
+
+
+class KPPhotoMediaTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, MEDIA_ACCEL_REDIRECT="", MEDIA_SENDFILE=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        photo = Path(media.name, "kp", "photos", "couple.jpg")
+        photo.parent.mkdir(parents=True)
+        photo.write_bytes(b"0123456789" * 10)
+        self.customer = User.objects.create_user(username="client", password="testpass123")
+        template = KPTemplate.objects.create(name="Базовый", event_type=EventType.objects.create(name="Свадьба"))
+        Proposal.objects.create(
+            owner=self.customer,
+            customer=self.customer,
+            template=template,
+            title="Моя свадьба",
+            photo="kp/photos/couple.jpg",
+        )
+        self.url = "/media/kp/photos/couple.jpg"
+
+    def test_photo_is_private_and_supports_ranges(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(User.objects.create_user(username="other", password="testpass123"))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.force_login(self.customer)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("private", response.headers["Cache-Control"])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=200-").status_code, 416)
+
+        with override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.headers["X-Accel-Redirect"], "/protected-media/kp/photos/couple.jpg")
+        self.assertEqual(response.content, b"")
+
+    def test_media_gc_keeps_service_copy_of_kp_photo_public(self):
+        media = Path(self.url.removeprefix("/media/"))
+        root = Path(Proposal.objects.get().photo.path).parents[2]
+        (root / "services").mkdir()
+        # одинаковое содержимое в двух папках
+        Image.new("RGB", (40, 30), (200, 10, 10)).save(root / media, "JPEG")
+        (root / "services" / "couple.jpg").write_bytes((root / media).read_bytes())
+        category = Category.objects.create(name_ru="Фото")
+        own = Service.objects.create(category=category, name_ru="Своя", image="services/couple.jpg")
+        # ссылка в закрытую папку, оставшаяся от старого dedupe
+        shared = Service.objects.create(category=category, name_ru="Общая", image="kp/photos/couple.jpg")
+
+        call_command("media_gc", "--min-age-hours=0", stdout=StringIO())
+
+        own.refresh_from_db()
+        shared.refresh_from_db()
+        self.assertEqual(own.image.name, "services/couple.jpg")
+        self.assertTrue(shared.image.name.startswith("services/couple"))
+        self.assertEqual(Proposal.objects.get().photo.name, "kp/photos/couple.jpg")
+        for name in (own.image.name, shared.image.name):
+            self.assertEqual(self.client.get(f"/media/{name}").status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class KPStructuredMetaTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="client", password="testpass123", first_name="Айгерим")
+        template = KPTemplate.objects.create(name="Базовый", event_type=EventType.objects.create(name="Свадьба"))
+        self.kp = Proposal.objects.create(
+            owner=self.customer,
+            customer=self.customer,
+            template=template,
+            title="Моя свадьба",
+            event_location="Алматы",
+        )
+
+    def test_notes_json_is_migrated_to_columns(self):
+        import importlib
+
+        from django.apps import apps
+
+        migration = importlib.import_module("kp.migrations.0005_proposal_structured_meta")
+        Proposal.objects.filter(id=self.kp.id).update(notes=(
+            '{"event_address": "ул. Абая 10", "drive_url": "https://drive.google.com/x", '
+            '"event_datetime": "2026-05-01T18:30", "customer_phone": "+7700", "customer_username": "client"}'
+        ))
+        migration.notes_to_columns(apps, None)
+
+        self.kp.refresh_from_db()
+        self.assertEqual(self.kp.event_location, "ул. Абая 10")
+        self.assertEqual(self.kp.drive_link, "https://drive.google.com/x")
+        self.assertEqual(timezone.localtime(self.kp.event_datetime).strftime("%Y-%m-%d %H:%M"), "2026-05-01 18:30")
+        self.assertEqual(self.kp.customer_phone, "+7700")
+        self.assertEqual(self.kp.meta, {"customer_username": "client"})
+        self.assertEqual(self.kp.notes, "")
+
+    def test_autosave_writes_columns_and_builder_reads_them(self):
+        self.client.force_login(self.customer)
+        response = self.client.post(
+            reverse("kp:autosave", args=[self.kp.id]),
+            {"event_datetime": "2026-05-01T18:30", "event_description": "Банкет"},
+        )
+        self.assertEqual(response.json(), {"ok": True})
+
+        self.kp.refresh_from_db()
+        self.assertEqual(self.kp.event_description, "Банкет")
+        # адреса нет в форме — колонка не затирается
+        self.assertEqual(self.kp.event_location, "Алматы")
+        self.assertTrue(Proposal.objects.filter(event_datetime__date="2026-05-01").exists())
+
+        page = self.client.get(reverse("kp:builder", args=[self.kp.id]))
+        self.assertContains(page, 'value="2026-05-01T18:30"')
+
+        # недопечатанная дата не затирает сохранённую, пустая — очищает
+        self.client.post(reverse("kp:autosave", args=[self.kp.id]), {"event_datetime": "2026-05-"})
+        self.assertTrue(Proposal.objects.filter(event_datetime__date="2026-05-01").exists())
+        self.client.post(reverse("kp:autosave", args=[self.kp.id]), {"event_datetime": ""})
+        self.assertIsNone(Proposal.objects.get(id=self.kp.id).event_datetime)
+
+
+class KPTotalsTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username="client", password="testpass123")
+        template = KPTemplate.objects.create(name="Базовый", event_type=EventType.objects.create(name="Свадьба"))
+        self.kp = Proposal.objects.create(owner=self.customer, customer=self.customer, template=template, title="Смета")
+        category = Category.objects.create(name_ru="Шоу")
+        self.magician = Service.objects.create(category=category, name_ru="Фокусник", base_price=1000)
+        self.clown = Service.objects.create(category=category, name_ru="Клоун", base_price=503)
+
+    def _totals(self):
+        self.kp.refresh_from_db()
+        return self.kp.subtotal, self.kp.extra, self.kp.total
+
+    def test_totals_follow_items_and_checker_repairs_drift(self):
+        item = ProposalItem.objects.create(proposal=self.kp, service=self.magician, qty=2, price=1000)
+        ProposalItem.objects.create(proposal=self.kp, service=self.clown, qty=1, price=503)
+        self.assertEqual(self._totals(), (2503, 501, 3004))  # 500.6 -> 501
+
+        self.client.force_login(self.customer)
+        data = self.client.post(
+            reverse("kp:update_item_qty", args=[item.id]),
+            data='{"action": "inc"}',
+            content_type="application/json",
+        ).json()
+        self.assertEqual((data["subtotal"], data["extra20"], data["total"]), (3503, 701, 4204))
+
+        # item устарел (qty=2 в памяти) — вычитается то, что лежит в базе
+        item.delete()
+        self.assertEqual(self._totals(), (503, 101, 604))
+
+        Proposal.objects.filter(id=self.kp.id).update(subtotal=0, extra=0, total=0)
+        out = StringIO()
+        call_command("check_kp_totals", stdout=out)
+        self.assertIn(f"KP {self.kp.id}: stored (0, 0, 0) != expected (503, 101, 604)", out.getvalue())
+        call_command("check_kp_totals", "--fix", stdout=StringIO())
+        self.assertEqual(self._totals(), (503, 101, 604))
+
+    def test_proposal_saves_do_not_overwrite_totals(self):
+        stale = Proposal.objects.get(id=self.kp.id)
+        ProposalItem.objects.create(proposal=self.kp, service=self.magician, qty=1, price=1000)
+
+        # объект загружен до позиции: полное сохранение (админка) итоги не трогает
+        stale.title = "Смета 2"
+        stale.save()
+        self.assertEqual(self._totals(), (1000, 200, 1200))
+
+        self.client.force_login(self.customer)
+        self.client.post(reverse("kp:autosave", args=[self.kp.id]), {"title": "Смета 3"})
+        self.assertEqual(self._totals(), (1000, 200, 1200))
+        self.assertEqual(self.kp.title, "Смета 3")
@@ -19,6 +19,7 @@ urlpatterns = [
     path("<int:kp_id>/add/<int:service_id>/", views.add_service_to_kp, name="add_to_kp"),
     path("remove-item/<int:item_id>/", views.remove_item_from_active_kp, name="remove_item"),
     path("<int:kp_id>/clear/", views.clear_kp, name="clear"),
+    path("sidebar/", views.kp_sidebar, name="sidebar"),
 
     # submit
     path("<int:kp_id>/submit/", views.submit_kp, name="submit"),
@@ -35,6 +36,7 @@ urlpatterns = [
 
     # print/pdf
     path("<int:kp_id>/print/", views.kp_print, name="print"),
+    path("pdf-jobs/<int:job_id>/", views.kp_pdf_job, name="pdf_job"),
 
     path("item/<int:item_id>/qty/", views.update_item_qty, name="update_item_qty"),
     path("item/<int:item_id>/price/", views.update_item_price, name="update_item_price"),
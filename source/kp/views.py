@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import json
 import logging
-import time
 from datetime import datetime, timedelta
 from typing import Any, Optional
 
@@ -10,14 +9,17 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
-from django.utils import timezone
+from django.urls import reverse
+from django.utils import timezone, translation
 from django.utils.dateparse import parse_datetime
-from django.utils.http import url_has_allowed_host_and_scheme
-from django.views.decorators.http import require_POST
+from django.utils.http import parse_etags, url_has_allowed_host_and_scheme
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET, require_POST
 
 from rest_framework import status, views
 from rest_framework.response import Response
@@ -25,13 +27,26 @@ from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from accounts.permissions import IsCustomerRole
 from catalog.models import Service
-from .models import EventType, Proposal, ProposalItem, KPTemplate
+from main.storage import validate_image_upload
+from .models import EventType, PDFRenderJob, Proposal, ProposalItem, KPTemplate
+from . import pdf_cache, pricing
+from .pdf_admission import AdmissionRejected
+from .printing import build_print_context, print_cache_key, print_items, render_proposal_pdf
 from .serializers import ProposalSerializer
 
 User = get_user_model()
 ACTIVE_KP_SESSION_KEY = "active_kp_id"
 
 AUTO_CLOSE_HOURS = 16  # автозакрытие после начала мероприятия
+
+# автосохранение builder: имя поля формы -> колонка Proposal
+AUTOSAVE_FIELDS = {
+    "event_title": "event_title",
+    "event_address": "event_location",
+    "event_address_url": "event_location_url",
+    "drive_url": "drive_link",
+    "event_description": "event_description",
+}
 logger = logging.getLogger(__name__)
 
 
@@ -244,21 +259,6 @@ def _get_or_create_admin_draft(owner: User, customer: User, *, force_new: bool =
     )
 
 
-def _notes_json_load(kp: Optional[Proposal]) -> dict[str, Any]:
-    if not kp:
-        return {}
-    raw = getattr(kp, "notes", "") or ""
-    try:
-        data = json.loads(raw) if raw.strip().startswith("{") else {}
-    except Exception:
-        data = {}
-    return data if isinstance(data, dict) else {}
-
-
-def _notes_json_save(kp: Proposal, data: dict[str, Any]) -> None:
-    kp.notes = json.dumps(data, ensure_ascii=False)
-
-
 def _parse_dt_local(dt_raw: str):
     if not dt_raw:
         return None
@@ -270,43 +270,6 @@ def _parse_dt_local(dt_raw: str):
     except Exception:
         return None
 
-from decimal import Decimal, ROUND_HALF_UP
-
-def _calc_totals(items, *, add_percent: int = 20):
-    """
-    subtotal: сумма по строкам
-    extra: надбавка add_percent%
-    total: subtotal + extra
-    Возвращаем int, чтобы без Decimal-ада в шаблоне.
-    """
-    subtotal = 0
-    for it in items:
-        try:
-            subtotal += int(it.qty) * int(it.price or 0)
-        except Exception:
-            pass
-
-    extra = int((Decimal(subtotal) * Decimal(add_percent) / Decimal(100)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-    total = subtotal + extra
-    return subtotal, extra, total
-
-
-def _calc_total_sum(items) -> int:
-    total = 0
-    for it in items:
-        tp = getattr(it, "total_price", None)
-        if tp is not None:
-            try:
-                total += int(tp)
-                continue
-            except Exception:
-                pass
-        try:
-            total += int(it.qty) * int(it.price or 0)
-        except Exception:
-            pass
-    return total
-
 import json
 from decimal import Decimal
 
@@ -350,49 +313,29 @@ def update_item_price(request, item_id: int):
     item.price = price_int
     item.save(update_fields=["price"])
 
-    # пересчёт строки и итога
-    items = list(kp.items.all())
-    subtotal, extra20, total = _calc_totals(items, add_percent=20)
-
-    item_total = 0
-    try:
-        item_total = int(item.qty) * int(item.price or 0)
-    except Exception:
-        pass
+    # итоги сметы уже сдвинуты сигналом — читаем три колонки
+    kp.refresh_from_db(fields=["subtotal", "extra", "total"])
 
     return JsonResponse({
         "ok": True,
         "item_id": item.id,
         "price": item.price,
-        "item_total": item_total,
-        "subtotal": subtotal,
-        "extra20": extra20,
-        "total": total,
+        "item_total": pricing.item_total(item),
+        "subtotal": kp.subtotal,
+        "extra20": kp.extra,
+        "total": kp.total,
     })
 
 
-def _get_event_datetime(kp: Proposal) -> Optional[datetime]:
-    dt = getattr(kp, "event_datetime", None)
-    if dt:
-        return dt
-
-    meta = _notes_json_load(kp)
-    raw = (meta.get("event_datetime") or "").strip()
-    return _parse_dt_local(raw)
-
-
 def _maybe_autoclose(kp: Proposal) -> bool:
     """
     Автозавершение через AUTO_CLOSE_HOURS после event_datetime.
     Проверяем при открытии.
     """
-    dt = _get_event_datetime(kp)
+    dt = kp.event_datetime
     if not dt:
         return False
 
-    if timezone.is_naive(dt):
-        dt = timezone.make_aware(dt, timezone.get_current_timezone())
-
     if timezone.now() >= dt + timedelta(hours=AUTO_CLOSE_HOURS):
         if kp.status in (STATUS_DRAFT, STATUS_CONFIRMED):
             kp.status = STATUS_SENT
@@ -402,14 +345,36 @@ def _maybe_autoclose(kp: Proposal) -> bool:
     return False
 
 
+def _autoclose_due_qs():
+    cutoff = timezone.now() - timedelta(hours=AUTO_CLOSE_HOURS)
+    return Proposal.objects.filter(status__in=(STATUS_DRAFT, STATUS_CONFIRMED), event_datetime__lte=cutoff)
+
+
+def autoclose_due() -> int:
+    """
+    То же автозавершение, что _maybe_autoclose, но одним UPDATE для всех смет
+    (индекс status + event_datetime) — чтобы списки на дашборде были честными,
+    а не ждали, пока смету откроют.
+    """
+    return _autoclose_due_qs().update(status=STATUS_SENT)
+
+
+def _is_ajax(request) -> bool:
+    return request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+
 def _redirect_after_add(request, kp_id: int):
     """
     После добавления услуги:
     - если next = /kp/ => открываем builder конкретного КП (чтобы не теряться в списке)
+    - AJAX со страницы каталога => JSON, сайдбар перерисует себя сам
     - иначе возвращаемся обратно (next/referer) и добавляем kp_added=1
     """
     next_url = (request.POST.get("next") or "").strip()
 
+    if _is_ajax(request) and next_url.rstrip("/") != "/kp":
+        return JsonResponse({"ok": True, "kp_id": kp_id})
+
     # "Добавить и открыть" у тебя шлёт /kp/
     if next_url.rstrip("/") == "/kp":
         return redirect("kp:builder", kp_id=kp_id)
@@ -449,6 +414,8 @@ def kp_home(request):
         return redirect("kp:builder", kp_id=kp.id)
 
     # ADMIN
+    autoclose_due()
+
     active_list = (
         Proposal.objects
         .filter(owner=request.user, status=STATUS_DRAFT)
@@ -556,40 +523,40 @@ def kp_autosave(request, kp_id: int):
         if kp.status != STATUS_DRAFT:
             return JsonResponse({"ok": False, "detail": "already sent"}, status=400)
 
-    data = _notes_json_load(kp)
+    # пишем только то, что пришло: итоги и статус могли поменять параллельные запросы
+    update_fields = ["updated_at"]
 
     title = (request.POST.get("title") or "").strip()
     if title:
         kp.title = title
+        update_fields.append("title")
 
     template_id = (request.POST.get("template_id") or "").strip()
     if template_id:
         tpl = get_object_or_404(KPTemplate, id=int(template_id))
         kp.template = tpl
+        update_fields.append("template")
         if hasattr(kp, "template_snapshot") and hasattr(tpl, "to_snapshot"):
             kp.template_snapshot = tpl.to_snapshot()
+            update_fields.append("template_snapshot")
 
-    data["event_title"] = (request.POST.get("event_title") or "").strip()
-
-    # ✅ ТРИ РАЗНЫХ ПОЛЯ
-    data["event_address"] = (request.POST.get("event_address") or "").strip()
-    data["event_address_url"] = (request.POST.get("event_address_url") or "").strip()
-    data["drive_url"] = (request.POST.get("drive_url") or "").strip()
-
-    data["event_description"] = (request.POST.get("event_description") or "").strip()
+    # поля формы -> колонки; скрытых в форме полей нет в POST — их не трогаем
+    for name, field in AUTOSAVE_FIELDS.items():
+        if name in request.POST:
+            setattr(kp, field, (request.POST.get(name) or "").strip())
+            update_fields.append(field)
 
-    dt_raw = (request.POST.get("event_datetime") or "").strip()
-    data["event_datetime"] = dt_raw
-
-    if dt_raw and hasattr(kp, "event_datetime"):
+    # пустое значение — явная очистка; недопечатанное/битое — не трогаем дату
+    if "event_datetime" in request.POST:
+        dt_raw = (request.POST.get("event_datetime") or "").strip()
         dt = _parse_dt_local(dt_raw)
-        if dt:
-            if timezone.is_naive(dt):
-                dt = timezone.make_aware(dt, timezone.get_current_timezone())
+        if dt and timezone.is_naive(dt):
+            dt = timezone.make_aware(dt, timezone.get_current_timezone())
+        if dt or not dt_raw:
             kp.event_datetime = dt
+            update_fields.append("event_datetime")
 
-    _notes_json_save(kp, data)
-    kp.save()
+    kp.save(update_fields=update_fields)
 
     return JsonResponse({"ok": True})
 
@@ -611,6 +578,8 @@ def add_service_to_active_kp(request, service_id: int):
         kp = _get_active_kp_for_admin(request)
         if not kp:
             messages.error(request, "Нет активной сметы. Открой /kp/ и выбери клиента.")
+            if _is_ajax(request):
+                return JsonResponse({"ok": False, "redirect": reverse("kp:kp")}, status=409)
             return redirect("kp:kp")
     else:
         kp = _get_or_create_customer_draft(request.user)
@@ -695,8 +664,6 @@ def add_service_to_kp(request, kp_id: int, service_id: int):
 def remove_item_from_active_kp(request, item_id: int):
     if _is_admin(request.user):
         kp = _get_active_kp_for_admin(request)
-        if not kp:
-            return redirect("kp:kp")
     else:
         kp = (
             Proposal.objects
@@ -704,14 +671,107 @@ def remove_item_from_active_kp(request, item_id: int):
             .order_by("-updated_at", "-id")
             .first()
         )
-        if not kp:
-            return redirect("kp:kp")
+    if not kp:
+        if _is_ajax(request):
+            return JsonResponse({"ok": False, "redirect": reverse("kp:kp")}, status=409)
+        return redirect("kp:kp")
 
     item = get_object_or_404(ProposalItem, id=item_id, proposal=kp)
     item.delete()
+    if _is_ajax(request):
+        return JsonResponse({"ok": True, "kp_id": kp.id})
     return redirect(request.META.get("HTTP_REFERER") or "/kp/")
 
 
+# =========================
+# Сайдбар сметы в каталоге
+# =========================
+def _sidebar_page_url(request) -> str:
+    next_url = (request.GET.get("next") or "").strip()
+    if next_url.startswith("/") and url_has_allowed_host_and_scheme(
+        url=next_url,
+        allowed_hosts={request.get_host()},
+        require_https=request.is_secure(),
+    ):
+        return next_url
+    return reverse("kp:kp")
+
+
+def _sidebar_context(request) -> dict[str, Any]:
+    """
+    Черновик КП для сайдбара страницы категории.
+    Админ: черновики одним запросом (активный выбираем из них), клиент: последний
+    черновик. Позиции — ещё один запрос вместе с услугами.
+    """
+    user = request.user
+    is_admin = _is_admin(user)
+    draft_kps: list[Proposal] = []
+    active_kp: Optional[Proposal] = None
+
+    if is_admin:
+        draft_kps = list(
+            Proposal.objects
+            .filter(owner=user, status=STATUS_DRAFT)
+            .select_related("customer")
+            .order_by("-updated_at")
+        )
+        by_id = {kp.id: kp for kp in draft_kps}
+
+        selected = (request.GET.get("kp") or "").strip()
+        if selected.isdigit() and int(selected) in by_id:
+            active_kp = by_id[int(selected)]
+        else:
+            active_kp = by_id.get(request.session.get(ACTIVE_KP_SESSION_KEY))
+        if active_kp is None and draft_kps:
+            active_kp = draft_kps[0]
+        if active_kp is not None and request.session.get(ACTIVE_KP_SESSION_KEY) != active_kp.id:
+            _set_active_kp(request, active_kp)
+    elif user.is_authenticated:
+        active_kp = (
+            Proposal.objects
+            .filter(customer=user, owner=user, status=STATUS_DRAFT)
+            .order_by("-updated_at", "-id")
+            .first()
+        )
+
+    kp_items: list[ProposalItem] = []
+    if active_kp is not None:
+        kp_items = list(ProposalItem.objects.filter(proposal=active_kp).select_related("service").order_by("id"))
+
+    return {
+        "is_admin": is_admin,
+        "draft_kps": draft_kps,
+        "active_kp": active_kp,
+        "kp_items": kp_items,
+        "kp_subtotal": active_kp.subtotal if active_kp else 0,
+        "kp_fee": active_kp.extra if active_kp else 0,
+        "kp_total": active_kp.total if active_kp else 0,
+        "page_url": _sidebar_page_url(request),
+    }
+
+
+@require_GET
+@never_cache
+def kp_sidebar(request):
+    """
+    Фрагменты сайдбара для каркаса страницы категории (см. static/js/kp-sidebar.js).
+    """
+    ctx = _sidebar_context(request)
+    fragments = {
+        "desktop": render_to_string("kp/sidebar/desktop.html", ctx, request=request),
+        "mobile": render_to_string("kp/sidebar/mobile.html", ctx, request=request),
+    }
+    if ctx["is_admin"]:
+        fragments["drafts"] = render_to_string("kp/sidebar/drafts.html", ctx, request=request)
+
+    return JsonResponse({
+        "kp_id": ctx["active_kp"].id if ctx["active_kp"] else None,
+        "items_count": len(ctx["kp_items"]),
+        "total": ctx["kp_total"],
+        "fragments": fragments,
+    })
+
+
 @login_required
 @require_POST
 def clear_kp(request, kp_id: int):
@@ -749,33 +809,34 @@ def submit_kp(request, kp_id: int):
         if kp.items.count() == 0:
             messages.error(request, "Нельзя завершить пустую смету.")
             return redirect("kp:builder", kp_id=kp.id)
-        
-        items = list(kp.items.all())
-        subtotal, extra20, total = _calc_totals(items, add_percent=20)
 
-        kp.fixed_subtotal = subtotal
-        kp.fixed_extra = extra20
-        kp.fixed_total = total
+        kp.fixed_subtotal = kp.subtotal
+        kp.fixed_extra = kp.extra
+        kp.fixed_total = kp.total
 
-        # сохраняем ФИО клиента в notes, чтобы print корректно показывал имя
-        _admin_notes = _notes_json_load(kp)
-        if not _admin_notes.get("customer_full_name"):
+        # фиксируем ФИО клиента, чтобы print корректно показывал имя
+        if not kp.customer_full_name:
             _cust = kp.customer
             _cfn = getattr(_cust, "first_name", "") or ""
             _cln = getattr(_cust, "last_name", "") or ""
-            _admin_notes["customer_full_name"] = f"{_cfn} {_cln}".strip() or (
+            kp.customer_full_name = f"{_cfn} {_cln}".strip() or (
                 _cust.get_full_name() if hasattr(_cust, "get_full_name") else ""
             ) or ""
-        if not _admin_notes.get("customer_phone"):
-            _admin_notes["customer_phone"] = (getattr(kp.customer, "phone", "") or "").strip()
-        if not _admin_notes.get("customer_email"):
-            _admin_notes["customer_email"] = (kp.customer.email or "").strip()
-        _notes_json_save(kp, _admin_notes)
+        if not kp.customer_phone:
+            kp.customer_phone = (getattr(kp.customer, "phone", "") or "").strip()
+        if not kp.customer_email:
+            kp.customer_email = (kp.customer.email or "").strip()
 
         kp.status = STATUS_SENT
-        kp.save(update_fields=["notes", "status", "fixed_subtotal", "fixed_extra", "fixed_total"])
+        kp.save(update_fields=[
+            "customer_full_name", "customer_phone", "customer_email",
+            "status", "fixed_subtotal", "fixed_extra", "fixed_total",
+        ])
         _clear_active_kp(request)
 
+        # PDF готовим заранее, к моменту "Скачать" он уже в кэше
+        transaction.on_commit(lambda: enqueue_pdf_render(kp, request=request))
+
         next_url = (request.POST.get("next") or "").strip()
         return redirect(next_url or "/kp/?tab=history")
 
@@ -796,25 +857,23 @@ def submit_kp(request, kp_id: int):
         messages.error(request, "Нет менеджера (is_staff=True). Создай админа.")
         return redirect("kp:builder", kp_id=kp.id)
 
-    data = _notes_json_load(kp)
-    data["customer_requested_at"] = timezone.now().isoformat()
-    data["customer_username"] = request.user.username
-    data["customer_email"] = getattr(request.user, "email", "") or ""
-    data["customer_phone"] = getattr(request.user, "phone", "") or ""
+    kp.requested_at = timezone.now()
+    kp.customer_email = getattr(request.user, "email", "") or ""
+    kp.customer_phone = getattr(request.user, "phone", "") or ""
     _fn = getattr(request.user, "first_name", "") or ""
     _ln = getattr(request.user, "last_name", "") or ""
-    data["customer_full_name"] = f"{_fn} {_ln}".strip() or (request.user.get_full_name() if hasattr(request.user, "get_full_name") else "") or ""
-    _notes_json_save(kp, data)
+    kp.customer_full_name = f"{_fn} {_ln}".strip() or (request.user.get_full_name() if hasattr(request.user, "get_full_name") else "") or ""
 
     kp.owner = manager
-    items = list(kp.items.all())
-    subtotal, extra20, total = _calc_totals(items, add_percent=20)
-
-    kp.fixed_subtotal = subtotal
-    kp.fixed_extra = extra20
-    kp.fixed_total = total
+    kp.fixed_subtotal = kp.subtotal
+    kp.fixed_extra = kp.extra
+    kp.fixed_total = kp.total
     kp.status = STATUS_REQUESTED
-    kp.save(update_fields=["status", "fixed_subtotal", "fixed_extra", "fixed_total"])
+    kp.save(update_fields=[
+        "requested_at", "customer_full_name", "customer_phone", "customer_email",
+        "status", "fixed_subtotal", "fixed_extra", "fixed_total",
+    ])
+    transaction.on_commit(lambda: enqueue_pdf_render(kp, request=request))
 
     messages.success(request, "Смета отправлена менеджеру. Ожидай обратной связи.")
     return redirect("kp:kp")
@@ -873,24 +932,10 @@ def kp_make_active(request, kp_id: int):
     # 2) СБРОС ТАЙМЕРА: считаем, что мероприятие "прямо сейчас"
     now = timezone.now()
 
-    # если поле event_datetime есть в модели — обновляем его
-    if hasattr(kp, "event_datetime"):
-        kp.event_datetime = now
-
-    # и обновляем meta.notes (чтобы в builder.html было корректное значение в datetime-local)
-    data = _notes_json_load(kp)
-
-    # datetime-local обычно ждёт формат "YYYY-MM-DDTHH:MM"
-    local = timezone.localtime(now)
-    data["event_datetime"] = local.strftime("%Y-%m-%dT%H:%M")
-
-    _notes_json_save(kp, data)
+    kp.event_datetime = now
 
     # 3) сохраняем
-    fields = ["status", "notes"]
-    if hasattr(kp, "event_datetime"):
-        fields.append("event_datetime")
-    kp.save(update_fields=fields)
+    kp.save(update_fields=["status", "event_datetime"])
 
     # 4) активное в сессию и в билд
     _set_active_kp(request, kp)
@@ -928,17 +973,14 @@ def kp_builder(request, kp_id: int):
 
         items = kp.items.select_related("service").all()
         templates = KPTemplate.objects.order_by("-updated_at").all()
-        meta = _notes_json_load(kp)
-        subtotal, extra20, total = _calc_totals(items, add_percent=20)
 
         return render(request, "kp/builder.html", {
             "kp": kp,
             "items": items,
             "templates": templates,
-            "meta": meta,
-            "subtotal": subtotal,
-            "extra20": extra20,
-            "total": total,
+            "subtotal": kp.subtotal,
+            "extra20": kp.extra,
+            "total": kp.total,
             "is_admin": True,
             "is_editable": is_editable,   # <-- ВАЖНО: иначе всё становится read-only
         })
@@ -961,17 +1003,14 @@ def kp_builder(request, kp_id: int):
 
     items = kp.items.select_related("service").all()
     templates = KPTemplate.objects.order_by("-updated_at").all()
-    meta = _notes_json_load(kp)
-    subtotal, extra20, total = _calc_totals(items, add_percent=20)
 
     return render(request, "kp/builder.html", {
         "kp": kp,
         "items": items,
         "templates": templates,
-        "meta": meta,
-        "subtotal": subtotal,
-        "extra20": extra20,
-        "total": total,
+        "subtotal": kp.subtotal,
+        "extra20": kp.extra,
+        "total": kp.total,
         "is_admin": False,
         "is_editable": True,
     })
@@ -980,6 +1019,14 @@ def kp_builder(request, kp_id: int):
 # =========================
 # PRINT / PDF (Playwright-only, без WeasyPrint)
 # =========================
+def _pdf_response(path, *, filename: str, etag: str) -> FileResponse:
+    resp = FileResponse(open(path, "rb"), content_type="application/pdf", as_attachment=True, filename=filename)
+    resp["ETag"] = etag
+    # браузер может хранить, но обязан перепроверять по ETag
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
+
+
 @login_required
 def kp_print(request, kp_id: int):
     kp = get_object_or_404(
@@ -995,157 +1042,41 @@ def kp_print(request, kp_id: int):
         if kp.customer_id != request.user.id:
             return redirect("kp:kp")
 
-    items = list(kp.items.select_related("service").all())
-    meta = _notes_json_load(kp)
-    event_dt = _get_event_datetime(kp)
-    if event_dt and timezone.is_naive(event_dt):
-        event_dt = timezone.make_aware(event_dt, timezone.get_current_timezone())
-    if event_dt:
-        event_dt = timezone.localtime(event_dt)
-
-    # --- Заказчик из meta, иначе из профиля ---
-    customer_full_name = (meta.get("customer_full_name") or "").strip()
-    customer_phone = (meta.get("customer_phone") or "").strip()
-    customer_email = (meta.get("customer_email") or "").strip()
-
-    if not customer_full_name:
-        if hasattr(kp.customer, "get_full_name"):
-            customer_full_name = kp.customer.get_full_name().strip()
-        if not customer_full_name:
-            fn = getattr(kp.customer, "first_name", "")
-            ln = getattr(kp.customer, "last_name", "")
-            customer_full_name = f"{fn} {ln}".strip()
-
-    if not customer_full_name:
-        customer_full_name = kp.customer.username
-
-    if not customer_phone:
-        customer_phone = (getattr(kp.customer, "phone", "") or "").strip()
-
-    if not customer_email:
-        customer_email = (getattr(kp.customer, "email", "") or "").strip()
-
-    # --- Исполнитель из settings, иначе из owner ---
-    performer_name = (getattr(settings, "KP_PERFORMER_NAME", "") or "").strip()
-    performer_phone = (getattr(settings, "KP_PERFORMER_PHONE", "") or "").strip()
-    performer_email = (getattr(settings, "KP_PERFORMER_EMAIL", "") or "").strip()
-
-    if not performer_name:
-        performer_name = (getattr(kp.owner, "get_full_name", lambda: "")() or kp.owner.username or "").strip()
-    if not performer_phone:
-        performer_phone = (getattr(kp.owner, "phone", "") or "").strip()
-    if not performer_email:
-        performer_email = (getattr(kp.owner, "email", "") or "").strip()
-
-    # --- Итоги по строкам ---
-    if kp.fixed_total is not None and kp.fixed_total > 0:
-        subtotal = kp.fixed_subtotal
-        extra20 = kp.fixed_extra
-        total = kp.fixed_total
-    else:
-        subtotal, extra20, total = _calc_totals(items, add_percent=20)
+    items = print_items(kp)
+    ctx = build_print_context(kp, items, site_url=request.build_absolute_uri("/")[:-1])
 
     download = (request.GET.get("download") or "").strip().lower() in ("1", "true", "yes", "on")
 
-    # База сайта для абсолютных ссылок на /media и /static
-    site_url = request.build_absolute_uri("/")[:-1]  # например http://127.0.0.1:8000
-
-    ctx = {
-        "kp": kp,
-        "items": items,
-        "meta": meta,
-        "event_dt": event_dt,
-        "subtotal": subtotal,
-        "extra20": extra20,
-        "total": total,
-        "now": timezone.now(),
-
-        "customer_full_name": customer_full_name,
-        "customer_phone": customer_phone,
-        "customer_email": customer_email,
-
-        "performer_name": performer_name,
-        "performer_phone": performer_phone,
-        "performer_email": performer_email,
-
-        "site_url": site_url,
-        
-        
-    }
- 
-    ctx["site_url"] = request.build_absolute_uri("/")[:-1]
-    ctx["now"] = timezone.now()
-   
-
     # Обычный просмотр HTML
     if not download:
         return render(request, "kp/print.html", ctx)
 
     # ========= PDF через Playwright =========
-    html_string = render_to_string("kp/print.html", ctx, request=request)
     filename = f"KP_{kp.id}.pdf"
-    image_count = sum(1 for item in items if getattr(item.service, "image", None))
 
-    try:
-        from playwright.sync_api import sync_playwright  # type: ignore
-
-        logger.warning(
-            "Starting proposal PDF generation kp_id=%s item_count=%s image_count=%s",
-            kp.id,
-            len(items),
-            image_count,
-        )
-        started_at = time.perf_counter()
-
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.emulate_media(media="print")
-
-            # Важно: чтобы относительные ссылки нормально резолвились,
-            # добавим <base href="..."> прямо в HTML (надёжнее, чем надеяться на base_url API).
-            if "<head>" in html_string:
-                html_string = html_string.replace(
-                    "<head>",
-                    f"<head><base href=\"{site_url}/\">",
-                    1
-                )
-
-            page.set_content(html_string, wait_until="load")
-
-            # Иногда шрифты/картинки догружаются не мгновенно
-            page.wait_for_timeout(400)
-
-            pdf_bytes = page.pdf(
-                format="A4",
-                print_background=True,
-                margin={"top": "12mm", "bottom": "12mm", "left": "10mm", "right": "10mm"},
-            )
+    # Фоновый рендер: отдаём id задания, файл забирается через kp:pdf_job
+    if (request.GET.get("async") or "").strip().lower() in ("1", "true", "yes", "on"):
+        job = enqueue_pdf_render(kp, request=request)
+        return JsonResponse(_pdf_job_payload(job), status=202)
 
-            browser.close()
-
-        elapsed = time.perf_counter() - started_at
-        if elapsed >= 10:
-            logger.warning(
-                "Slow proposal PDF generation kp_id=%s item_count=%s image_count=%s duration=%.2fs",
-                kp.id,
-                len(items),
-                image_count,
-                elapsed,
-            )
-
-        resp = HttpResponse(pdf_bytes, content_type="application/pdf")
-        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
-        resp["Cache-Control"] = "no-store"
+    # Кэш: тот же набор данных -> тот же PDF, Chromium не трогаем
+    etag = f'"{print_cache_key(kp, items, ctx)}"'
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        resp = HttpResponseNotModified()
+        resp["ETag"] = etag
         return resp
 
-    except Exception as e:
-        logger.exception(
-            "Proposal PDF generation failed kp_id=%s item_count=%s image_count=%s",
-            kp.id,
-            len(items),
-            image_count,
+    try:
+        cache_key, pdf_path = render_proposal_pdf(kp, items=items, ctx=ctx, request=request)
+    except AdmissionRejected as e:
+        resp = HttpResponse(
+            "Сейчас генерируется слишком много PDF. Попробуйте через несколько секунд.",
+            content_type="text/plain; charset=utf-8",
+            status=503,
         )
+        resp["Retry-After"] = str(e.retry_after)
+        return resp
+    except Exception as e:
         return HttpResponse(
             "PDF генерация не работает через Playwright.\n"
             f"Ошибка: {e}\n\n"
@@ -1156,6 +1087,83 @@ def kp_print(request, kp_id: int):
             status=500,
         )
 
+    return _pdf_response(pdf_path, filename=filename, etag=f'"{cache_key}"')
+
+
+# =========================
+# Фоновая очередь PDF
+# =========================
+def enqueue_pdf_render(kp: Proposal, *, request=None, language: Optional[str] = None) -> PDFRenderJob:
+    """
+    Ставит рендер PDF в очередь (воркер: manage.py kp_pdf_worker).
+    Если для сметы уже есть незавершённое задание на том же языке — возвращаем его
+    (зависшее RUNNING сперва возвращаем в очередь).
+    """
+    if language is None:
+        language = translation.get_language() or ""
+    PDFRenderJob.requeue_stale(proposal=kp)
+    job = (
+        PDFRenderJob.objects
+        .filter(
+            proposal=kp,
+            language=language,
+            status__in=(PDFRenderJob.Status.PENDING, PDFRenderJob.Status.RUNNING),
+        )
+        .order_by("-id")
+        .first()
+    )
+    if job:
+        return job
+
+    user = getattr(request, "user", None)
+    return PDFRenderJob.objects.create(
+        proposal=kp,
+        requested_by=user if user and user.is_authenticated else None,
+        language=language,
+    )
+
+
+def _pdf_job_payload(job: PDFRenderJob) -> dict[str, Any]:
+    status_url = reverse("kp:pdf_job", args=[job.id])
+    return {
+        "ok": job.status != PDFRenderJob.Status.FAILED,
+        "job_id": job.id,
+        "status": job.status,
+        "error": job.error,
+        "status_url": status_url,
+        "download_url": f"{status_url}?download=1" if job.status == PDFRenderJob.Status.DONE else "",
+    }
+
+
+@login_required
+def kp_pdf_job(request, job_id: int):
+    job = get_object_or_404(PDFRenderJob.objects.select_related("proposal"), id=job_id)
+    kp = job.proposal
+
+    # Права — как у kp_print
+    if _is_admin(request.user):
+        if kp.owner_id != request.user.id:
+            return JsonResponse({"ok": False, "detail": "forbidden"}, status=403)
+    elif kp.customer_id != request.user.id:
+        return JsonResponse({"ok": False, "detail": "forbidden"}, status=403)
+
+    download = (request.GET.get("download") or "").strip().lower() in ("1", "true", "yes", "on")
+    if not download or job.status != PDFRenderJob.Status.DONE:
+        return JsonResponse(_pdf_job_payload(job))
+
+    # смета могла измениться после рендера — файл задания тогда устарел
+    with translation.override(job.language or settings.LANGUAGE_CODE):
+        items = print_items(kp)
+        fresh_key = print_cache_key(kp, items, build_print_context(kp, items))
+    pdf_path = None
+    if fresh_key == job.cache_key:
+        pdf_path = pdf_cache.get(kp.id, job.cache_key, language=job.language or settings.LANGUAGE_CODE)
+    if not pdf_path:
+        # файл вытеснен из кэша или смета изменилась — рендерим заново
+        job = enqueue_pdf_render(kp, request=request, language=job.language)
+        return JsonResponse(_pdf_job_payload(job), status=202)
+
+    return _pdf_response(pdf_path, filename=f"KP_{kp.id}.pdf", etag=f'"{job.cache_key}"')
 
 
 # =========================
@@ -1278,6 +1286,12 @@ def kp_upload_photo(request, kp_id: int):
         messages.error(request, "В модели Proposal нет поля photo. Добавь ImageField photo.")
         return redirect("kp:builder", kp_id=kp.id)
 
+    try:
+        validate_image_upload(file)
+    except ValidationError as e:
+        messages.error(request, " ".join(e.messages))
+        return redirect("kp:builder", kp_id=kp.id)
+
     kp.photo = file
     kp.save(update_fields=["photo"])
     messages.success(request, "Фото загружено.")
@@ -1366,22 +1380,15 @@ def update_item_qty(request, item_id: int):
 
     item.save(update_fields=["qty"])
 
-    # totals
-    items = list(kp.items.all())
-    subtotal, extra20, total = _calc_totals(items, add_percent=20)
-
-    item_total = 0
-    try:
-        item_total = int(item.qty) * int(item.price or 0)
-    except Exception:
-        pass
+    # totals: сигнал уже сдвинул итоги сметы
+    kp.refresh_from_db(fields=["subtotal", "extra", "total"])
 
     return JsonResponse({
         "ok": True,
         "item_id": item.id,
         "qty": item.qty,
-        "item_total": item_total,
-        "subtotal": subtotal,
-        "extra20": extra20,
-        "total": total,
+        "item_total": pricing.item_total(item),
+        "subtotal": kp.subtotal,
+        "extra20": kp.extra,
+        "total": kp.total,
     })
@@ -0,0 +1,63 @@
+# main/build.py
+"""
+Идентификатор сборки — меняется с каждым деплоем.
+
+Нужен валидаторам HTTP-кэша: HTML ссылается на шаблоны и статику с хэшем в
+имени, и после деплоя старое тело отдавать нельзя, даже если данные не менялись.
+BUILD_ID из окружения (например, git sha из CI) — если задан; иначе отпечаток
+манифеста статики и шаблонов (путь, размер, mtime). Считается один раз на процесс.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_stamp: Optional[tuple[str, int]] = None
+
+
+def _fingerprint_files() -> list[Path]:
+    files = []
+    if settings.STATIC_ROOT:
+        manifest = Path(settings.STATIC_ROOT) / "staticfiles.json"
+        if manifest.is_file():
+            files.append(manifest)
+    base = Path(settings.BASE_DIR)
+    files.extend(sorted(base.glob("*/templates/**/*.html")))
+    files.extend(sorted(base.glob("templates/**/*.html")))
+    return files
+
+
+def _compute() -> tuple[str, int]:
+    digest = hashlib.sha1()
+    newest = 0
+    for path in _fingerprint_files():
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns}|".encode())
+        newest = max(newest, int(st.st_mtime))
+    if settings.BUILD_ID:
+        return settings.BUILD_ID, newest
+    return digest.hexdigest()[:12], newest
+
+
+def build_stamp() -> tuple[str, int]:
+    """
+    (id сборки, время самого свежего файла сборки в секундах).
+    """
+    global _stamp
+    if _stamp is None:
+        with _lock:
+            if _stamp is None:
+                _stamp = _compute()
+    return _stamp
+
+
+def build_id() -> str:
+    return build_stamp()[0]
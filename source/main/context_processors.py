@@ -1,27 +1,75 @@
 from __future__ import annotations
 
+import threading
+
 from django.urls import reverse
 
-from catalog.models import Service
+from catalog.snapshot import get_snapshot
+
+
+class _HitCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+nav_cache_stats = _HitCounter()
+
+
+# снимок каталога -> {админ?: id первой категории}; пересчёт при новом снимке
+_nav_lock = threading.Lock()
+_nav_memo: dict = {"snapshot": None, "ids": {}}
+
+
+def _first_category_id(snapshot, is_admin: bool) -> int:
+    # категории в снимке идут по (sort_order, id); первая, где есть видимая услуга
+    for category in snapshot.categories_by_id.values():
+        if not (is_admin or category.is_active):
+            continue
+        if any(is_admin or s.is_active for s in category.services):
+            return category.id
+    return 0
 
 
 def nav_services_url(request):
     """
     Глобальная ссылка в navbar на первую доступную категорию с услугами
     (страница /categories/<id>/services/) без хардкода id.
+    Берётся из снимка каталога: он сверяет версию с БД, так что запись в
+    любом процессе видна всем, без отдельного кэша и сигналов.
     """
-    qs = Service.objects.order_by("category__sort_order", "category_id", "sort_order", "id")
-
     is_admin = bool(
         getattr(request, "user", None)
         and request.user.is_authenticated
         and (request.user.is_staff or request.user.is_superuser)
     )
 
-    if not is_admin:
-        qs = qs.filter(is_active=True, category__is_active=True)
+    snapshot = get_snapshot()
+    with _nav_lock:
+        if _nav_memo["snapshot"] is not snapshot:
+            _nav_memo["snapshot"], _nav_memo["ids"] = snapshot, {}
+        category_id = _nav_memo["ids"].get(is_admin)
+        nav_cache_stats.count(category_id is not None)
+        if category_id is None:
+            category_id = _nav_memo["ids"][is_admin] = _first_category_id(snapshot, is_admin)
 
-    category_id = qs.values_list("category_id", flat=True).first()
     if category_id:
         return {"nav_services_url": reverse("main:category_services", args=[category_id])}
 
@@ -0,0 +1,255 @@
+# main/images.py
+"""
+Производные картинки (уменьшенные копии) для медиа.
+
+Оригиналы загрузок не трогаем: рядом, в MEDIA_ROOT/derived/<вариант>/, кладём
+копии под конкретное применение. В имя копии зашит отпечаток оригинала
+(имя + размер + mtime), поэтому после замены файла копия пересобирается сама,
+а старая удаляется.
+
+Для страниц — адаптивный набор (RESPONSIVE_VARIANTS) в WebP и JPEG: собирается
+при загрузке (main/signals.py) и командой build_image_derivatives, а шаблоны
+({% responsive_img %}) только ищут готовые копии и ничего не рендерят.
+"""
+from __future__ import annotations
+
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "derived"
+
+
+@dataclass(frozen=True)
+class Variant:
+    max_side: int
+    jpeg_quality: int = 82
+    webp_quality: int = 80
+    # ограничиваем только ширину (для srcset ...w), высота — до 4 ширин
+    by_width: bool = False
+
+    @property
+    def box(self) -> tuple[int, int]:
+        if self.by_width:
+            return self.max_side, self.max_side * 4
+        return self.max_side, self.max_side
+
+
+VARIANTS: dict[str, Variant] = {
+    # A4 при ~150 dpi: для PDF смет больше не нужно
+    "print": Variant(max_side=1200, jpeg_quality=82),
+    # карточки и галереи на сайте
+    "thumb": Variant(max_side=360, jpeg_quality=78, webp_quality=75, by_width=True),
+    "card": Variant(max_side=720, jpeg_quality=80, webp_quality=78, by_width=True),
+    "large": Variant(max_side=1440, by_width=True),
+}
+
+RESPONSIVE_VARIANTS = ("thumb", "card", "large")
+
+FORMATS = {
+    "jpeg": "jpg",
+    "webp": "webp",
+}
+
+
+def _source_name(source) -> str:
+    name = getattr(source, "name", source) or ""
+    return str(name).replace("\\", "/")
+
+
+def _signature(path: Path) -> Optional[str]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    raw = f"{path.name}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:10]
+
+
+def derivative_name(name: str, variant: str, fmt: str, signature: str) -> str:
+    rel = PurePosixPath(name)
+    return str(PurePosixPath(DERIVED_DIR, variant, rel.parent, f"{rel.stem}.{signature}.{FORMATS[fmt]}"))
+
+
+# ширина готовых копий: имя копии содержит подпись оригинала, так что
+# запомненное значение не устаревает
+_widths: dict[str, int] = {}
+
+
+def _output_width(rel: str) -> Optional[int]:
+    """
+    Реальная ширина копии в пикселях (для srcset ...w): запомнена при сборке
+    в этом процессе, иначе читается из заголовка файла.
+    """
+    width = _widths.get(rel)
+    if width is None:
+        from PIL import Image
+
+        try:
+            with Image.open(Path(settings.MEDIA_ROOT) / rel) as img:
+                width = img.width
+        except Exception:
+            return None
+        _widths[rel] = width
+    return width
+
+
+def _render(src: Path, dst: Path, spec: Variant, fmt: str) -> int:
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as img:
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе — быстрее и меньше памяти
+        img.draft("RGB", spec.box)
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            if fmt == "jpeg":
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        img.thumbnail(spec.box, Image.Resampling.LANCZOS)
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=dst.parent, prefix=".tmp-", suffix=dst.suffix)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                if fmt == "jpeg":
+                    img.save(fh, "JPEG", quality=spec.jpeg_quality, optimize=True, progressive=True)
+                else:
+                    img.save(fh, "WEBP", quality=spec.webp_quality, method=6)
+            os.replace(tmp_name, dst)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+        return img.width
+
+
+def _drop_stale(dst: Path, name: str) -> None:
+    stem = glob.escape(PurePosixPath(name).stem)
+    for old in dst.parent.glob(f"{stem}.*{dst.suffix}"):
+        # stem.<подпись>.<ext> — только копии этого же оригинала
+        if old != dst and old.name.count(".") == dst.name.count("."):
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def _locate(source) -> tuple[str, Optional[str]]:
+    name = _source_name(source)
+    if not name:
+        return "", None
+    return name, _signature(Path(settings.MEDIA_ROOT) / name)
+
+
+def _derivative(name: str, signature: str, variant: str, fmt: str, *, build: bool) -> Optional[str]:
+    media_root = Path(settings.MEDIA_ROOT)
+    rel = derivative_name(name, variant, fmt, signature)
+    dst = media_root / rel
+    if dst.exists():
+        return rel
+    if not build:
+        return None
+
+    try:
+        _widths[rel] = _render(media_root / name, dst, VARIANTS[variant], fmt)
+    except Exception:
+        logger.exception("Failed to build %s/%s derivative for %s", variant, fmt, name)
+        return None
+
+    _drop_stale(dst, name)
+    return rel
+
+
+def get_derivative(source, variant: str, fmt: str = "jpeg", *, build: bool = True) -> Optional[str]:
+    """
+    Имя (относительно MEDIA_ROOT) готовой копии; при необходимости собирает её
+    (build=False — только ищет). None — если оригинала нет или Pillow не смог
+    его прочитать.
+    """
+    name, signature = _locate(source)
+    if signature is None:
+        return None
+    return _derivative(name, signature, variant, fmt, build=build)
+
+
+def build_derivatives(source, variants: tuple[str, ...] = RESPONSIVE_VARIANTS) -> int:
+    """
+    Собирает все копии оригинала во всех форматах. Возвращает, сколько собрано заново.
+    """
+    name, signature = _locate(source)
+    if signature is None:
+        return 0
+    built = 0
+    for variant in variants:
+        for fmt in FORMATS:
+            if _derivative(name, signature, variant, fmt, build=False):
+                continue
+            if _derivative(name, signature, variant, fmt, build=True):
+                built += 1
+    return built
+
+
+def build_instance_derivatives(instance) -> int:
+    """
+    Адаптивные копии всех картинок модели (ImageField) — после загрузки и в backfill.
+    """
+    from django.db import models
+
+    built = 0
+    for f in instance._meta.fields:
+        if isinstance(f, models.ImageField):
+            image = getattr(instance, f.name)
+            if image:
+                built += build_derivatives(image)
+    return built
+
+
+def responsive_srcset(source, fmt: str) -> list[tuple[str, int]]:
+    """
+    [(url, ширина)] готовых адаптивных копий — для srcset. Ничего не собирает.
+    Ширина — настоящая: маленький оригинал не растягиваем, и у всех вариантов
+    она может совпасть; такие дубли в srcset не нужны.
+    """
+    name, signature = _locate(source)
+    if signature is None:
+        return []
+    result = []
+    seen: set[int] = set()
+    for variant in RESPONSIVE_VARIANTS:
+        rel = _derivative(name, signature, variant, fmt, build=False)
+        width = _output_width(rel) if rel else None
+        if width and width not in seen:
+            seen.add(width)
+            result.append((f"{settings.MEDIA_URL}{rel}", width))
+    return result
+
+
+def derivative_url(source, variant: str, fmt: str = "jpeg", *, build: bool = True) -> str:
+    """
+    URL копии, а если собрать не вышло — URL оригинала (страница не должна ломаться).
+    """
+    rel = get_derivative(source, variant, fmt, build=build)
+    if rel:
+        return f"{settings.MEDIA_URL}{rel}"
+    try:
+        return source.url
+    except Exception:
+        name = _source_name(source)
+        return f"{settings.MEDIA_URL}{name}" if name else ""
@@ -0,0 +1,122 @@
+# main/management/commands/bench_sqlite_writes.py
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# как было до настройки: журнал отката, DEFERRED и таймаут sqlite3.connect по умолчанию
+BASELINE = {
+    "init_command": "PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL",
+    "transaction_mode": "DEFERRED",
+}
+
+
+def _configured() -> dict:
+    options = settings.DATABASES["default"].get("OPTIONS", {})
+    return {
+        "init_command": options.get("init_command", ""),
+        "transaction_mode": options.get("transaction_mode") or "DEFERRED",
+    }
+
+
+def _connect(path: Path, profile: dict) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    for command in profile["init_command"].split(";"):
+        if command.strip():
+            conn.execute(command)
+    return conn
+
+
+def _prepare(path: Path, proposals: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE proposal (id INTEGER PRIMARY KEY, title TEXT, updated_at REAL);
+        CREATE TABLE item (
+            id INTEGER PRIMARY KEY, proposal_id INTEGER, service_id INTEGER, qty INTEGER,
+            UNIQUE (proposal_id, service_id)
+        );
+        """
+    )
+    conn.executemany("INSERT INTO proposal (id, title, updated_at) VALUES (?, '', 0)", [(i,) for i in range(proposals)])
+    conn.commit()
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent write throughput (builder autosave pattern) on a scratch SQLite file: "
+        "baseline settings vs. the configured PRAGMAs and transaction mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent writers (default: 8).")
+        parser.add_argument("--writes", type=int, default=200, help="Transactions per writer (default: 200).")
+        parser.add_argument("--proposals", type=int, default=20, help="Proposals the writers share (default: 20).")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("The configured database is not SQLite.")
+        profiles = {"baseline": BASELINE, "configured": _configured()}
+        for label, profile in profiles.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp, "bench.sqlite3")
+                _prepare(path, options["proposals"])
+                done, locked, elapsed = self._run(path, profile, options)
+            rate = done / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{label:>10}: {done} commits, {locked} 'database is locked' in {elapsed:.2f}s "
+                f"-> {rate:.0f} tx/s ({profile['transaction_mode']}; {profile['init_command'] or '-'})"
+            )
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _run(self, path: Path, profile: dict, options) -> tuple[int, int, float]:
+        counters = {"done": 0, "locked": 0}
+        lock = threading.Lock()
+        start = threading.Barrier(options["threads"] + 1)
+        begin = f"BEGIN {profile['transaction_mode']}"
+
+        def writer(worker: int):
+            conn = _connect(path, profile)
+            start.wait()
+            for n in range(options["writes"]):
+                proposal = (worker * options["writes"] + n) % options["proposals"]
+                try:
+                    # автосохранение сметы: прочитать КП, обновить, записать позицию
+                    conn.execute(begin)
+                    conn.execute("SELECT title FROM proposal WHERE id = ?", (proposal,)).fetchone()
+                    conn.execute(
+                        "UPDATE proposal SET title = ?, updated_at = ? WHERE id = ?",
+                        (f"autosave {n}", time.time(), proposal),
+                    )
+                    conn.execute(
+                        "INSERT INTO item (proposal_id, service_id, qty) VALUES (?, ?, 1) "
+                        "ON CONFLICT (proposal_id, service_id) DO UPDATE SET qty = qty + 1",
+                        (proposal, n % 50),
+                    )
+                    conn.execute("COMMIT")
+                    key = "done"
+                except sqlite3.OperationalError as exc:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    if "locked" not in str(exc) and "busy" not in str(exc):
+                        raise
+                    key = "locked"
+                with lock:
+                    counters[key] += 1
+            conn.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return counters["done"], counters["locked"], time.perf_counter() - started
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Category, Service
+from main.images import build_instance_derivatives
+from portfolio.models import PortfolioCase, PortfolioCasePhoto
+
+
+class Command(BaseCommand):
+    help = "Build missing responsive image derivatives (WebP + JPEG) for catalog and portfolio media."
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in (Category, Service, PortfolioCase, PortfolioCasePhoto):
+            built = 0
+            for instance in model.objects.iterator():
+                built += build_instance_derivatives(instance)
+            total += built
+            self.stdout.write(f"{model._meta.label}: {built} derivative(s) built")
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} derivative(s) built"))
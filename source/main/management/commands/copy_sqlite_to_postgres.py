@@ -0,0 +1,134 @@
+# main/management/commands/copy_sqlite_to_postgres.py
+from __future__ import annotations
+
+import sqlite3
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from catalog.derived import invalidate_all
+from catalog.models import CatalogVersion
+from kp import pricing
+
+
+def _models():
+    # M2M-таблицы тоже (include_auto_created); прокси и неуправляемые — нет
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.managed and not model._meta.proxy:
+            yield model
+
+
+def _source_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy all model tables from a SQLite file into the configured PostgreSQL database "
+        "using COPY in batches, then reset sequences. Run migrate on PostgreSQL first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sqlite_path",
+            nargs="?",
+            default="",
+            help="Source SQLite file (default: DJANGO_SQLITE_NAME).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per fetch from SQLite (default: 5000).")
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help="Empty the target tables first (migrate already filled content types and permissions).",
+        )
+        parser.add_argument("--skip-sessions", action="store_true", help="Do not copy django_session.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Target database must be PostgreSQL (set DATABASE_URL).")
+
+        source_path = Path(options["sqlite_path"] or settings.SQLITE_DATABASE["NAME"]).resolve()
+        if not source_path.is_file():
+            raise CommandError(f"SQLite file not found: {source_path}")
+
+        models = list(_models())
+        if options["skip_sessions"]:
+            models = [m for m in models if m._meta.db_table != "django_session"]
+
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        started = time.monotonic()
+        total = 0
+        try:
+            source_tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = [m._meta.db_table for m in models if m._meta.db_table not in source_tables]
+            if missing:
+                self.stdout.write(self.style.WARNING(f"Not in SQLite, skipped: {', '.join(missing)}"))
+                models = [m for m in models if m._meta.db_table in source_tables]
+
+            # FK в Postgres у Django DEFERRABLE INITIALLY DEFERRED — порядок таблиц не важен
+            with transaction.atomic():
+                if options["truncate"]:
+                    self._truncate(models)
+                else:
+                    self._check_empty(models)
+                for model in models:
+                    copied = self._copy(source, model, options["batch_size"])
+                    total += copied
+                    self.stdout.write(f"{model._meta.db_table}: {copied} rows")
+                self._reset_sequences(models)
+                # в старой базе итогов смет может не быть
+                pricing.recalculate()
+        finally:
+            source.close()
+
+        # записи шли мимо ORM — снимок каталога и кэш страниц собираем заново
+        CatalogVersion.bump(CatalogVersion.CATALOG)
+        CatalogVersion.bump("portfolio")
+        invalidate_all()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Copied {total} rows from {len(models)} tables in {time.monotonic() - started:.1f}s")
+        )
+
+    def _truncate(self, models) -> None:
+        tables = ", ".join(connection.ops.quote_name(m._meta.db_table) for m in models)
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+
+    def _check_empty(self, models) -> None:
+        filled = [m._meta.db_table for m in models if m._default_manager.exists()]
+        if filled:
+            raise CommandError(f"Target tables are not empty: {', '.join(filled)}. Use --truncate.")
+
+    def _copy(self, source: sqlite3.Connection, model, batch_size: int) -> int:
+        table = model._meta.db_table
+        available = _source_columns(source, table)
+        columns = [f.column for f in model._meta.concrete_fields if f.column in available]
+        skipped = [f.column for f in model._meta.concrete_fields if f.column not in available]
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"{table}: no such columns in SQLite, defaults used: {', '.join(skipped)}"))
+
+        quote = connection.ops.quote_name
+        select = source.execute(f"SELECT {', '.join(quote(c) for c in columns)} FROM {quote(table)}")
+        copy_sql = f"COPY {quote(table)} ({', '.join(quote(c) for c in columns)}) FROM STDIN"
+
+        copied = 0
+        with connection.cursor() as cursor:
+            # cursor.cursor — курсор psycopg 3
+            with cursor.cursor.copy(copy_sql) as copy:
+                while rows := select.fetchmany(batch_size):
+                    for row in rows:
+                        copy.write_row(row)
+                    copied += len(rows)
+        return copied
+
+    def _reset_sequences(self, models) -> None:
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
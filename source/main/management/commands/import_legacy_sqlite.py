@@ -11,6 +11,9 @@ from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection
 
+from catalog import search
+from catalog.models import CatalogVersion
+from kp import pricing
 
 TABLES_TO_COPY = [
     "accounts_user",
@@ -45,7 +48,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         db_settings = settings.DATABASES["default"]
         if db_settings["ENGINE"] != "django.db.backends.sqlite3":
-            raise CommandError("This command supports only SQLite targets.")
+            raise CommandError(
+                "This command supports only SQLite targets. "
+                "For PostgreSQL import into SQLite first, then run copy_sqlite_to_postgres."
+            )
 
         target_path = Path(str(db_settings["NAME"])).resolve()
         if not target_path.exists():
@@ -134,6 +140,15 @@ class Command(BaseCommand):
                 f"{table_name}: copied {copied_rows} rows using columns: {', '.join(copied_columns)}"
             )
 
+        # сырой импорт мимо ORM — сигналы не срабатывали
+        CatalogVersion.bump(CatalogVersion.CATALOG)
+        indexed = search.rebuild()
+        if indexed:
+            self.stdout.write(f"catalog search index: {indexed} rows")
+        recalculated = pricing.recalculate()
+        if recalculated:
+            self.stdout.write(f"proposal totals recalculated: {recalculated}")
+
         self.stdout.write(
             self.style.SUCCESS(
                 "Legacy import completed. Portfolio tables were left untouched because they do not exist in the old backup."
@@ -190,6 +205,9 @@ class Command(BaseCommand):
         source_columns = self._table_columns(source_conn, table_name)
         source_column_set = set(source_columns)
         target_columns_info = self._table_columns_info(target_conn, table_name)
+        create_sql = target_conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()[0] or ""
 
         insert_columns: list[str] = []
         source_select_columns: list[str] = []
@@ -204,7 +222,11 @@ class Command(BaseCommand):
 
             if column_info["notnull"]:
                 insert_columns.append(column_name)
-                fallback_values[column_name] = self._fallback_value(column_info, table_name)
+                if f'JSON_VALID("{column_name}")' in create_sql:
+                    # JSONField: пустая строка не пройдёт CHECK
+                    fallback_values[column_name] = "{}"
+                else:
+                    fallback_values[column_name] = self._fallback_value(column_info, table_name)
 
         if not insert_columns:
             raise CommandError(f"No compatible columns found for table {table_name}")
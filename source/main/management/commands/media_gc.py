@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import time
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from catalog.derived import invalidate_all
+from catalog.models import CatalogVersion
+from main.images import DERIVED_DIR
+from main.media import PROTECTED_PREFIX
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _file_fields():
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def _references() -> dict[str, list[tuple[type[models.Model], str]]]:
+    """
+    Имя файла -> [(модель, поле)], где на него ссылаются.
+    """
+    refs: dict[str, list] = defaultdict(list)
+    for model, field in _file_fields():
+        names = model._default_manager.exclude(**{field.name: ""}).exclude(**{f"{field.name}__isnull": True})
+        for name in names.values_list(field.name, flat=True).distinct():
+            refs[str(name)].append((model, field.name))
+    return refs
+
+
+def _is_protected_field(model, field_name: str) -> bool:
+    # поле само кладёт файлы в закрытую папку (фото КП)
+    upload_to = model._meta.get_field(field_name).upload_to
+    return isinstance(upload_to, str) and upload_to.startswith(PROTECTED_PREFIX)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _derived_source_key(rel: PurePosixPath) -> tuple[str, str]:
+    # derived/<вариант>/<папка оригинала>/<stem>.<подпись>.<ext>
+    parent = PurePosixPath(*rel.parts[2:-1])
+    return str(parent), rel.name.rsplit(".", 2)[0]
+
+
+def _human(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    value = size / 1024
+    for unit in ("KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Find duplicate media files (same content) and files no model field references; "
+        "relink duplicates to one copy and delete orphans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report, change nothing.")
+        parser.add_argument("--skip-dedupe", action="store_true", help="Do not merge duplicate files.")
+        parser.add_argument("--skip-orphans", action="store_true", help="Do not delete unreferenced files.")
+        parser.add_argument(
+            "--keep-prefix",
+            action="append",
+            default=None,
+            help="Never delete files under this media prefix (repeatable). Default: seed/ (seed commands' pool).",
+        )
+        parser.add_argument(
+            "--min-age-hours",
+            type=float,
+            default=1.0,
+            help="Keep unreferenced files younger than this (uploads in flight). Default: 1.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        media_root = Path(settings.MEDIA_ROOT)
+        if not media_root.is_dir():
+            self.stdout.write(self.style.WARNING(f"MEDIA_ROOT does not exist: {media_root}"))
+            return
+
+        files: dict[str, Path] = {}
+        for path in media_root.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                files[path.relative_to(media_root).as_posix()] = path
+        refs = _references()
+        self.keep_prefixes = tuple(p.rstrip("/") + "/" for p in (options["keep_prefix"] or ["seed/"]))
+
+        self._unshare_protected(files, refs, dry_run)
+
+        deduped_bytes = 0
+        if not options["skip_dedupe"]:
+            deduped_bytes = self._dedupe(files, refs, dry_run)
+
+        orphan_bytes = 0
+        if not options["skip_orphans"]:
+            orphan_bytes = self._orphans(files, refs, options["min_age_hours"], dry_run)
+
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {_human(deduped_bytes + orphan_bytes)} "
+                f"(duplicates: {_human(deduped_bytes)}, orphans: {_human(orphan_bytes)})"
+            )
+        )
+
+    def _dedupe(self, files: dict[str, Path], refs: dict, dry_run: bool) -> int:
+        by_size: dict[int, list[str]] = defaultdict(list)
+        for name, path in files.items():
+            if name.startswith(f"{DERIVED_DIR}/"):
+                continue
+            by_size[path.stat().st_size].append(name)
+
+        # хэшируем только файлы, у которых есть ровесники по размеру; публичные
+        # папки (каталог, портфолио, сиды) сливаем между собой, а закрытые фото
+        # КП — только друг с другом: иначе публичное поле сослалось бы на файл,
+        # который отдаётся одним участникам КП (или наоборот)
+        by_hash: dict[tuple[bool, str], list[str]] = defaultdict(list)
+        for size, names in by_size.items():
+            if size == 0 or len(names) < 2:
+                continue
+            for name in names:
+                by_hash[(name.startswith(PROTECTED_PREFIX), _sha256(files[name]))].append(name)
+
+        saved = 0
+        changed_models: set[str] = set()
+        for names in by_hash.values():
+            if len(names) < 2:
+                continue
+            # оставляем копию, на которую уже ссылаются (иначе — первую по имени)
+            names.sort(key=lambda n: (n not in refs, n))
+            keep = names[0]
+            duplicates = [n for n in names[1:] if not n.startswith(self.keep_prefixes)]
+            for name in duplicates:
+                size = files[name].stat().st_size
+                self.stdout.write(f"duplicate: {name} == {keep} ({_human(size)})")
+                saved += size
+                if dry_run:
+                    continue
+                with transaction.atomic():
+                    for model, field in refs.get(name, ()):
+                        model._default_manager.filter(**{field: name}).update(**{field: keep})
+                        changed_models.add(model._meta.app_label)
+                files.pop(name).unlink(missing_ok=True)
+
+            # ссылки переехали на оставленную копию
+            for name in duplicates:
+                for ref in refs.pop(name, ()):
+                    if ref not in refs[keep]:
+                        refs[keep].append(ref)
+                files.pop(name, None)
+
+        self._invalidate(changed_models)
+        return saved
+
+    def _unshare_protected(self, files: dict[str, Path], refs: dict, dry_run: bool) -> None:
+        """
+        Файлы под PROTECTED_PREFIX отдаются только участникам КП. Если на такой
+        файл ссылается публичное поле (каталог, портфолио — например, после
+        старых прогонов dedupe), копируем файл в папку этого поля и
+        перевешиваем ссылку, иначе картинка у всех, кроме владельца КП, — 404.
+        """
+        changed_models: set[str] = set()
+        for name in sorted(refs):
+            if not name.startswith(PROTECTED_PREFIX) or name not in files:
+                continue
+            public = [(model, field) for model, field in refs[name] if not _is_protected_field(model, field)]
+            for model, field in public:
+                model_field = model._meta.get_field(field)
+                target = model_field.storage.get_available_name(
+                    model_field.generate_filename(None, PurePosixPath(name).name)
+                )
+                self.stdout.write(f"unshare: {model._meta.label}.{field} {name} -> {target}")
+                if dry_run:
+                    continue
+                path = Path(model_field.storage.path(target))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(files[name], path)
+                model._default_manager.filter(**{field: name}).update(**{field: target})
+                changed_models.add(model._meta.app_label)
+                files[target] = path
+                refs[name].remove((model, field))
+                refs[target].append((model, field))
+            if not dry_run and not refs[name]:
+                del refs[name]
+        self._invalidate(changed_models)
+
+    def _invalidate(self, changed_models: set[str]) -> None:
+        if changed_models:
+            # update() минует сигналы: снимок каталога и кэш страниц сбрасываем сами
+            for key in (CatalogVersion.CATALOG, "portfolio"):
+                if key in changed_models:
+                    CatalogVersion.bump(key)
+            invalidate_all()
+
+    def _orphans(self, files: dict[str, Path], refs: dict, min_age_hours: float, dry_run: bool) -> int:
+        sources = {(str(PurePosixPath(name).parent), PurePosixPath(name).stem) for name in refs}
+        threshold = time.time() - min_age_hours * 3600
+
+        saved = 0
+        for name, path in sorted(files.items()):
+            rel = PurePosixPath(name)
+            if name.startswith(self.keep_prefixes):
+                continue
+            if rel.parts[0] == DERIVED_DIR:
+                if len(rel.parts) >= 3 and _derived_source_key(rel) in sources:
+                    continue
+            elif name in refs:
+                continue
+
+            stat = path.stat()
+            if stat.st_mtime > threshold:
+                continue
+            self.stdout.write(f"orphan: {name} ({_human(stat.st_size)})")
+            saved += stat.st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+
+        if not dry_run:
+            self._prune_empty_dirs(Path(settings.MEDIA_ROOT))
+        return saved
+
+    def _prune_empty_dirs(self, root: Path) -> None:
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            path = Path(dirpath)
+            if path != root and not any(path.iterdir()):
+                path.rmdir()
@@ -0,0 +1,180 @@
+# main/media.py
+"""
+Раздача MEDIA_ROOT с проверкой доступа.
+
+Фото КП (kp/photos/ и их производные в derived/) видят только владелец КП,
+заказчик и суперпользователь; остальным — 404, как будто файла нет.
+Публичные файлы (каталог, портфолио) отдаются всем.
+
+Байты Django сам не гонит, если перед ним есть прокси:
+- MEDIA_ACCEL_REDIRECT (nginx): X-Accel-Redirect на internal-location;
+- MEDIA_SENDFILE (Apache mod_xsendfile, lighttpd): X-Sendfile с путём на диске.
+Без них (dev) — FileResponse с поддержкой Range (206) и If-Modified-Since.
+"""
+from __future__ import annotations
+
+import logging
+import mimetypes
+import os
+import re
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from main.images import DERIVED_DIR
+
+logger = logging.getLogger(__name__)
+
+PROTECTED_PREFIX = "kp/photos/"
+
+PUBLIC_MAX_AGE = 24 * 3600
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _protected_source(name: str) -> str | None:
+    """
+    Имя оригинала, если файл закрытый: kp/photos/x.jpg или
+    derived/<вариант>/kp/photos/x.<подпись>.webp -> kp/photos/x.*
+    """
+    if name.startswith(PROTECTED_PREFIX):
+        return name
+    parts = PurePosixPath(name).parts
+    if len(parts) > 2 and parts[0] == DERIVED_DIR:
+        rest = "/".join(parts[2:])
+        if rest.startswith(PROTECTED_PREFIX):
+            return rest
+    return None
+
+
+def _can_read_kp_photo(user, name: str) -> bool:
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+
+    from kp.models import Proposal
+
+    proposals = Proposal.objects.filter(Q(owner_id=user.id) | Q(customer_id=user.id))
+    source = _protected_source(name)
+    if source != name:
+        # производная: оригинал ищем по папке и stem (x.<подпись>.webp -> x.*)
+        path = PurePosixPath(source)
+        stem = path.name.rsplit(".", 2)[0]
+        return proposals.filter(photo__startswith=f"{path.parent}/{stem}.").exists()
+    return proposals.filter(photo=name).exists()
+
+
+class _RangeFile:
+    """
+    Окно [start, start + length) открытого файла — для FileResponse.
+    """
+
+    def __init__(self, fh, start: int, length: int):
+        fh.seek(start)
+        self._fh = fh
+        self._left = length
+        self.name = fh.name
+
+    def read(self, size: int = -1) -> bytes:
+        if self._left <= 0:
+            return b""
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._fh.read(size)
+        self._left -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Один диапазон bytes=a-b / a- / -n -> (start, end) включительно.
+    None — заголовка нет или он нам не по силам (тогда отдаём файл целиком).
+    ValueError — диапазон за пределами файла (416).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _file_response(request, fullpath: Path, content_type: str):
+    stat = fullpath.stat()
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    size = stat.st_size
+    try:
+        byte_range = _parse_range(request.headers.get("Range", ""), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+    # If-Range с устаревшей датой — файл поменялся, отдаём целиком
+    if_range = request.headers.get("If-Range")
+    if byte_range and if_range and if_range != http_date(stat.st_mtime):
+        byte_range = None
+
+    fh = fullpath.open("rb")
+    if byte_range is None:
+        response = FileResponse(fh, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(_RangeFile(fh, start, end - start + 1), content_type=content_type, status=206)
+        response.headers["Content-Length"] = str(end - start + 1)
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_media(request, path: str):
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except Exception:
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    name = fullpath.relative_to(os.path.abspath(settings.MEDIA_ROOT)).as_posix()
+    protected = _protected_source(name) is not None
+    if protected and not _can_read_kp_photo(request.user, name):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    content_type = content_type or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response.headers["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT.rstrip("/") + "/" + quote(name)
+    elif settings.MEDIA_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response.headers["X-Sendfile"] = str(fullpath)
+    else:
+        response = _file_response(request, fullpath, content_type)
+
+    if protected:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=PUBLIC_MAX_AGE)
+    return response
@@ -0,0 +1,131 @@
+# main/page_cache.py
+"""
+Кэш целых страниц для анонимов.
+
+Публичные страницы каталога и портфолио у всех анонимов одинаковы (в пределах
+языка), поэтому готовый HTML кладём в кэш по ключу путь + query + язык.
+Инвалидация — по версиям данных (CatalogVersion: catalog, portfolio): запись
+хранит версии, из которых собрана, и после любой записи в каталог/портфолио
+становится устаревшей.
+
+Защита от «стада»: устаревшую страницу перерисовывает один запрос (лок через
+cache.add), остальные в это время получают старую копию; при холодном кэше —
+ждут его результат до LOCK_WAIT секунд.
+
+CSRF-токен в HTML у каждого свой: в кэш он попадает заглушкой, при отдаче
+подставляется токен текущего запроса.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import time
+from functools import wraps
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+from catalog.derived import current_version
+from main.build import build_id
+
+logger = logging.getLogger(__name__)
+
+CSRF_PLACEHOLDER = b"__page_cache_csrf__"
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([A-Za-z0-9]+)"')
+
+KEPT_HEADERS = ("Content-Type", "Content-Language", "Vary")
+
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 3.0
+POLL_INTERVAL = 0.05
+
+
+def _cache_key(request) -> str:
+    query = "&".join(sorted(request.GET.urlencode().split("&"))) if request.GET else ""
+    raw = f"{request.get_host()}|{request.path}|{query}|{get_language() or ''}"
+    return "page:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _cacheable_request(request) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # флеш-сообщения адресованы конкретному посетителю
+    if "messages" in request.COOKIES:
+        return False
+    return True
+
+
+def _freeze(response) -> Optional[dict]:
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    content = response.content
+    for token in set(CSRF_INPUT_RE.findall(content)):
+        content = content.replace(token, CSRF_PLACEHOLDER)
+    return {
+        "content": content,
+        "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+    }
+
+
+def _thaw(request, entry: dict, state: str) -> HttpResponse:
+    content = entry["content"]
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content)
+    for header, value in entry["headers"].items():
+        response.headers[header] = value
+    response.headers["X-Page-Cache"] = state
+    return response
+
+
+def anonymous_page_cache(*scopes: str):
+    """
+    @anonymous_page_cache("catalog", "portfolio") — от каких данных зависит страница.
+    Навбар везде берёт ссылку из каталога, так что "catalog" нужен всем.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not settings.PAGE_CACHE_TIMEOUT or not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            key = _cache_key(request)
+            # и сборка: после деплоя HTML ссылается на другие шаблоны и статику
+            versions = (build_id(), *(current_version(scope) for scope in scopes))
+            entry = cache.get(key)
+            if entry is not None and entry["versions"] == versions:
+                return _thaw(request, entry, "hit")
+
+            lock_key = f"{key}:lock"
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                # страницу уже перерисовывают
+                if entry is not None:
+                    return _thaw(request, entry, "stale")
+                deadline = time.monotonic() + LOCK_WAIT
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_INTERVAL)
+                    entry = cache.get(key)
+                    if entry is not None and entry["versions"] == versions:
+                        return _thaw(request, entry, "hit")
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+                frozen = _freeze(response)
+                if frozen is not None:
+                    cache.set(key, {**frozen, "versions": versions}, settings.PAGE_CACHE_TIMEOUT)
+                    response.headers["X-Page-Cache"] = "miss"
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,15 @@
+# main/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from catalog.models import Category, Service
+
+from .images import build_instance_derivatives
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Service)
+def build_image_derivatives(sender, instance, raw=False, **kwargs):
+    # до коммита: страница, собранная под новую версию каталога, уже найдёт копии
+    if not raw:
+        build_instance_derivatives(instance)
@@ -0,0 +1,178 @@
+# main/staticfiles.py
+"""
+Сборка статики для продакшена и её раздача.
+
+collectstatic (не DEBUG) кладёт в STATIC_ROOT файлы с хэшем содержимого в имени
+({% static %} отдаёт именно их), и рядом:
+- .gz и .br для текстовых файлов (CSS, JS, SVG) — отдавать без сжатия на лету;
+- для PNG/JPEG — .webp-вариант ({% static_picture %} подставит его браузерам,
+  которые умеют WebP).
+
+Сами картинки не пережимаем: хэш в имени ManifestStaticFilesStorage считает от
+исходных байтов, и файл под этим именем должен им соответствовать.
+
+Имена с хэшем никогда не меняют содержимое, поэтому отдаём их с
+Cache-Control: immutable на год. Обычно статику отдаёт nginx (gzip_static,
+brotli_static); serve_static — для установки без него (DJANGO_SERVE_STATIC).
+"""
+from __future__ import annotations
+
+import gzip
+import logging
+import mimetypes
+import re
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # пакет Brotli не установлен — только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".map", ".xml", ".html"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+WEBP_QUALITY = 82
+
+# сжатая копия нужна, только если она заметно меньше
+MIN_SAVING = 0.05
+
+# ManifestStaticFilesStorage: name.<12 hex>.ext
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^/]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _compress(path: Path) -> None:
+    data = path.read_bytes()
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    for suffix, packed in variants.items():
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            path.with_name(path.name + suffix).write_bytes(packed)
+
+
+def _write_webp(path: Path) -> None:
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img.load()
+        webp = BytesIO()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+        img.save(webp, "WEBP", quality=WEBP_QUALITY, method=6)
+        path.with_name(path.name + ".webp").write_bytes(webp.getvalue())
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # ссылка на несуществующий файл не должна ронять страницу с 500
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        webp_names = {}
+        for name, hashed_name in list(self.hashed_files.items()):
+            path = Path(self.path(hashed_name))
+            suffix = path.suffix.lower()
+            try:
+                if suffix in COMPRESSED_EXTENSIONS:
+                    _compress(path)
+                elif suffix in IMAGE_EXTENSIONS:
+                    # сам файл с хэшем не меняем — только .webp рядом
+                    if not path.with_name(path.name + ".webp").exists():
+                        _write_webp(path)
+                    webp_names[f"{name}.webp"] = f"{hashed_name}.webp"
+            except Exception:
+                logger.exception("Static post-processing failed for %s", hashed_name)
+
+        if webp_names:
+            self.hashed_files.update(webp_names)
+            self.save_manifest()
+
+    def webp_name(self, name: str):
+        return self.hashed_files.get(f"{name}.webp")
+
+
+# в порядке предпочтения при равном q
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    "gzip;q=0.5, br" -> {"gzip": 0.5, "br": 1.0}. Кодировка без q — 1.0,
+    нечитаемый q — 0 (не используем). x-gzip — то же, что gzip.
+    """
+    weights: dict[str, float] = {}
+    for part in header.split(","):
+        coding, *params = (p.strip() for p in part.split(";"))
+        coding = coding.lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        weights["gzip" if coding == "x-gzip" else coding] = q
+    return weights
+
+
+def _accepted_encodings(request) -> list[tuple[str, str]]:
+    weights = _parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+    wildcard = weights.get("*", 0.0)
+    ranked = []
+    for order, (name, suffix) in enumerate(PRECOMPRESSED):
+        q = weights.get(name, wildcard)
+        if q > 0:
+            ranked.append((-q, order, name, suffix))
+    return [(name, suffix) for _q, _order, name, suffix in sorted(ranked)]
+
+
+def serve_static(request, path: str):
+    """
+    Раздача STATIC_ROOT: готовые .br/.gz по Accept-Encoding и immutable для имён с хэшем.
+    """
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except Exception:
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    stat = fullpath.stat()
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    served, encoding = fullpath, None
+    for name, suffix in _accepted_encodings(request):
+        candidate = fullpath.with_name(fullpath.name + suffix)
+        if candidate.is_file():
+            served, encoding = candidate, name
+            break
+
+    response = FileResponse(served.open("rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if fullpath.suffix.lower() in COMPRESSED_EXTENSIONS:
+        response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    if HASHED_NAME_RE.search(fullpath.name):
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+    return response
@@ -0,0 +1,143 @@
+# main/storage.py
+"""
+Хранилище медиа с обработкой картинок при загрузке.
+
+Телефонные фото по 10–20 МБ с EXIF-поворотом раньше ложились как есть и потом
+уезжали в каждый рендер PDF и на каждую страницу. Теперь при сохранении
+(kp, каталог, портфолио, админка — всё идёт через default storage):
+- поворот из EXIF применяется, сами метаданные (GPS, модель телефона) выкидываются;
+- длинная сторона уменьшается до MEDIA_IMAGE_MAX_SIDE;
+- файл перекодируется в тот же формат.
+
+Память ограничена: JPEG декодируется сразу в уменьшенном масштабе (draft),
+а картинки больше MEDIA_IMAGE_MAX_PIXELS не декодируются вовсе. Потолок
+размера файла проверяет validate_image_upload — валидатор полей ImageField.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from io import BytesIO
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+PROCESSED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# формат Pillow -> как сохраняем (MPO — JPEG с iPhone)
+SAVE_FORMATS = {"JPEG": "JPEG", "MPO": "JPEG", "PNG": "PNG", "WEBP": "WEBP"}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def _open(content):
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = settings.MEDIA_IMAGE_MAX_PIXELS
+    content.seek(0)
+    return Image.open(content)
+
+
+@deconstructible
+class ImageUploadValidator:
+    """
+    Потолок размера файла и пикселей; сам факт, что это картинка, проверяет ImageField.
+    """
+
+    def __call__(self, file) -> None:
+        # уже сохранённый файл не перепроверяем
+        if getattr(file, "_committed", False):
+            return
+
+        max_bytes = settings.MEDIA_UPLOAD_MAX_MB * 1024 * 1024
+        if file.size and file.size > max_bytes:
+            raise ValidationError(
+                "Файл слишком большой (%(size)s МБ), максимум — %(max)s МБ.",
+                code="file_too_large",
+                params={"size": round(file.size / 1024 / 1024, 1), "max": settings.MEDIA_UPLOAD_MAX_MB},
+            )
+
+        from PIL import Image
+
+        try:
+            with _open(file) as img:
+                width, height = img.size
+        except Image.DecompressionBombError:
+            width = height = None
+        except Exception:
+            # не картинка — это сообщит сам ImageField
+            return
+        finally:
+            file.seek(0)
+
+        if width is None or width * height > settings.MEDIA_IMAGE_MAX_PIXELS:
+            raise ValidationError("Слишком большое разрешение картинки.", code="image_too_large")
+
+
+validate_image_upload = ImageUploadValidator()
+
+
+def process_image(content) -> Optional[bytes]:
+    """
+    Нормализованные байты картинки или None, если трогать файл не нужно
+    (уже маленький, без EXIF) или формат не наш.
+    """
+    from PIL import Image, ImageOps
+
+    max_side = settings.MEDIA_IMAGE_MAX_SIDE
+    with _open(content) as img:
+        save_format = SAVE_FORMATS.get(img.format or "")
+        if save_format is None:
+            return None
+
+        exif = img.getexif()
+        oversized = max(img.size) > max_side
+        if not oversized and not exif:
+            return None
+
+        icc_profile = img.info.get("icc_profile")
+        img.draft(img.mode if img.mode in ("RGB", "L") else "RGB", (max_side, max_side))
+        rotated = exif.get(EXIF_ORIENTATION, 1) != 1
+        out = ImageOps.exif_transpose(img) if rotated else img
+        if out.mode == "P":
+            out = out.convert("RGBA")
+        if save_format == "JPEG" and out.mode not in ("RGB", "L", "CMYK"):
+            out = out.convert("RGB")
+        out.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        buf = BytesIO()
+        options = {}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if save_format == "JPEG":
+            options.update(quality=85, optimize=True, progressive=True)
+        elif save_format == "WEBP":
+            options.update(quality=85, method=4)
+        else:
+            options.update(optimize=True)
+        # exif не передаём — метаданные не сохраняются
+        out.save(buf, save_format, **options)
+        return buf.getvalue()
+
+
+class MediaStorage(FileSystemStorage):
+    def _save(self, name, content):
+        if os.path.splitext(name)[1].lower() in PROCESSED_EXTENSIONS:
+            try:
+                data = process_image(content)
+            except Exception:
+                # битый файл сохраняем как есть: валидаторы форм его и так не пропустят
+                logger.warning("Image processing failed for %s; stored as uploaded", name, exc_info=True)
+                data = None
+            if data is not None:
+                logger.info("Normalized upload %s: %s -> %s bytes", name, content.size, len(data))
+                content = ContentFile(data)
+            else:
+                content.seek(0)
+        return super()._save(name, content)
@@ -0,0 +1,78 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from main.images import derivative_url, responsive_srcset
+
+register = template.Library()
+
+
+@register.filter
+def print_image_url(image) -> str:
+    """
+    {{ it.service.image|print_image_url }} — копия под печать (JPEG, 1200px)
+    вместо оригинала загрузки.
+    """
+    if not image:
+        return ""
+    return derivative_url(image, "print", "jpeg")
+
+
+@register.filter
+def image_variant_url(image, variant: str = "large") -> str:
+    """
+    {{ s.image|image_variant_url:"large" }} — готовая JPEG-копия, иначе оригинал.
+    """
+    if not image:
+        return ""
+    return derivative_url(image, variant, "jpeg", build=False)
+
+
+def _srcset(candidates) -> str:
+    return ", ".join(f"{url} {width}w" for url, width in candidates)
+
+
+@register.simple_tag
+def responsive_img(image, sizes: str = "100vw", alt: str = "", css_class: str = "", loading: str = "lazy"):
+    """
+    {% responsive_img c.image sizes="(max-width: 640px) 100vw, 33vw" alt=c.name %}
+    <picture> с WebP- и JPEG-srcset из готовых копий; пока копий нет — оригинал.
+    """
+    if not image:
+        return ""
+
+    jpeg = responsive_srcset(image, "jpeg")
+    if not jpeg:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            derivative_url(image, "card", "jpeg", build=False), alt, css_class, loading,
+        )
+
+    webp = responsive_srcset(image, "webp")
+    # src для браузеров без srcset — средняя копия
+    fallback = jpeg[min(1, len(jpeg) - 1)][0]
+    source = format_html('<source type="image/webp" srcset="{}" sizes="{}">', _srcset(webp), sizes) if webp else ""
+    return format_html(
+        '<picture class="responsive-img">{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        source, fallback, _srcset(jpeg), sizes, alt, css_class, loading,
+    )
+
+
+@register.simple_tag
+def static_picture(name: str, alt: str = "", css_class: str = "", loading: str = "lazy"):
+    """
+    {% static_picture 'img/home/case-1.jpg' alt="..." %} — картинка из статики
+    с WebP-вариантом, если collectstatic его собрал (main/staticfiles.py).
+    """
+    img = format_html(
+        '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+        static(name), alt, css_class, loading,
+    )
+    webp_name = getattr(staticfiles_storage, "webp_name", None)
+    if webp_name is None or not webp_name(name):
+        return img
+    return format_html(
+        '<picture class="responsive-img"><source type="image/webp" srcset="{}">{}</picture>',
+        static(f"{name}.webp"), img,
+    )
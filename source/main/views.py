@@ -4,12 +4,15 @@ from __future__ import annotations
 from urllib.parse import parse_qs, urlparse
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
-from django.utils.translation import get_language
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import Http404
+from django.shortcuts import redirect, render
 from django.urls import reverse
 
-from catalog.models import Category, Service
+from catalog.conditional import conditional_catalog
+from catalog.search import ranked_category_ids, ranked_service_ids
+from catalog.snapshot import get_snapshot
+
+from .page_cache import anonymous_page_cache
 
 
 def _is_admin(user) -> bool:
@@ -33,84 +36,6 @@ def _is_admin(user) -> bool:
     return False
 
 
-def _normalize_words(text: str) -> list[str]:
-    raw = text.lower().strip()
-    parts = [p for p in raw.replace(",", " ").split() if len(p) > 1]
-
-    bases: set[str] = set()
-
-    for w in parts:
-        bases.add(w)
-
-        # агрессивнее режем окончания
-        for i in (1, 2, 3):
-            if len(w) - i >= 4:
-                bases.add(w[:-i])
-
-    return list(bases)
-
-
-def _lang_suffix() -> str:
-    lang = (get_language() or "ru").lower()
-    if lang.startswith("kk"):
-        return "kk"
-    if lang.startswith("en"):
-        return "en"
-    return "ru"
-
-
-def _category_search_q(search: str) -> Q:
-    words = _normalize_words(search)
-
-    q = Q()
-    for w in words:
-        q |= (
-            Q(name_ru__icontains=w) |
-            Q(name_kk__icontains=w) |
-            Q(name_en__icontains=w) |
-            Q(description_ru__icontains=w) |
-            Q(description_kk__icontains=w) |
-            Q(description_en__icontains=w) |
-            Q(services__name_ru__icontains=w) |
-            Q(services__name_kk__icontains=w) |
-            Q(services__name_en__icontains=w) |
-            Q(services__description_ru__icontains=w) |
-            Q(services__description_kk__icontains=w) |
-            Q(services__description_en__icontains=w)
-        )
-
-    return q
-
-
-def _service_search_q(search: str) -> Q:
-    words = _normalize_words(search)
-
-    q = Q()
-    for w in words:
-        q |= (
-            Q(name_ru__icontains=w) |
-            Q(name_kk__icontains=w) |
-            Q(name_en__icontains=w) |
-            Q(description_ru__icontains=w) |
-            Q(description_kk__icontains=w) |
-            Q(description_en__icontains=w)
-        )
-
-    return q
-
-
-def _search_q(search: str) -> Q:
-    # универсальный поиск по услугам
-    return (
-        Q(name_ru__icontains=search) |
-        Q(name_kk__icontains=search) |
-        Q(name_en__icontains=search) |
-        Q(description_ru__icontains=search) |
-        Q(description_kk__icontains=search) |
-        Q(description_en__icontains=search)
-    )
-
-
 def _youtube_embed_url(raw_url: str) -> str:
     url = (raw_url or "").strip()
     if not url:
@@ -139,44 +64,26 @@ def _youtube_embed_url(raw_url: str) -> str:
         return ""
 
 
-def _order_by_if_exists(qs, *fields: str):
-    model_fields = {f.name for f in qs.model._meta.get_fields()}
-    safe = []
-
-    suffix = _lang_suffix()
-
-    for f in fields:
-        raw = f[1:] if f.startswith("-") else f
+def _ranked(entries, ids: list[int]) -> list:
+    # записи снимка в порядке релевантности поиска
+    by_id = {e.id: e for e in entries}
+    return [by_id[pk] for pk in ids if pk in by_id]
 
-        # если просим "name" -> заменяем на name_ru/name_en/name_kk
-        if raw == "name":
-            raw = f"name_{suffix}"
-            if f.startswith("-"):
-                raw = "-" + raw
 
-        if raw.lstrip("-") in model_fields:
-            safe.append(raw)
-
-    if not safe:
-        # дефолтная сортировка тоже должна быть корректной
-        safe = [f"name_{suffix}"]
-
-    return qs.order_by(*safe)
+def _catalog_categories(request, is_admin: bool):
+    categories = get_snapshot().categories(is_admin=is_admin)
+    search = (request.GET.get("search") or "").strip()
+    if search:
+        # порядок — по релевантности
+        categories = _ranked(categories, ranked_category_ids(search))
+    return categories, search
 
 
+@conditional_catalog
+@anonymous_page_cache("catalog")
 def home(request):
     is_admin = _is_admin(request.user)
-
-    qs = Category.objects.all()
-    if not is_admin:
-        qs = qs.filter(is_active=True)
-
-    search = (request.GET.get("search") or "").strip()
-
-    if search:
-        qs = qs.filter(_category_search_q(search)).distinct()
-
-    categories = _order_by_if_exists(qs, "sort_order", "name")
+    categories, search = _catalog_categories(request, is_admin)
 
     return render(
         request,
@@ -189,19 +96,11 @@ def home(request):
     )
 
 
+@conditional_catalog
+@anonymous_page_cache("catalog")
 def categories_page(request):
     is_admin = _is_admin(request.user)
-
-    qs = Category.objects.all()
-    if not is_admin:
-        qs = qs.filter(is_active=True)
-
-    search = (request.GET.get("search") or "").strip()
-
-    if search:
-        qs = qs.filter(_category_search_q(search)).distinct()
-
-    categories = _order_by_if_exists(qs, "sort_order", "name")
+    categories, search = _catalog_categories(request, is_admin)
 
     return render(
         request,
@@ -214,102 +113,23 @@ def categories_page(request):
     )
 
 
+@conditional_catalog
+@anonymous_page_cache("catalog")
 def category_services_page(request, category_id: int):
     is_admin = _is_admin(request.user)
 
-    category_qs = Category.objects.all()
-    if not is_admin:
-        category_qs = category_qs.filter(is_active=True)
-
-    category = get_object_or_404(category_qs, id=category_id)
+    snapshot = get_snapshot()
+    category = snapshot.category(category_id, is_admin=is_admin)
+    if category is None:
+        raise Http404
 
     # categories list for left sidebar (with service counts)
-    if is_admin:
-        categories_qs = category_qs.annotate(services_count=Count("services"))
-    else:
-        categories_qs = category_qs.annotate(
-            services_count=Count("services", filter=Q(services__is_active=True))
-        )
-    categories = _order_by_if_exists(categories_qs, "sort_order", "name")
-
-    services_qs = Service.objects.filter(category=category)
-    if not is_admin:
-        services_qs = services_qs.filter(is_active=True)
+    categories = snapshot.categories(is_admin=is_admin)
+    services = snapshot.services(category.id, is_admin=is_admin)
 
     search = (request.GET.get("search") or "").strip()
     if search:
-        services_qs = services_qs.filter(_search_q(search))
-
-    services = _order_by_if_exists(services_qs, "sort_order", "name")
-
-    draft_kps = []
-    has_draft_kps = False
-
-    # KP summary for right sidebar
-    active_kp = None
-    kp_items = []
-    kp_subtotal = 0
-    kp_fee = 0
-    kp_total = 0
-
-    if is_admin:
-        from kp.models import Proposal
-
-        # У тебя в базе статус именно "DRAFT" (ты сам это показал),
-        # так что не выдумываем.
-        draft_kps = (
-            Proposal.objects
-            .filter(owner=request.user, status="DRAFT")
-            .select_related("customer", "owner")
-            .order_by("-updated_at")
-        )
-        has_draft_kps = draft_kps.exists()
-
-        selected_kp_id = (request.GET.get("kp") or "").strip()
-        if selected_kp_id.isdigit():
-            selected_kp = (
-                Proposal.objects
-                .filter(id=int(selected_kp_id), owner=request.user, status="DRAFT")
-                .only("id")
-                .first()
-            )
-            if selected_kp:
-                request.session["active_kp_id"] = selected_kp.id
-
-        kp_id = request.session.get("active_kp_id")
-        if kp_id:
-            active_kp = (
-                Proposal.objects
-                .filter(id=kp_id, owner=request.user, status="DRAFT")
-                .prefetch_related("items__service")
-                .first()
-            )
-        if not active_kp:
-            active_kp = draft_kps.prefetch_related("items__service").first()
-            if active_kp:
-                request.session["active_kp_id"] = active_kp.id
-    elif request.user.is_authenticated:
-        from kp.models import Proposal
-        active_kp = (
-            Proposal.objects
-            .filter(customer=request.user, owner=request.user, status="DRAFT")
-            .prefetch_related("items__service")
-            .order_by("-updated_at", "-id")
-            .first()
-        )
-
-    if active_kp:
-        kp_items = list(active_kp.items.select_related("service").order_by("id"))
-        for it in kp_items:
-            try:
-                kp_subtotal += int(it.total_price)
-            except Exception:
-                try:
-                    kp_subtotal += int(it.qty) * int(it.price or 0)
-                except Exception:
-                    pass
-        kp_fee = round(kp_subtotal * 0.2)
-        kp_total = kp_subtotal + kp_fee
+        services = _ranked(services, ranked_service_ids(search))
 
     return render(
         request,
@@ -319,41 +139,24 @@ def category_services_page(request, category_id: int):
             "categories": categories,
             "services": services,
             "search": search,
-            "draft_kps": draft_kps,
-            "has_draft_kps": has_draft_kps,
             "is_admin": is_admin,
-            "active_kp": active_kp,
-            "kp_items": kp_items,
-            "kp_subtotal": kp_subtotal,
-            "kp_fee": kp_fee,
-            "kp_total": kp_total,
+            # смета пользователя — отдельным фрагментом (kp:sidebar), каркас общий
+            "kp_pending": request.user.is_authenticated,
+            "page_url": request.get_full_path(),
         },
     )
 
 
+@conditional_catalog
+@anonymous_page_cache("catalog")
 def service_detail_page(request, service_id: int):
     is_admin = _is_admin(request.user)
 
-    services_qs = Service.objects.select_related("category")
-    if not is_admin:
-        services_qs = services_qs.filter(is_active=True, category__is_active=True)
-
-    service = get_object_or_404(services_qs, id=service_id)
-
-    images = []
-    for image in (
-        service.image,
-        service.image_2,
-        service.image_3,
-        service.image_4,
-        service.image_5,
-        service.image_6,
-    ):
-        if image:
-            try:
-                images.append(image.url)
-            except Exception:
-                pass
+    service = get_snapshot().service(service_id, is_admin=is_admin)
+    if service is None:
+        raise Http404
+
+    images = list(service.images)
 
     return render(
         request,
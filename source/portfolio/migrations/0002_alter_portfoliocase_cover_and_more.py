@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-17 06:46
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='portfoliocase',
+            name='cover',
+            field=models.ImageField(blank=True, null=True, upload_to='portfolio/covers/', validators=[main.storage.ImageUploadValidator()], verbose_name='Обложка'),
+        ),
+        migrations.AlterField(
+            model_name='portfoliocasephoto',
+            name='image',
+            field=models.ImageField(upload_to='portfolio/photos/', validators=[main.storage.ImageUploadValidator()], verbose_name='Фото'),
+        ),
+    ]
@@ -4,6 +4,8 @@ from __future__ import annotations
 from django.db import models
 from django.utils.translation import get_language
 
+from main.storage import validate_image_upload
+
 
 class PortfolioCategory(models.Model):
     name_ru = models.CharField("Название (RU)", max_length=255)
@@ -48,7 +50,7 @@ class PortfolioCase(models.Model):
     description_kk = models.TextField("Описание (KZ)", blank=True, default="")
     description_en = models.TextField("Описание (EN)", blank=True, default="")
 
-    cover = models.ImageField("Обложка", upload_to="portfolio/covers/", blank=True, null=True)
+    cover = models.ImageField("Обложка", upload_to="portfolio/covers/", blank=True, null=True, validators=[validate_image_upload])
 
     sort_order = models.IntegerField("Порядок", default=0)
     is_active = models.BooleanField("Активен", default=True)
@@ -88,7 +90,7 @@ class PortfolioCasePhoto(models.Model):
         related_name="photos",
         verbose_name="Кейс",
     )
-    image = models.ImageField("Фото", upload_to="portfolio/photos/")
+    image = models.ImageField("Фото", upload_to="portfolio/photos/", validators=[validate_image_upload])
     sort_order = models.IntegerField("Порядок", default=0)
 
     class Meta:
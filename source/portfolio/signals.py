@@ -0,0 +1,27 @@
+# portfolio/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.derived import invalidate_all
+from catalog.models import CatalogVersion
+from main.images import build_instance_derivatives
+
+from .models import PortfolioCase, PortfolioCasePhoto, PortfolioCategory
+
+PORTFOLIO = "portfolio"
+
+
+@receiver([post_save, post_delete], sender=PortfolioCategory)
+@receiver([post_save, post_delete], sender=PortfolioCase)
+@receiver([post_save, post_delete], sender=PortfolioCasePhoto)
+def portfolio_changed(sender, **kwargs):
+    # страницы портфолио в кэше (main/page_cache.py) собраны под старую версию
+    CatalogVersion.bump(PORTFOLIO)
+    invalidate_all()
+
+
+@receiver(post_save, sender=PortfolioCase)
+@receiver(post_save, sender=PortfolioCasePhoto)
+def build_photo_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw:
+        build_instance_derivatives(instance)
@@ -1,9 +1,12 @@
 # portfolio/views.py
 from django.shortcuts import get_object_or_404, render
 
+from main.page_cache import anonymous_page_cache
+
 from .models import PortfolioCase, PortfolioCategory
 
 
+@anonymous_page_cache("catalog", "portfolio")
 def portfolio_list(request):
     categories = PortfolioCategory.objects.filter(is_active=True)
     cases_qs = PortfolioCase.objects.filter(is_active=True).select_related("category").prefetch_related("photos")
@@ -24,6 +27,7 @@ def portfolio_list(request):
     })
 
 
+@anonymous_page_cache("catalog", "portfolio")
 def portfolio_detail(request, pk):
     case = get_object_or_404(PortfolioCase, pk=pk, is_active=True)
     photos = case.photos.all()
@@ -0,0 +1,104 @@
+(function () {
+  // Сайдбар сметы на странице категории: страница — общий кэшируемый каркас,
+  // черновик КП пользователя подгружаем фрагментом (kp:sidebar) и обновляем
+  // только его после добавления/удаления услуг.
+
+  var HEADERS = { "X-Requested-With": "XMLHttpRequest" };
+
+  function pageUrl() {
+    return window.location.pathname + window.location.search;
+  }
+
+  function initKpSidebar(root) {
+    var url = root.getAttribute("data-kp-sidebar-url");
+    if (!url) return;
+
+    function slots() {
+      return Array.prototype.slice.call(document.querySelectorAll("[data-kp-sidebar-slot]"));
+    }
+
+    function load(kpId, form) {
+      var params = new URLSearchParams();
+      params.set("next", pageUrl());
+      if (kpId) params.set("kp", kpId);
+
+      return fetch(url + "?" + params.toString(), {
+        credentials: "same-origin",
+        headers: HEADERS,
+      })
+        .then(function (r) {
+          if (!r.ok) throw new Error("sidebar " + r.status);
+          return r.json();
+        })
+        .then(function (data) {
+          var fragments = data.fragments || {};
+          slots().forEach(function (slot) {
+            var name = slot.getAttribute("data-kp-sidebar-slot");
+            if (Object.prototype.hasOwnProperty.call(fragments, name)) {
+              slot.innerHTML = fragments[name];
+            }
+          });
+          document.dispatchEvent(
+            new CustomEvent("kp-sidebar:updated", { detail: { data: data, form: form || null } })
+          );
+        });
+    }
+
+    document.addEventListener("submit", function (e) {
+      var form = e.target;
+      if (!form || !form.hasAttribute("data-kp-sidebar-action")) return;
+      e.preventDefault();
+
+      fetch(form.action, {
+        method: "POST",
+        body: new FormData(form),
+        credentials: "same-origin",
+        headers: HEADERS,
+      })
+        .then(function (r) {
+          return r.json().then(function (data) {
+            return { ok: r.ok, data: data || {} };
+          });
+        })
+        .then(function (res) {
+          if (res.data.redirect) {
+            window.location.href = res.data.redirect;
+            return;
+          }
+          if (!res.ok || !res.data.ok) throw new Error("action failed");
+          return load(null, form).catch(function () {
+            window.location.reload();
+          });
+        })
+        .catch(function () {
+          // без AJAX — обычная отправка формы (submit() не зовёт этот обработчик)
+          form.submit();
+        });
+    });
+
+    document.addEventListener("change", function (e) {
+      var select = e.target;
+      if (!select || !select.hasAttribute("data-kp-sidebar-switch")) return;
+
+      var params = new URLSearchParams(window.location.search);
+      params.set("kp", select.value);
+      window.history.replaceState(null, "", window.location.pathname + "?" + params.toString());
+      load(select.value).catch(function () {
+        window.location.reload();
+      });
+    });
+
+    load(new URLSearchParams(window.location.search).get("kp"));
+  }
+
+  function boot() {
+    var root = document.querySelector("[data-kp-sidebar-url]");
+    if (root) initKpSidebar(root);
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", boot);
+  } else {
+    boot();
+  }
+})();